@@ -7,6 +7,27 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from ripozo_sqlalchemy.alchemymanager import AlchemyManager, db_access_point
-from ripozo_sqlalchemy.session_handlers import SessionHandler, ScopedSessionHandler
+import sys
+
+from ripozo_sqlalchemy.alchemymanager import AlchemyManager, db_access_point, \
+    db_read_access_point
+from ripozo_sqlalchemy.session_handlers import SessionHandler, ScopedSessionHandler, \
+    RoutingSessionHandler, ShardedSessionHandler
 from ripozo_sqlalchemy.easy_resource import create_resource
+from ripozo_sqlalchemy.caching import BaseCache, LRUCache
+from ripozo_sqlalchemy.exceptions import NotModifiedException
+from ripozo_sqlalchemy.group_commit import GroupCommitter
+from ripozo_sqlalchemy.streaming import ndjson_chunks, csv_chunks
+
+try:
+    from ripozo_sqlalchemy.executor import ExecutorManager
+except ImportError:  # Python 2 has neither asyncio nor concurrent.futures
+    pass
+
+if sys.version_info >= (3, 6):
+    try:
+        from ripozo_sqlalchemy.async_manager import AsyncAlchemyManager, async_db_access_point
+        from ripozo_sqlalchemy.async_session_handlers import AsyncSessionHandler, \
+            AsyncScopedSessionHandler
+    except ImportError:  # SQLAlchemy < 1.4 has no asyncio extension
+        pass
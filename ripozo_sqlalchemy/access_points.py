@@ -0,0 +1,76 @@
+"""
+The decorators that inject a session into the
+methods of a manager and let the session handler
+handle it afterwards.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from functools import wraps
+
+from ripozo_sqlalchemy import caching
+
+
+def db_access_point(func):
+    """
+    Wraps a function that actually accesses the database.
+    It injects a session into the method and attempts to handle
+    it after the function has run.
+
+    :param method func: The method that is interacting with the database.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        """
+        Wrapper responsible for handling
+        sessions
+        """
+        session = self.session_handler.get_session()
+        return _call_with_session(self, session, func, *args, **kwargs)
+    return wrapper
+
+
+def db_read_access_point(func):
+    """
+    Wraps a function that only reads from the database.
+    It works like db_access_point but gets the session from the
+    session handler's get_read_session method if it has one
+    so that the reads can be sent to a replica.
+
+    :param method func: The method that is reading from the database.
+    """
+    @wraps(func)
+    def wrapper(self, *args, **kwargs):
+        """
+        Wrapper responsible for handling
+        sessions
+        """
+        handler = self.session_handler
+        get_session = getattr(handler, 'get_read_session', handler.get_session)
+        session = get_session()
+        caching.record_read(session)
+        return _call_with_session(self, session, func, *args, **kwargs)
+    return wrapper
+
+
+def _call_with_session(manager, session, func, *args, **kwargs):
+    """
+    Calls the function with the session and lets
+    the manager's session handler handle it afterwards.
+
+    :param AlchemyManager manager: The manager
+    :param Session session: The session to inject
+    :param method func: The method that is interacting with the database.
+    :return: The return value of the function
+    :rtype: object
+    """
+    try:
+        resp = func(manager, session, *args, **kwargs)
+    except Exception as exc:
+        manager.session_handler.handle_session(session, exc=exc)
+        raise exc
+    else:
+        manager.session_handler.handle_session(session)
+        return resp
@@ -8,18 +8,28 @@ from __future__ import unicode_literals
 
 from datetime import datetime, date, time, timedelta
 from decimal import Decimal
-from functools import wraps
 
-from ripozo.exceptions import NotFoundException
+from ripozo.exceptions import NotFoundException, TranslationException, ValidationException
 from ripozo.manager_base import BaseManager
 from ripozo.resources.fields.base import BaseField
 from ripozo.resources.fields.common import StringField, IntegerField,\
     FloatField, DateTimeField, BooleanField
-from ripozo.utilities import make_json_safe
-
-from sqlalchemy.orm.exc import NoResultFound
-from sqlalchemy.orm.query import Query
 
+from ripozo_sqlalchemy import caching
+from ripozo_sqlalchemy.access_points import db_access_point, db_read_access_point
+from ripozo_sqlalchemy.bulk import BulkMixin
+from ripozo_sqlalchemy.core_reads import _CoreReader, _CoreUnsupported
+from ripozo_sqlalchemy.etags import ConditionalMixin
+from ripozo_sqlalchemy.pagination import PaginationMixin
+from ripozo_sqlalchemy.serialization import _compile_serializer, _freeze_field_dict, \
+    _get_json_converter, _get_loader_options, _get_primary_key_names, _get_projected_attributes
+from ripozo_sqlalchemy.streaming import StreamingMixin
+
+from sqlalchemy import delete, orm, update
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm.exc import NoResultFound, MultipleResultsFound
+
+import copy
 import logging
 import six
 
@@ -39,33 +49,34 @@ _COLUMN_FIELD_MAP = {
 }
 
 
-def db_access_point(func):
+def _requires_orm_delete(mapper):
     """
-    Wraps a function that actually accesses the database.
-    It injects a session into the method and attempts to handle
-    it after the function has run.
-
-    :param method func: The method that is interacting with the database.
+    Determines whether deleting a row of the mapper needs the
+    unit of work.  This is the case for relationships that the
+    ORM cascades to or whose foreign keys or association rows it
+    updates, version counters and inheritance across tables.
+    Delete events are checked separately since they can be added
+    at any time.
+
+    :param Mapper mapper: The mapper of the model being deleted.
+    :return: Whether the row must be deleted through the session.
+    :rtype: bool
     """
-    @wraps(func)
-    def wrapper(self, *args, **kwargs):
-        """
-        Wrapper responsible for handling
-        sessions
-        """
-        session = self.session_handler.get_session()
-        try:
-            resp = func(self, session, *args, **kwargs)
-        except Exception as exc:
-            self.session_handler.handle_session(session, exc=exc)
-            raise exc
-        else:
-            self.session_handler.handle_session(session)
-            return resp
-    return wrapper
-
-
-class AlchemyManager(BaseManager):
+    if len(mapper.tables) > 1 or mapper.version_id_col is not None:
+        return True
+    if len(list(mapper.self_and_descendants)) > 1:
+        return True
+    for prop in mapper.relationships:
+        if 'delete' in prop.cascade:
+            return True
+        if prop.direction in (orm.interfaces.ONETOMANY, orm.interfaces.MANYTOMANY) \
+                and not prop.passive_deletes and not prop.viewonly:
+            return True
+    return False
+
+
+class AlchemyManager(PaginationMixin, ConditionalMixin, BulkMixin, StreamingMixin,
+                     BaseManager):
     """
     This is the Manager that interops between ripozo
     and sqlalchemy.  It provides a series of convience
@@ -76,10 +87,94 @@ class AlchemyManager(BaseManager):
     :param bool all_fields:  If this is true, then all fields on
         the model will be used.  The model will be inspected to
         get the fields.
+    :param bool keyset_pagination: If this is true, then retrieve_list
+        pages by seeking on the keyset_fields instead of using an offset.
+        The pagination_pk_query_arg then holds an opaque cursor
+        instead of a page number.
+    :param tuple keyset_fields: The ordered fields to page on when
+        keyset_pagination is enabled.  Together they must uniquely
+        identify a row and should be indexed.  Defaults to the
+        primary key of the model.
+    :param unicode total_count_strategy: If set, retrieve_list adds
+        the total number of models matching the filters to the meta.
+        One of ``'exact'``, ``'capped'`` (count up to total_count_cap
+        and report ``'<cap>+'`` beyond it) or ``'estimate'``
+        (use the database statistics, falling back to capped).
+    :param int total_count_cap: The most rows counted by the
+        capped strategy.
+    :param unicode total_count_query_arg: If set, the query argument
+        a client can use to pick the strategy for a single request.
+        Clients can only pick a strategy that is no more expensive
+        than the total_count_strategy, where exact is the most
+        expensive and estimate the least.  A more expensive
+        strategy falls back to the total_count_strategy.
+    :param bool eager_load: If this is true, the relationships in the
+        fields are eagerly loaded by retrieve and retrieve_list
+        so that a page is loaded in a constant number of queries.
+    :param dict eager_loaders: Overrides the loader for individual
+        relationships.  The keys are the dotted relationship path
+        (e.g. ``'related.others'``) and the values one of
+        ``'selectin'``, ``'subquery'``, ``'joined'`` or ``'lazy'``.
+    :param bool project_columns: If this is true, retrieve and
+        retrieve_list only load the columns needed for the fields
+        instead of every column on the model.
+    :param bool core_reads: If this is true, retrieve and retrieve_list
+        read the fields with a Core select and serialize straight from
+        the result rows, skipping the creation of model instances.
+        Requires SQLAlchemy 1.4.  It is only used when queryset is not
+        overridden and every field is a column or a relationship.
+    :param int bulk_chunk_size: The number of rows inserted per
+        statement by create_many.
+    :param BaseCache retrieve_cache: If set, the results of retrieve
+        are cached when the lookup_keys are the primary key and the
+        queryset is not overridden.  Cached values are invalidated
+        when a session in this process writes to the tables they
+        were read from.  Use a cache with a ttl for writes made
+        by other processes.
+    :param BaseCache list_cache: If set, the pages returned by
+        retrieve_list are cached when the queryset is not overridden.
+        Every write to the model's table or the related tables
+        invalidates the cached pages.
+    :param unicode etag_column: The name of a column that changes
+        whenever a row is updated (e.g. an updated_at timestamp
+        or the version_id_col).  retrieve_conditional and
+        retrieve_list_conditional read it alone to check whether
+        the client's copy is current before loading the models.
+        Defaults to the mapper's version_id_col.  It is only used
+        when every field is a column of the model since changes
+        to related rows do not change it.  Otherwise the ETag is
+        a hash of the serialized representation.
+    :param GroupCommitter group_commit: If set, create, update
+        and delete are queued on it and committed in a single
+        transaction together with the writes of other threads.
+    :param int stream_chunk_size: The number of rows fetched from
+        the server side cursor at a time by retrieve_list_stream.
+    :param int import_chunk_size: The number of records
+        import_records commits at a time.
+    :param int import_max_errors: The most errors reported by
+        import_records.  The failed records beyond it are only counted.
     """
     pagination_pk_query_arg = 'page'
     all_fields = False
     fields = tuple()
+    keyset_pagination = False
+    keyset_fields = None
+    _class_cache = None
+    total_count_strategy = None
+    total_count_cap = 1000
+    total_count_query_arg = None
+    eager_load = True
+    eager_loaders = None
+    project_columns = True
+    core_reads = False
+    bulk_chunk_size = 1000
+    retrieve_cache = None
+    list_cache = None
+    etag_column = None
+    group_commit = None
+    stream_chunk_size = 1000
+    import_chunk_size = 1000
+    import_max_errors = 100
 
     def __init__(self, session_handler, *args, **kwargs):
         super(AlchemyManager, self).__init__(*args, **kwargs)
@@ -108,6 +203,57 @@ class AlchemyManager(BaseManager):
             # This is for pickle type columns.
             return object
 
+    @classmethod
+    def _memoize(cls, key, factory):
+        """
+        Gets a value from the cache of model metadata kept on this
+        manager class, computing it with the factory the first
+        time it is needed.  The metadata is computed lazily rather
+        than when the class is created since the mappers may not
+        be configured yet at that point.
+
+        :param tuple key: The cache key.  It should include
+            everything the value depends on (e.g. the model).
+        :param function factory: Computes the value.
+        :return: The cached value
+        :rtype: object
+        """
+        cache = cls.__dict__.get('_class_cache')
+        if cache is None:
+            cache = cls._class_cache = {}
+        try:
+            return cache[key]
+        except KeyError:
+            value = cache[key] = factory()
+            return value
+
+    @classmethod
+    def clear_cache(cls):
+        """
+        Clears the field dicts, field types, loader options,
+        serializers and other model metadata memoized on this
+        manager class and its subclasses.  This should be called
+        if the fields or model of the manager are changed after
+        it has been used.
+        """
+        cls._class_cache = {}
+        for subclass in cls.__subclasses__():
+            subclass.clear_cache()
+
+    def dot_field_list_to_dict(self, fields=None):
+        """
+        Memoized version of BaseManager.dot_field_list_to_dict.
+        The returned dictionary is shared and must not be mutated.
+
+        :param list fields:
+        :return: A dictionary of the fields layered as to
+            indicate relationships.
+        :rtype: dict
+        """
+        fields = tuple(fields or self.fields)
+        base = super(AlchemyManager, self).dot_field_list_to_dict
+        return self._memoize(('field_dict', fields), lambda: base(fields))
+
     @classmethod
     def get_field_type(cls, name):
         """
@@ -120,17 +266,28 @@ class AlchemyManager(BaseManager):
             translating a string input into the appropriate format.
         :rtype: ripozo.viewsets.fields.base.BaseField
         """
+        return cls._memoize(('field_type', cls.model, name),
+                            lambda: cls._create_field_type(name))
+
+    @classmethod
+    def _create_field_type(cls, name):
+        """
+        Creates the field for get_field_type.
+
+        :param unicode name:
+        :rtype: ripozo.viewsets.fields.base.BaseField
+        """
         python_type = cls._get_field_python_type(cls.model, name)
         if python_type in _COLUMN_FIELD_MAP:
             field_class = _COLUMN_FIELD_MAP[python_type]
             return field_class(name)
         return BaseField(name)
 
-    @db_access_point
-    def create(self, session, values, *args, **kwargs):
+    def create(self, values, *args, **kwargs):
         """
         Creates a new instance of the self.model
-        and persists it to the database.
+        and persists it to the database.  If group_commit
+        is set, it is committed together with other writes.
 
         :param dict values: The dictionary of values to
             set on the model.  The key is the column name
@@ -138,25 +295,56 @@ class AlchemyManager(BaseManager):
             the cls._create_fields is defined then it will
             use those fields.  Otherwise, it will use the
             fields defined in cls.fields
-        :param Session session: The sqlalchemy session
         :return: The serialized model.  It will use the self.fields
             attribute for this.
         :rtype: dict
         """
+        if self.group_commit is not None:
+            return self.group_commit.submit(self, '_create_in_session', values)
+        return self._create(values, *args, **kwargs)
+
+    @db_access_point
+    def _create(self, session, values, *args, **kwargs):
+        """
+        Creates the model and commits it.
+
+        :param Session session: The sqlalchemy session
+        :param dict values: The dictionary of values to
+            set on the model.
+        :return: The serialized model.
+        :rtype: dict
+        """
+        resp = self._create_in_session(session, values)
+        session.commit()
+        return resp
+
+    def _create_in_session(self, session, values):
+        """
+        Adds a new instance of the self.model to the session
+        and serializes it without committing.  The model is
+        flushed and serialized before the commit since the
+        commit would expire it and serializing would then
+        reload the row that was just inserted.
+
+        :param Session session: The sqlalchemy session
+        :param dict values: The dictionary of values to
+            set on the model.
+        :return: The serialized model.
+        :rtype: dict
+        """
         model = self.model()
         model = self._set_values_on_model(model, values, fields=self.create_fields)
         session.add(model)
-        session.commit()
+        session.flush()
         return self.serialize_model(model)
 
-    @db_access_point
-    def retrieve(self, session, lookup_keys, *args, **kwargs):
+    def retrieve(self, lookup_keys, *args, **kwargs):
         """
         Retrieves a model using the lookup keys provided.
         Only one model should be returned by the lookup_keys
-        or else the manager will fail.
+        or else the manager will fail.  If the retrieve_cache
+        is set, the model is read from the cache when possible.
 
-        :param Session session: The SQLAlchemy session to use
         :param dict lookup_keys: A dictionary mapping the fields
             and their expected values
         :return: The dictionary of keys and values for the retrieved
@@ -165,61 +353,149 @@ class AlchemyManager(BaseManager):
         :rtype: dict
         :raises: NotFoundException
         """
-        model = self._get_model(lookup_keys, session)
-        return self.serialize_model(model)
+        cache = self.retrieve_cache
+        key = self._get_retrieve_cache_key(lookup_keys) if cache is not None else None
+        return self._read_through(cache, key, self._retrieve, lookup_keys, *args, **kwargs)
 
-    @db_access_point
-    def retrieve_list(self, session, filters, *args, **kwargs):
+    @staticmethod
+    def _read_through(cache, key, func, *args, **kwargs):
+        """
+        Gets the value from the cache or calls the function
+        and caches its result.  Copies of the cached values
+        are returned since callers may modify them.  Values read
+        by a session with uncommitted writes are not cached.
+
+        :param BaseCache cache: The cache to use.
+        :param tuple key: The key of the value or None if
+            the value cannot be cached.
+        :param function func: Reads the value from the database.
+        :return: The value
+        :rtype: object
+        """
+        if key is None:
+            return func(*args, **kwargs)
+        value = cache.get(key)
+        if value is None:
+            epoch = caching.table_versions.epoch
+            uncommitted_reads = caching.uncommitted_reads()
+            value = func(*args, **kwargs)
+            # Values read while the tables were written may be stale
+            if epoch == caching.table_versions.epoch and \
+                    uncommitted_reads == caching.uncommitted_reads():
+                cache.set(key, copy.deepcopy(value))
+            return value
+        return copy.deepcopy(value)
+
+    def _get_retrieve_cache_key(self, lookup_keys):
+        """
+        :param dict lookup_keys: The keys passed to retrieve
+        :return: The key of the model in the retrieve_cache or
+            None if the result of the lookup cannot be cached.
+        :rtype: tuple
+        """
+        if not self._uses_default_queryset():
+            return None
+        identity = self._get_identity(lookup_keys)
+        if identity is None:
+            return None
+        table, field_key, related = self._memoize(
+            ('retrieve_cache_key', self.model, tuple(self.fields)),
+            self._create_retrieve_cache_key)
+        return caching.table_versions.row_cache_key(table, identity, field_key, related)
+
+    def _create_retrieve_cache_key(self):
+        """
+        Creates the parts of the key for _get_retrieve_cache_key
+        and registers them so that cached models are invalidated.
+
+        :return: The table, the frozen field dict and the related tables
+        :rtype: tuple
+        """
+        mapper = inspect(self.model)
+        field_dict = self.dot_field_list_to_dict(self.fields)
+        table = caching.get_table_name(mapper)
+        field_key = _freeze_field_dict(field_dict)
+        related = caching.get_related_table_names(mapper, field_dict)
+        caching.table_versions.register_row_key(table, field_key, related)
+        return table, field_key, related
+
+    def _get_identity(self, lookup_keys):
+        """
+        Gets the primary key identified by the lookup_keys.
+
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :return: The translated primary key values in the order
+            of the mapper's primary key or None if the lookup_keys
+            are not the primary key.
+        :rtype: tuple
+        """
+        names = _get_primary_key_names(self.model)
+        if set(lookup_keys) != set(names):
+            return None
+        try:
+            return tuple(self.get_field_type(name).translate(lookup_keys[name])
+                         for name in names)
+        except (TranslationException, ValidationException):
+            return None
+
+    @db_read_access_point
+    def _retrieve(self, session, lookup_keys, *args, **kwargs):
+        """
+        Retrieves the model from the database.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :return: The serialized model
+        :rtype: dict
+        :raises: NotFoundException
+        """
+        field_dict = self.dot_field_list_to_dict(self.fields)
+        reader = self._get_core_reader(field_dict)
+        if reader is not None:
+            rows = reader.query(session, lookup_keys).limit(2).all()
+            if not rows:
+                raise self._not_found(lookup_keys)
+            if len(rows) > 1:
+                raise MultipleResultsFound('Multiple rows were found for one()')
+            return reader.serialize(session, rows)[0]
+        options = self._get_loader_options(field_dict)
+        model = self._get_model(lookup_keys, session, options=options)
+        return self.serialize_model(model, field_dict=field_dict)
+
+    def _map_read_sessions(self, func):
         """
-        Retrieves a list of the model for this manager.
-        It is restricted by the filters provided.
+        Calls the function with a read session or, if the
+        session handler is sharded, with a session for every shard.
 
+        :param function func: Called with a session
+        :return: The list of return values
+        :rtype: list
+        """
+        map_shards = getattr(self.session_handler, 'map_shards', None)
+        if map_shards is not None:
+            return map_shards(func)
+        return [self._call_with_read_session(func)]
+
+    @db_read_access_point
+    def _call_with_read_session(self, session, func):
+        """
         :param Session session: The SQLAlchemy session to use
-        :param dict filters: The filters to restrict the returned
-            models on
-        :return: A tuple of the list of dictionary representation
-            of the models and the dictionary of meta data
-        :rtype: list, dict
-        """
-        query = self.queryset(session)
-        translator = IntegerField('tmp')
-        pagination_count = translator.translate(
-            filters.pop(self.pagination_count_query_arg, self.paginate_by)
-        )
-        pagination_pk = translator.translate(
-            filters.pop(self.pagination_pk_query_arg, 1)
-        )
-        pagination_pk -= 1  # logic works zero based. Pagination shouldn't be though
-
-        query = query.filter_by(**filters)
-
-        if pagination_pk:
-            query = query.offset(pagination_pk * pagination_count)
-        if pagination_count:
-            query = query.limit(pagination_count + 1)
-
-        count = query.count()
-        next_link = None
-        previous_link = None
-        if count > pagination_count:
-            next_link = {self.pagination_pk_query_arg: pagination_pk + 2,
-                         self.pagination_count_query_arg: pagination_count}
-        if pagination_pk > 0:
-            previous_link = {self.pagination_pk_query_arg: pagination_pk,
-                             self.pagination_count_query_arg: pagination_count}
-
-        field_dict = self.dot_field_list_to_dict(self.list_fields)
-        props = self.serialize_model(query[:pagination_count], field_dict=field_dict)
-        meta = dict(links=dict(next=next_link, previous=previous_link))
-        return props, meta
+        :param function func: Called with the session
+        :return: The return value of the function
+        :rtype: object
+        """
+        return func(session)
 
-    @db_access_point
-    def update(self, session, lookup_keys, updates, *args, **kwargs):
+    def update(self, lookup_keys, updates, *args, **kwargs):
         """
         Updates the model with the specified lookup_keys and returns
-        the dictified object.
+        the dictified object.  If the database supports it and every
+        field is a column, this is a single UPDATE ... RETURNING.
+        If group_commit is set, it is committed together with
+        other writes.
 
-        :param Session session: The SQLAlchemy session to use
         :param dict lookup_keys: A dictionary mapping the fields
             and their expected values
         :param dict updates: The columns and the values to update
@@ -229,16 +505,222 @@ class AlchemyManager(BaseManager):
             fields attrbute on the class
         :rtype: dict
         :raises: NotFoundException
+        :raises: MultipleResultsFound
         """
-        model = self._get_model(lookup_keys, session)
-        model = self._set_values_on_model(model, updates, fields=self.update_fields)
+        if self.group_commit is not None:
+            return self.group_commit.submit(self, '_update_in_session', lookup_keys, updates)
+        return self._update(lookup_keys, updates, *args, **kwargs)
+
+    @db_access_point
+    def _update(self, session, lookup_keys, updates, *args, **kwargs):
+        """
+        Updates the model and commits it.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :param dict updates: The columns and the values to update
+            them to.
+        :return: The serialized model.
+        :rtype: dict
+        """
+        resp = self._update_in_session(session, lookup_keys, updates)
         session.commit()
+        return resp
+
+    def _update_in_session(self, session, lookup_keys, updates):
+        """
+        Updates the model and serializes it without committing.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :param dict updates: The columns and the values to update
+            them to.
+        :return: The serialized model.
+        :rtype: dict
+        :raises: NotFoundException
+        :raises: MultipleResultsFound
+        """
+        values = dict((name, value) for name, value in six.iteritems(updates)
+                      if name in self.update_fields)
+        names = self._get_update_returning_field_names(session, values)
+        if names is not None:
+            return self._update_returning(session, lookup_keys, values, names)
+        model = self._get_model(lookup_keys, session)
+        model = self._set_values_on_model(model, values, fields=self.update_fields)
+        session.flush()
+        # Serializing before the commit avoids reloading the expired model
         return self.serialize_model(model)
 
+    def _get_write_options(self, lookup_keys, **options):
+        """
+        Gets the execution options for an UPDATE or DELETE
+        using the lookup_keys.  If they are the primary key, only
+        the cached values for that row are invalidated instead
+        of those of the whole table.
+
+        :param dict lookup_keys: The keys of the written rows
+        :param dict options: Additional execution options
+        :return: The execution options
+        :rtype: dict
+        """
+        identity = self._get_identity(lookup_keys)
+        if identity is not None:
+            options[caching.INVALIDATE_ROWS_OPTION] = [identity]
+        return options
+
+    def _update_returning(self, session, lookup_keys, values, names):
+        """
+        Updates the model with a single UPDATE ... RETURNING
+        and serializes the returned row.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :param dict values: The attributes and the values to update
+        :param tuple names: The fields to return.
+        :return: The serialized model
+        :rtype: dict
+        :raises: NotFoundException
+        :raises: MultipleResultsFound
+        """
+        statement = update(self.model).where(*[
+            getattr(self.model, name) == value for name, value in six.iteritems(lookup_keys)
+        ]).values(**values).returning(
+            *[getattr(self.model, name) for name in names]
+        ).execution_options(**self._get_write_options(lookup_keys, synchronize_session=False))
+        rows = session.execute(statement).fetchall()
+        if not rows:
+            raise self._not_found(lookup_keys)
+        if len(rows) > 1:
+            # Raised before the commit so that the update is rolled back
+            raise MultipleResultsFound('Multiple rows were found for one()')
+        mapper = inspect(self.model)
+        resp = {}
+        for name, value in zip(names, rows[0]):
+            converter = _get_json_converter(mapper, name)
+            resp[name] = converter(value) if converter else value
+        return resp
+
+    def _get_update_returning_field_names(self, session, values):
+        """
+        Gets the fields to return from an UPDATE ... RETURNING
+        if update can be run as a single statement.  This requires
+        a database that supports it, the default queryset, only
+        columns in the values and fields, and a model that does
+        not need the unit of work for validators, versioning or
+        update events.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict values: The attributes and the values to update
+        :return: The names of the fields or None if the ORM must be used
+        :rtype: tuple
+        """
+        mapper = inspect(self.model)
+        if not values or not self._uses_default_queryset():
+            return None
+        if mapper.dispatch.before_update or mapper.dispatch.after_update:
+            return None
+        if mapper.validators or mapper.version_id_col is not None:
+            return None
+        if not all(name in mapper.column_attrs for name in values):
+            return None
+        if not self._supports_update_returning(session, mapper):
+            return None
+        return self._memoize(('update_returning_fields', self.model, tuple(self.fields)),
+                             self._create_update_returning_field_names)
+
+    def _create_update_returning_field_names(self):
+        """
+        Creates the names for _get_update_returning_field_names
+
+        :return: The names or None if a field is not a column
+        :rtype: tuple
+        """
+        column_attrs = inspect(self.model).column_attrs
+        field_dict = self.dot_field_list_to_dict(self.fields)
+        if not all(not sub and name in column_attrs for name, sub in six.iteritems(field_dict)):
+            return None
+        return tuple(field_dict)
+
+    @staticmethod
+    def _supports_update_returning(session, mapper):
+        """
+        :param Session session: The sqlalchemy session
+        :param Mapper mapper: The mapper of the model being updated.
+        :return: Whether the updated rows can be returned
+            from an UPDATE statement.
+        :rtype: bool
+        """
+        if len(mapper.tables) > 1:
+            return False
+        dialect = session.get_bind(mapper=mapper).dialect
+        return bool(getattr(dialect, 'update_returning',
+                            getattr(dialect, 'full_returning', False)))
+
+    def _get_returning_field_names(self):
+        """
+        Gets the primary keys and the column fields of the
+        manager.  These are the fields that can be returned
+        from an UPDATE ... RETURNING.
+
+        :return: The attribute names
+        :rtype: tuple
+        """
+        return self._memoize(('returning_fields', self.model, tuple(self.fields)),
+                             self._create_returning_field_names)
+
+    def _create_returning_field_names(self):
+        """
+        Creates the names for _get_returning_field_names
+
+        :rtype: tuple
+        """
+        column_attrs = inspect(self.model).column_attrs
+        names = list(_get_primary_key_names(self.model))
+        for name, sub in six.iteritems(self.dot_field_list_to_dict(self.fields)):
+            if not sub and name in column_attrs and name not in names:
+                names.append(name)
+        return tuple(names)
+
+    def delete(self, lookup_keys, *args, **kwargs):
+        """
+        Deletes the model found using the lookup_keys.  If the
+        lookup_keys are the primary key and the model does not
+        need the unit of work, the row is deleted with a single
+        DELETE statement without being loaded first.  If
+        group_commit is set, it is committed together with
+        other writes.
+
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :return: An empty dictionary
+        :rtype: dict
+        :raises: NotFoundException
+        """
+        if self.group_commit is not None:
+            return self.group_commit.submit(self, '_delete_in_session', lookup_keys)
+        return self._delete(lookup_keys, *args, **kwargs)
+
     @db_access_point
-    def delete(self, session, lookup_keys, *args, **kwargs):
+    def _delete(self, session, lookup_keys, *args, **kwargs):
+        """
+        Deletes the model and commits.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :return: An empty dictionary
+        :rtype: dict
         """
-        Deletes the model found using the lookup_keys
+        resp = self._delete_in_session(session, lookup_keys)
+        session.commit()
+        return resp
+
+    def _delete_in_session(self, session, lookup_keys):
+        """
+        Deletes the model without committing.
 
         :param Session session: The SQLAlchemy session to use
         :param dict lookup_keys: A dictionary mapping the fields
@@ -247,11 +729,117 @@ class AlchemyManager(BaseManager):
         :rtype: dict
         :raises: NotFoundException
         """
+        if self._can_delete_by_primary_key(lookup_keys):
+            statement = delete(self.model).where(*[
+                getattr(self.model, name) == value for name, value in six.iteritems(lookup_keys)
+            ]).execution_options(**self._get_write_options(lookup_keys,
+                                                            synchronize_session='evaluate'))
+            if not session.execute(statement).rowcount:
+                raise self._not_found(lookup_keys)
+            return {}
         model = self._get_model(lookup_keys, session)
         session.delete(model)
-        session.commit()
+        session.flush()
         return {}
 
+    def _can_delete_by_primary_key(self, lookup_keys):
+        """
+        Determines whether the model can be deleted with a
+        single DELETE statement without loading it first.  The
+        lookup_keys must be exactly the primary key, the queryset
+        must not be overridden and the model must not need the
+        unit of work for cascades or delete events.
+
+        :param dict lookup_keys: The keys identifying the model
+        :return: Whether the fast path can be used.
+        :rtype: bool
+        """
+        if set(lookup_keys) != set(_get_primary_key_names(self.model)):
+            return False
+        if not self._uses_default_queryset():
+            return False
+        mapper = inspect(self.model)
+        if mapper.dispatch.before_delete or mapper.dispatch.after_delete:
+            return False
+        return not self._memoize(('requires_orm_delete', self.model),
+                                 lambda: _requires_orm_delete(mapper))
+
+    def _get_loader_options(self, field_dict, extra=()):
+        """
+        Gets the loader options for eagerly loading the
+        relationships in the field_dict and only loading
+        the columns that are serialized.
+
+        :param dict field_dict: The dictionary of fields
+            that will be serialized.
+        :param tuple extra: Additional column attribute names
+            that need to be loaded on the model.
+        :return: A list of loader options to apply to a query.
+        :rtype: list
+        """
+        key = ('loader_options', self.model, _freeze_field_dict(field_dict), tuple(extra))
+        return self._memoize(key, lambda: self._create_loader_options(field_dict, extra))
+
+    def _create_loader_options(self, field_dict, extra):
+        """
+        Creates the loader options for _get_loader_options
+
+        :param dict field_dict:
+        :param tuple extra:
+        :rtype: list
+        """
+        options = []
+        if self.project_columns:
+            attributes = _get_projected_attributes(inspect(self.model), field_dict, extra=extra)
+            if attributes:
+                options.append(orm.load_only(*attributes))
+        if self.eager_load:
+            options.extend(_get_loader_options(self.model, field_dict, self.eager_loaders or {},
+                                               project=self.project_columns))
+        return options
+
+    def _get_core_reader(self, field_dict, extra=()):
+        """
+        Gets the reader for serializing the field_dict straight
+        from Core result rows.
+
+        :param dict field_dict: The dictionary of fields
+            that will be serialized.
+        :param tuple extra: Additional attribute names that
+            need to be selected.
+        :return: The reader or None if core_reads is disabled
+            or the fields cannot be read with a Core select.
+        :rtype: _CoreReader
+        """
+        if not self.core_reads or not self._uses_default_queryset():
+            return None
+        frozen = _freeze_field_dict(field_dict)
+        return self._memoize(('core_reader', self.model, frozen, tuple(extra)),
+                             lambda: self._create_core_reader(frozen, extra))
+
+    def _create_core_reader(self, frozen, extra):
+        """
+        Creates the reader for _get_core_reader
+
+        :param tuple frozen:
+        :param tuple extra:
+        :rtype: _CoreReader
+        """
+        try:
+            return _CoreReader(self.model, frozen, extra=extra)
+        except _CoreUnsupported as exc:
+            _logger.info('Falling back to the ORM for %s since the field %s '
+                         'cannot be read with a Core select', self.model.__name__, exc)
+            return None
+
+    def _uses_default_queryset(self):
+        """
+        :return: Whether the queryset method has not been overridden.
+        :rtype: bool
+        """
+        queryset = getattr(self.queryset, '__func__', self.queryset)
+        return queryset is getattr(AlchemyManager.queryset, '__func__', AlchemyManager.queryset)
+
     def queryset(self, session):
         """
         The queryset to use when looking for models.
@@ -271,33 +859,30 @@ class AlchemyManager(BaseManager):
         :return: The serialized model.
         :rtype: dict
         """
-        response = self._serialize_model_helper(model, field_dict=field_dict)
-        return make_json_safe(response)
+        return self._serialize_model_helper(model, field_dict=field_dict)
 
     def _serialize_model_helper(self, model, field_dict=None):
         """
-        A recursive function for serializing a model
-        into a json ready format.
+        Serializes a model, list of models or None into a json
+        ready format.  The serializer is compiled once per
+        model and field_dict and cached on the manager class.
         """
         field_dict = field_dict or self.dot_field_list_to_dict()
-        if model is None:
-            return None
+        return self._get_serializer(field_dict)(model)
 
-        if isinstance(model, Query):
-            model = model.all()
-
-        if isinstance(model, (list, set)):
-            return [self.serialize_model(m, field_dict=field_dict) for m in model]
+    def _get_serializer(self, field_dict):
+        """
+        Gets the compiled serializer for the field_dict.
 
-        model_dict = {}
-        for name, sub in six.iteritems(field_dict):
-            value = getattr(model, name)
-            if sub:
-                value = self.serialize_model(value, field_dict=sub)
-            model_dict[name] = value
-        return model_dict
+        :param dict field_dict: The dictionary of fields to serialize.
+        :return: A function that takes a model, a list of models
+            or None and returns the serialized value.
+        :rtype: function
+        """
+        serializers = self._memoize(('serializers',), dict)
+        return _compile_serializer(self.model, _freeze_field_dict(field_dict), serializers)
 
-    def _get_model(self, lookup_keys, session):
+    def _get_model(self, lookup_keys, session, options=None):
         """
         Gets the sqlalchemy Model instance associated with
         the lookup keys.
@@ -305,13 +890,52 @@ class AlchemyManager(BaseManager):
         :param dict lookup_keys: A dictionary of the keys
             and their associated values.
         :param Session session: The sqlalchemy session
+        :param list options: Loader options to apply to the query.
         :return: The sqlalchemy orm model instance.
         """
+        if lookup_keys and self._uses_default_queryset():
+            names = _get_primary_key_names(self.model)
+            if set(lookup_keys) == set(names):
+                model = self._get_model_by_identity(
+                    session, tuple(lookup_keys[name] for name in names), options)
+                if model is None:
+                    raise self._not_found(lookup_keys)
+                return model
         try:
-            return self.queryset(session).filter_by(**lookup_keys).one()
+            query = self.queryset(session)
+            if options:
+                query = query.options(*options)
+            return query.filter_by(**lookup_keys).one()
         except NoResultFound:
-            raise NotFoundException('No model of type {0} was found using '
-                                    'lookup_keys {1}'.format(self.model.__name__, lookup_keys))
+            raise self._not_found(lookup_keys)
+
+    def _get_model_by_identity(self, session, identity, options=None):
+        """
+        Gets the model by its primary key.  The session's identity
+        map is checked first so repeated lookups of the same model
+        do not run any SQL.
+
+        :param Session session: The sqlalchemy session
+        :param tuple identity: The primary key values in the
+            order of the mapper's primary key.
+        :param list options: Loader options to apply if
+            the model needs to be loaded.
+        :return: The model or None if it does not exist.
+        :rtype: Model
+        """
+        options = options or ()
+        if hasattr(session, 'get'):
+            return session.get(self.model, identity, options=options)
+        return session.query(self.model).options(*options).get(identity)
+
+    def _not_found(self, lookup_keys):
+        """
+        :param dict lookup_keys: The keys that did not match a model
+        :return: The exception to raise when no model was found
+        :rtype: NotFoundException
+        """
+        return NotFoundException('No model of type {0} was found using '
+                                 'lookup_keys {1}'.format(self.model.__name__, lookup_keys))
 
     def _set_values_on_model(self, model, values, fields=None):
         """
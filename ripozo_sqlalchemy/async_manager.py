@@ -0,0 +1,244 @@
+"""
+Contains the AsyncAlchemyManager which exposes the
+AlchemyManager's operations as coroutines using SQLAlchemy's
+asyncio extension.  It requires Python 3.6+ and SQLAlchemy 1.4+.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from functools import wraps
+
+from ripozo_sqlalchemy.alchemymanager import AlchemyManager
+from ripozo_sqlalchemy.session_handlers import SessionHandler
+
+
+def async_db_access_point(func):
+    """
+    The asyncio counterpart of db_access_point.  It wraps
+    a coroutine that accesses the database, injects an
+    AsyncSession and awaits the session handler afterwards.
+
+    :param coroutine func: The coroutine that is interacting with the database.
+    """
+    @wraps(func)
+    async def wrapper(self, *args, **kwargs):
+        """
+        Wrapper responsible for handling
+        sessions
+        """
+        session = self.session_handler.get_session()
+        try:
+            resp = await func(self, session, *args, **kwargs)
+        except Exception as exc:
+            await self.session_handler.handle_session(session, exc=exc)
+            raise exc
+        else:
+            await self.session_handler.handle_session(session)
+            return resp
+    return wrapper
+
+
+class _SynchronousMethods(object):
+    """
+    Restores the synchronous AlchemyManager methods that
+    the AsyncAlchemyManager overrides with coroutines.
+    """
+    create = AlchemyManager.create
+    create_many = AlchemyManager.create_many
+    import_records = AlchemyManager.import_records
+    retrieve = AlchemyManager.retrieve
+    retrieve_list = AlchemyManager.retrieve_list
+    retrieve_conditional = AlchemyManager.retrieve_conditional
+    retrieve_list_conditional = AlchemyManager.retrieve_list_conditional
+    retrieve_list_stream = AlchemyManager.retrieve_list_stream
+    update = AlchemyManager.update
+    update_many = AlchemyManager.update_many
+    delete = AlchemyManager.delete
+    delete_many = AlchemyManager.delete_many
+
+
+class AsyncAlchemyManager(AlchemyManager):
+    """
+    An AlchemyManager whose operations are coroutines.  It
+    must be used with an AsyncScopedSessionHandler or an
+    AsyncSessionHandler.
+
+    Each operation runs the AlchemyManager implementation with
+    the AsyncSession's synchronous session through ``run_sync``.
+    The fields, pagination, caches and fast paths therefore behave
+    exactly like they do for the AlchemyManager, while the database
+    driver is awaited without blocking the event loop.
+    retrieve_list_stream is an asynchronous generator that
+    reads stream_chunk_size rows at a time.
+
+    .. code-block:: python
+
+        class PersonManager(AsyncAlchemyManager):
+            model = Person
+            fields = ('id', 'first_name', 'last_name')
+
+        manager = PersonManager(AsyncScopedSessionHandler(async_engine))
+        person = await manager.retrieve(dict(id=1))
+    """
+
+    async def create(self, values, *args, **kwargs):
+        """
+        :return: The serialized model.
+        :rtype: dict
+        """
+        return await self._run_sync('create', values, *args, **kwargs)
+
+    async def create_many(self, values_list, *args, **kwargs):
+        """
+        :return: The inserted values
+        :rtype: list
+        """
+        return await self._run_sync('create_many', values_list, *args, **kwargs)
+
+    async def import_records(self, records, progress=None):
+        """
+        The records must be a synchronous iterator since
+        they are consumed inside ``run_sync``.
+
+        :return: The import report
+        :rtype: dict
+        """
+        return await self._run_sync('import_records', records, progress=progress)
+
+    async def retrieve(self, lookup_keys, *args, **kwargs):
+        """
+        :return: The serialized model.
+        :rtype: dict
+        """
+        return await self._run_sync('retrieve', lookup_keys, *args, **kwargs)
+
+    async def retrieve_list(self, filters, *args, **kwargs):
+        """
+        :return: A tuple of the list of dictionary representation
+            of the models and the dictionary of meta data
+        :rtype: list, dict
+        """
+        return await self._run_sync('retrieve_list', filters, *args, **kwargs)
+
+    async def retrieve_conditional(self, lookup_keys, if_none_match=None):
+        """
+        :return: The serialized model and its ETag
+        :rtype: dict, unicode
+        """
+        return await self._run_sync('retrieve_conditional', lookup_keys,
+                                    if_none_match=if_none_match)
+
+    async def retrieve_list_conditional(self, filters, if_none_match=None):
+        """
+        :return: A tuple of the list of dictionary representation
+            of the models and the dictionary of meta data
+        :rtype: list, dict
+        """
+        return await self._run_sync('retrieve_list_conditional', filters,
+                                    if_none_match=if_none_match)
+
+    async def retrieve_list_stream(self, filters, *args, **kwargs):
+        """
+        Streams every model matching the filters in the order of
+        the keyset fields.  The models are serialized inside ``run_sync``
+        so a server side cursor cannot be held open between them.
+        Instead stream_chunk_size rows are read at a time by seeking
+        past the keyset values of the previous chunk.  The session is
+        handled once the generator is exhausted or closed.
+
+        .. code-block:: python
+
+            async for person in manager.retrieve_list_stream({}):
+                print(person)
+
+        :param dict filters: The filters to restrict the returned
+            models on.  The pagination arguments are ignored.
+        :return: An asynchronous generator of the dictionary
+            representation of the models
+        :rtype: async_generator
+        """
+        self._pop_list_args(filters)
+        session = self.session_handler.get_session()
+        values, exc = None, None
+        try:
+            while True:
+                rows, _total = await session.run_sync(
+                    self._read_shard_page, filters, values, False, self.stream_chunk_size, None)
+                for _keyset, props in rows:
+                    yield props
+                if len(rows) < self.stream_chunk_size:
+                    break
+                values = rows[-1][0]
+        except Exception as error:
+            exc = error
+            raise
+        finally:
+            await self.session_handler.handle_session(session, exc=exc)
+
+    async def update(self, lookup_keys, updates, *args, **kwargs):
+        """
+        :return: The serialized model.
+        :rtype: dict
+        """
+        return await self._run_sync('update', lookup_keys, updates, *args, **kwargs)
+
+    async def update_many(self, filters, updates, *args, **kwargs):
+        """
+        :return: The number of updated rows
+        :rtype: dict
+        """
+        return await self._run_sync('update_many', filters, updates, *args, **kwargs)
+
+    async def delete(self, lookup_keys, *args, **kwargs):
+        """
+        :return: An empty dictionary
+        :rtype: dict
+        """
+        return await self._run_sync('delete', lookup_keys, *args, **kwargs)
+
+    async def delete_many(self, filters, *args, **kwargs):
+        """
+        :return: The number of deleted rows
+        :rtype: dict
+        """
+        return await self._run_sync('delete_many', filters, *args, **kwargs)
+
+    @async_db_access_point
+    async def _run_sync(self, session, name, *args, **kwargs):
+        """
+        Runs the synchronous implementation of an operation.
+
+        :param AsyncSession session: The session to use
+        :param unicode name: The name of the operation
+        :return: The result of the operation
+        :rtype: object
+        """
+        return await session.run_sync(self._call_synchronous, name, *args, **kwargs)
+
+    def _call_synchronous(self, session, name, *args, **kwargs):
+        """
+        Calls the synchronous implementation of the operation
+        on a copy of this manager that uses the synchronous session.
+
+        :param Session session: The AsyncSession's synchronous session
+        :param unicode name: The name of the operation
+        :return: The result of the operation
+        :rtype: object
+        """
+        manager = object.__new__(self._get_synchronous_class())
+        manager.__dict__.update(self.__dict__)
+        manager.session_handler = SessionHandler(session)
+        manager.group_commit = None
+        return getattr(manager, name)(*args, **kwargs)
+
+    @classmethod
+    def _get_synchronous_class(cls):
+        """
+        :return: A subclass of this manager whose operations
+            are the synchronous AlchemyManager methods.
+        :rtype: type
+        """
+        return cls._memoize(('synchronous_class',),
+                            lambda: type(str(cls.__name__), (_SynchronousMethods, cls), {}))
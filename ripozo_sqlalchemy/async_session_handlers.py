@@ -0,0 +1,112 @@
+"""
+Contains the session handlers for the AsyncAlchemyManager.
+They mirror the handlers in session_handlers but work with
+SQLAlchemy's asyncio extension and require Python 3.6+
+and SQLAlchemy 1.4+.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_scoped_session
+from sqlalchemy.orm import sessionmaker
+
+import asyncio
+
+try:
+    from sqlalchemy.ext.asyncio import async_sessionmaker
+except ImportError:  # SQLAlchemy 1.4
+    def async_sessionmaker(bind):
+        """
+        :param AsyncEngine bind: The engine
+        :return: A factory for AsyncSession instances
+        :rtype: sessionmaker
+        """
+        return sessionmaker(bind=bind, class_=AsyncSession)
+
+try:
+    _current_task = asyncio.current_task
+except AttributeError:  # Python < 3.7
+    _current_task = asyncio.Task.current_task
+
+
+class AsyncScopedSessionHandler(object):
+    """
+    The asyncio counterpart of the ScopedSessionHandler.
+    Sessions are scoped to the current task and closed
+    after each database access.
+    """
+
+    def __init__(self, engine):
+        """
+        :param AsyncEngine engine: A SQLAlchemy AsyncEngine.
+        """
+        self.engine = engine
+        self.session_maker = async_scoped_session(async_sessionmaker(self.engine),
+                                                  scopefunc=_current_task)
+
+    def get_session(self):
+        """
+        Gets the session for the current task.
+
+        :return: The session object.
+        :rtype: AsyncSession
+        """
+        return self.session_maker()
+
+    async def handle_session(self, session, exc=None):
+        """
+        Handles closing a session and removing it from the
+        registry so that finished tasks do not keep their sessions.
+        The session is removed even when it is handled by another
+        task than the one it was scoped to (e.g. an asynchronous
+        generator that is closed from a different task).
+
+        :param AsyncSession session: The session to close.
+        :param Exception exc: The exception raised,
+            If an exception was raised, else None
+        """
+        if exc:
+            await session.rollback()
+        await session.close()
+        registry = self.session_maker.registry.registry
+        for task, scoped in list(registry.items()):
+            if scoped is session:
+                registry.pop(task, None)
+
+
+class AsyncSessionHandler(object):
+    """
+    The asyncio counterpart of the SessionHandler.  It
+    always uses the same session and leaves the session
+    handling to the application.
+    """
+
+    def __init__(self, session):
+        """
+        :param AsyncSession session: The session to pass
+            to the Manager.
+        """
+        self.session = session
+
+    def get_session(self):
+        """
+        Gets the session
+
+        :return: The session for the manager.
+        :rtype: AsyncSession
+        """
+        return self.session
+
+    @staticmethod
+    async def handle_session(session, exc=None):
+        """
+        rolls back the session if appropriate.
+
+        :param AsyncSession session: The session in use.
+        :param Exception exc: The exception raised,
+            If an exception was raised, else None
+        """
+        if exc:
+            await session.rollback()
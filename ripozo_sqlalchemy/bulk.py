@@ -0,0 +1,369 @@
+"""
+The bulk operations of the AlchemyManager that
+write many rows in a single transaction.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import TranslationException, ValidationException
+
+from ripozo_sqlalchemy import caching
+from ripozo_sqlalchemy.access_points import db_access_point
+from ripozo_sqlalchemy.serialization import _get_json_converter, _get_primary_key_names
+
+from sqlalchemy import update
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.inspection import inspect
+
+import json
+import logging
+import six
+
+_logger = logging.getLogger(__name__)
+
+
+def _load_record(record):
+    """
+    Loads a record for import_records.
+
+    :param object record: A dictionary or a line of NDJSON
+    :return: The dictionary of values or None for a blank line
+    :rtype: dict
+    :raises: ValidationException
+    """
+    if isinstance(record, six.binary_type):
+        record = record.decode('utf-8')
+    if isinstance(record, six.string_types):
+        if not record.strip():
+            return None
+        record = json.loads(record)
+    if not isinstance(record, dict):
+        raise ValidationException('The record must be an object')
+    return record
+
+
+class BulkMixin(object):
+    """
+    Adds create_many, import_records, update_many and
+    delete_many to the AlchemyManager.
+    """
+
+    @db_access_point
+    def create_many(self, session, values_list, *args, **kwargs):
+        """
+        Creates many instances of the self.model in a single
+        transaction.  The rows are inserted in batches of
+        bulk_chunk_size using executemany instead of adding
+        model instances to the session one by one.  Where the
+        database supports it the generated primary keys are
+        returned using RETURNING.
+
+        :param Session session: The sqlalchemy session
+        :param list values_list: A list of dictionaries of values.
+            Each is translated and validated against the
+            create_fields.  Values not in the create_fields are ignored.
+        :return: A list of the serialized inserted values for the
+            column fields in the fields.  The primary keys are only
+            included if they were provided or the database
+            supports RETURNING.
+        :rtype: list
+        :raises: ValidationException
+        """
+        rows = [self._translate_bulk_values(values, self.create_fields)
+                for values in values_list]
+        self._insert_rows(session, rows)
+        session.commit()
+        return self._serialize_rows(rows)
+
+    def _serialize_rows(self, rows):
+        """
+        Serializes inserted rows like serialize_model does a
+        model.  Only the column fields with known values are
+        included since the rows were not read back.
+
+        :param list rows: The dictionaries of attribute names and values.
+        :return: The serialized rows
+        :rtype: list
+        """
+        mapper = inspect(self.model)
+        converters = [(name, _get_json_converter(mapper, name))
+                      for name, sub in six.iteritems(self.dot_field_list_to_dict())
+                      if not sub and name in mapper.column_attrs]
+        return [dict((name, converter(row[name]) if converter else row[name])
+                     for name, converter in converters if name in row) for row in rows]
+
+    def _insert_rows(self, session, rows):
+        """
+        Inserts the translated rows in batches of bulk_chunk_size
+        without committing.
+
+        :param Session session: The sqlalchemy session
+        :param list rows: The dictionaries of attribute names and values.
+            The primary keys are set on them where they are known.
+        """
+        mapper = inspect(self.model)
+        returning = self._supports_executemany_returning(session, mapper)
+        for start in range(0, len(rows), self.bulk_chunk_size):
+            chunk = rows[start:start + self.bulk_chunk_size]
+            if isinstance(session, ShardedSession):
+                self._insert_into_shards(session, mapper, chunk)
+            elif returning:
+                self._insert_returning(session, mapper, chunk)
+            else:
+                session.bulk_insert_mappings(mapper, chunk)
+        # bulk_insert_mappings does not emit any session events
+        caching.invalidate(session, tables=set(table.fullname for table in mapper.tables))
+
+    def import_records(self, records, progress=None):
+        """
+        Imports a stream of records, committing every
+        import_chunk_size valid records.  Only the current
+        chunk is held in memory so the input can be far
+        larger than what create_many could handle.  Invalid
+        records are skipped and reported instead of aborting
+        the import.  If a chunk fails to insert, each of its
+        records is retried in a transaction of its own so that
+        only the records the database rejects are skipped.
+
+        .. code-block:: python
+
+            with open('people.ndjson') as feed:
+                report = manager.import_records(feed)
+
+        :param iterator records: Dictionaries of values or lines of
+            NDJSON, e.g. an open file.  Each is translated and
+            validated against the create_fields like create_many.
+            Blank lines are skipped.
+        :param function progress: Called after every committed chunk
+            with a dictionary of the chunk number, the number of
+            records inserted by the chunk and the running
+            imported and failed totals.
+        :return: A dictionary of the number of records imported,
+            the number that failed, the number of chunks and the
+            first import_max_errors errors.  Each error has the
+            zero based index of the record in the input and a message.
+        :rtype: dict
+        """
+        report = dict(imported=0, failed=0, chunks=0, errors=[])
+
+        def fail(index, message):
+            report['failed'] += 1
+            if len(report['errors']) < self.import_max_errors:
+                report['errors'].append(dict(index=index, message=message))
+
+        def commit(chunk):
+            imported = self._import_chunk(chunk, fail)
+            report['chunks'] += 1
+            report['imported'] += imported
+            if progress is not None:
+                progress(dict(chunk=report['chunks'], imported=imported,
+                              total_imported=report['imported'], total_failed=report['failed']))
+
+        chunk = []
+        for index, record in enumerate(records):
+            try:
+                values = _load_record(record)
+                if values is None:
+                    continue
+                chunk.append((index, self._translate_bulk_values(values, self.create_fields)))
+            except (TranslationException, ValidationException, ValueError) as exc:
+                fail(index, six.text_type(exc))
+                continue
+            if len(chunk) >= self.import_chunk_size:
+                commit(chunk)
+                chunk = []
+        if chunk:
+            commit(chunk)
+        return report
+
+    def _import_chunk(self, chunk, fail):
+        """
+        Inserts and commits a chunk of import_records.
+
+        :param list chunk: Tuples of the index of the
+            record and the translated values.
+        :param function fail: Called with the index and an error
+            message for every record that could not be inserted.
+        :return: The number of records inserted
+        :rtype: int
+        """
+        try:
+            # Copied since a failed insert may have set primary keys on them
+            self._commit_rows([dict(values) for _, values in chunk])
+            return len(chunk)
+        except DBAPIError as exc:
+            if len(chunk) == 1:
+                fail(chunk[0][0], six.text_type(exc.orig))
+                return 0
+            _logger.debug('Retrying the %d records of a failed import chunk',
+                          len(chunk), exc_info=True)
+        return sum(self._import_chunk([item], fail) for item in chunk)
+
+    @db_access_point
+    def _commit_rows(self, session, rows):
+        """
+        :param Session session: The sqlalchemy session
+        :param list rows: The translated rows to insert
+        """
+        self._insert_rows(session, rows)
+        session.commit()
+
+    def _translate_bulk_values(self, values, fields):
+        """
+        Translates and validates the values for a bulk operation.
+        Only the column attributes of the model can be written
+        in bulk.
+
+        :param dict values: The values to translate.
+        :param list fields: The valid fields.
+        :return: The translated values for the valid fields.
+        :rtype: dict
+        :raises: ValidationException
+        """
+        column_attrs = inspect(self.model).column_attrs
+        translated = {}
+        for name, value in six.iteritems(values):
+            if name not in fields:
+                continue
+            if name not in column_attrs:
+                raise ValidationException('The field {0} cannot be written in '
+                                          'bulk since it is not a column'.format(name))
+            translated[name] = self.get_field_type(name).translate(value, validate=True)
+        return translated
+
+    @staticmethod
+    def _supports_executemany_returning(session, mapper):
+        """
+        :param Session session: The sqlalchemy session
+        :param Mapper mapper: The mapper of the model being inserted.
+        :return: Whether the generated primary keys can be
+            returned from an executemany INSERT.
+        :rtype: bool
+        """
+        if len(mapper.tables) > 1:
+            return False
+        dialect = session.get_bind(mapper=mapper).dialect
+        return bool(getattr(dialect, 'insert_executemany_returning', False))
+
+    @staticmethod
+    def _insert_into_shards(session, mapper, rows):
+        """
+        Inserts the rows with the unit of work, which routes
+        each row to its shard, and sets the primary keys on them.
+        A bulk insert would send every row to the same shard.
+
+        :param ShardedSession session: The sqlalchemy session
+        :param Mapper mapper: The mapper of the model being inserted.
+        :param list rows: The dictionaries of attribute names and values.
+        """
+        models = []
+        for row in rows:
+            model = mapper.class_()
+            for name, value in six.iteritems(row):
+                setattr(model, name, value)
+            models.append(model)
+        session.add_all(models)
+        session.flush()
+        names = _get_primary_key_names(mapper.class_)
+        for row, model in zip(rows, models):
+            for name in names:
+                row[name] = getattr(model, name)
+
+    @staticmethod
+    def _insert_returning(session, mapper, rows):
+        """
+        Inserts the rows and sets the generated primary keys
+        on them.  Rows with the same keys are inserted together
+        since an executemany requires the same parameters for
+        every row.
+
+        :param Session session: The sqlalchemy session
+        :param Mapper mapper: The mapper of the model being inserted.
+        :param list rows: The dictionaries of attribute names and values.
+        """
+        table = mapper.local_table
+        primary_key = [(mapper.get_property_by_column(column).key, column)
+                       for column in table.primary_key.columns]
+        statement = table.insert().returning(*[column for _, column in primary_key])
+        groups = {}
+        for row in rows:
+            groups.setdefault(frozenset(row), []).append(row)
+        for group in six.itervalues(groups):
+            params = [dict((mapper.column_attrs[name].columns[0].key, value)
+                           for name, value in six.iteritems(row)) for row in group]
+            result = session.execute(statement, params)
+            for row, returned in zip(group, result.fetchall()):
+                for index, (name, _) in enumerate(primary_key):
+                    row[name] = returned[index]
+
+    @db_access_point
+    def update_many(self, session, filters, updates, *args, **kwargs):
+        """
+        Updates every model matching the filters with a single
+        UPDATE statement instead of loading and updating the
+        models one by one.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict filters: The attributes and values that the
+            updated models must match.  At least one is required
+            so that every row cannot be updated by accident.
+        :param dict updates: The columns and the values to update
+            them to.  They are translated and validated against the
+            update_fields.  Values not in the update_fields are ignored.
+        :return: A dictionary with the number of updated rows as count.
+            If the database supports UPDATE ... RETURNING, the column
+            fields of the updated rows are included as updated.
+        :rtype: dict
+        :raises: ValidationException
+        """
+        if not filters:
+            raise ValidationException('At least one filter is required '
+                                      'to update many {0}'.format(self.model.__name__))
+        values = self._translate_bulk_values(updates, self.update_fields)
+        if not values:
+            raise ValidationException('At least one of the fields {0} '
+                                      'must be updated'.format(self.update_fields))
+        mapper = inspect(self.model)
+        if self._uses_default_queryset() and self._supports_update_returning(session, mapper):
+            returning = self._get_returning_field_names()
+            criterion = [getattr(self.model, name) == value
+                         for name, value in six.iteritems(filters)]
+            statement = update(self.model).where(*criterion).values(**values).returning(
+                *[getattr(self.model, name) for name in returning]
+            ).execution_options(synchronize_session=False)
+            rows = session.execute(statement).fetchall()
+            session.commit()
+            converters = [_get_json_converter(mapper, name) for name in returning]
+            updated = [dict((name, convert(value) if convert else value)
+                            for name, convert, value in zip(returning, converters, row))
+                       for row in rows]
+            return dict(count=len(updated), updated=updated)
+        query = self.queryset(session).filter_by(**filters)
+        count = query.update(values, synchronize_session=False)
+        session.commit()
+        return dict(count=count)
+
+    @db_access_point
+    def delete_many(self, session, filters, *args, **kwargs):
+        """
+        Deletes every model matching the filters with a single
+        DELETE statement.  Since the models are not loaded, ORM
+        level cascades and events are not run.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict filters: The attributes and values that the
+            deleted models must match.  At least one is required
+            so that the table cannot be emptied by accident.
+        :return: A dictionary with the number of deleted rows as count.
+        :rtype: dict
+        :raises: ValidationException
+        """
+        if not filters:
+            raise ValidationException('At least one filter is required '
+                                      'to delete many {0}'.format(self.model.__name__))
+        count = self.queryset(session).filter_by(**filters).delete(synchronize_session=False)
+        session.commit()
+        return dict(count=count)
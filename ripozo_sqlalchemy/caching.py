@@ -0,0 +1,414 @@
+"""
+Caches for the AlchemyManager and the bookkeeping
+that invalidates them when the database is written to.
+
+Cached values are stamped with versions of the tables
+they were read from.  Writes made through any SQLAlchemy
+session in the process are observed with session events.
+Rows written by a flush are removed from the caches directly
+while statements affecting unknown rows bump the versions
+of their tables so that stale entries are never hit again.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from abc import ABCMeta, abstractmethod
+from collections import OrderedDict
+
+from sqlalchemy import event
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.orm.events import SessionEvents
+
+import logging
+import six
+import threading
+import time
+import weakref
+
+_logger = logging.getLogger(__name__)
+
+INVALIDATE_ROWS_OPTION = 'ripozo_sqlalchemy_invalidate_rows'
+"""
+The execution option for UPDATE and DELETE statements
+that affect known rows.  Its value is a list of the primary
+key tuples of those rows.  Without it every row of the
+table is invalidated.
+"""
+
+_SESSION_INFO_KEY = '_ripozo_sqlalchemy_invalidations'
+
+_caches = weakref.WeakSet()
+
+_reads = threading.local()
+
+# Statements executed with Session.execute only emit events since SQLAlchemy 1.4
+_ORM_EXECUTE_EVENTS = hasattr(SessionEvents, 'do_orm_execute')
+
+
+@six.add_metaclass(ABCMeta)
+class BaseCache(object):
+    """
+    The interface for the caches used by the AlchemyManager.
+    Subclasses only need to implement the storage; the hit
+    and miss counters are kept here.  Subclasses must call
+    this __init__ so that the cache is invalidated on writes.
+    """
+
+    def __init__(self):
+        if not _ORM_EXECUTE_EVENTS:
+            raise RuntimeError('The caches require SQLAlchemy 1.4 or later to '
+                               'observe the statements that write to the database')
+        self.hits = 0
+        self.misses = 0
+        _caches.add(self)
+
+    def get(self, key, default=None):
+        """
+        Gets a value from the cache and counts the hit or miss.
+
+        :param tuple key: The key of the value.
+        :param object default: Returned if the key is not cached
+        :return: The cached value or the default
+        :rtype: object
+        """
+        try:
+            value = self._get(key)
+        except KeyError:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    @property
+    def stats(self):
+        """
+        :return: The number of hits and misses
+        :rtype: dict
+        """
+        return dict(hits=self.hits, misses=self.misses)
+
+    @abstractmethod
+    def _get(self, key):
+        """
+        :param tuple key: The key of the value.
+        :return: The cached value
+        :rtype: object
+        :raises: KeyError
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def set(self, key, value):
+        """
+        :param tuple key: The key of the value.
+        :param object value: The value to cache.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def delete(self, key):
+        """
+        Removes the key if it is cached.
+
+        :param tuple key: The key to remove.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def clear(self):
+        """
+        Removes every value from the cache.
+        """
+        raise NotImplementedError
+
+
+class LRUCache(BaseCache):
+    """
+    An in process cache that evicts the least recently
+    used values once it holds max_size values.  Values
+    older than ttl seconds are treated as missing.
+    """
+
+    def __init__(self, max_size=1024, ttl=None, timer=time.time):
+        """
+        :param int max_size: The maximum number of cached values
+        :param float ttl: The number of seconds a value is valid
+            for or None if values do not expire.
+        :param function timer: Returns the current time in seconds.
+        """
+        super(LRUCache, self).__init__()
+        self.max_size = max_size
+        self.ttl = ttl
+        self.timer = timer
+        self._values = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._values)
+
+    def _get(self, key):
+        with self._lock:
+            expires, value = self._values.pop(key)
+            if expires is not None and expires <= self.timer():
+                raise KeyError(key)
+            self._values[key] = expires, value
+            return value
+
+    def set(self, key, value):
+        expires = None if self.ttl is None else self.timer() + self.ttl
+        with self._lock:
+            self._values.pop(key, None)
+            self._values[key] = expires, value
+            while len(self._values) > self.max_size:
+                self._values.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._values.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class _TableVersions(object):
+    """
+    Keeps the versions of the tables used to stamp cached values.
+
+    Every write to a table bumps its version.  Writes to rows
+    that are not known bump the generation of the table as well.
+    Values cached for single rows are stamped with the generation
+    of their own table and the versions of their related tables,
+    so writes to other rows of the same table keep them valid.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.versions = {}
+        self.generations = {}
+        self.row_keys = {}
+        self.epoch = 0
+
+    def stamp(self, tables, generations=()):
+        """
+        :param tuple tables: The names of the tables whose
+            versions are included.
+        :param tuple generations: The names of the tables whose
+            generations are included.
+        :return: The current stamp for the tables
+        :rtype: tuple
+        """
+        return tuple(self.generations.get(table, 0) for table in generations) + \
+            tuple(self.versions.get(table, 0) for table in tables)
+
+    def register_row_key(self, table, field_key, related):
+        """
+        Registers how the values cached for the rows of a
+        table are keyed so that they can be invalidated.
+
+        :param unicode table: The name of the table of the rows
+        :param tuple field_key: The frozen field dict of the values
+        :param tuple related: The names of the related tables
+        """
+        with self._lock:
+            self.row_keys.setdefault(table, set()).add((field_key, related))
+
+    def row_cache_key(self, table, identity, field_key, related):
+        """
+        :param unicode table: The name of the table of the row
+        :param tuple identity: The primary key of the row
+        :param tuple field_key: The frozen field dict of the value
+        :param tuple related: The names of the related tables
+        :return: The current cache key for the row
+        :rtype: tuple
+        """
+        return table, identity, field_key, self.stamp(related, generations=(table,))
+
+    def invalidate(self, rows=None, tables=(), generations=()):
+        """
+        Invalidates the cached values that depend on the written rows and tables.
+
+        :param dict rows: The names of tables mapped to the
+            primary keys of their written rows.
+        :param set tables: The names of the written tables.
+        :param set generations: The names of the tables
+            with written rows that are not known.
+        """
+        rows = rows or {}
+        with self._lock:
+            # The keys of the rows are stamped before the versions change
+            keys = [self.row_cache_key(table, identity, field_key, related)
+                    for table, identities in six.iteritems(rows)
+                    for identity in identities
+                    for field_key, related in self.row_keys.get(table, ())]
+            self.epoch += 1
+            for table in set(tables) | set(generations) | set(rows):
+                self.versions[table] = self.versions.get(table, 0) + 1
+            for table in generations:
+                self.generations[table] = self.generations.get(table, 0) + 1
+        if keys:
+            for cache in list(_caches):
+                for key in keys:
+                    cache.delete(key)
+
+
+table_versions = _TableVersions()
+
+
+def get_table_name(mapper):
+    """
+    :param Mapper mapper: A mapper.
+    :return: The name of the table that identifies the rows
+        of the mapper.  Mappers that inherit from each other
+        share the table of the base mapper.
+    :rtype: unicode
+    """
+    return mapper.base_mapper.local_table.fullname
+
+
+def get_related_table_names(mapper, field_dict):
+    """
+    Gets the tables that the serialized fields depend on
+    other than the mapper's own rows.
+
+    :param Mapper mapper: The mapper being serialized.
+    :param dict field_dict: The dictionary of fields.
+    :return: The sorted names of the tables
+    :rtype: tuple
+    """
+    tables = set()
+    for table in mapper.tables:
+        if table is not mapper.base_mapper.local_table:
+            tables.add(table.fullname)
+    for name, sub in six.iteritems(field_dict or {}):
+        if sub and name in mapper.relationships:
+            prop = mapper.relationships[name]
+            if prop.secondary is not None:
+                tables.add(prop.secondary.fullname)
+            tables.update(table.fullname for table in prop.mapper.tables)
+            tables.update(get_related_table_names(prop.mapper, sub))
+    return tuple(sorted(tables))
+
+
+def invalidate(session=None, **kwargs):
+    """
+    Invalidates the caches now and, if a session is given,
+    again after it commits.  Invalidating again after the
+    commit removes values cached by concurrent reads of the
+    data that was committed before.
+
+    :param Session session: The session the write was made with.
+    :param dict kwargs: The keyword arguments for
+        _TableVersions.invalidate
+    """
+    table_versions.invalidate(**kwargs)
+    if session is not None:
+        session.info.setdefault(_SESSION_INFO_KEY, []).append(kwargs)
+
+
+def has_uncommitted_writes(session):
+    """
+    :param Session session: A session
+    :return: Whether the session has writes that are
+        not flushed or flushed but not yet committed.
+    :rtype: bool
+    """
+    return bool(session.new or session.dirty or session.deleted or
+                session.info.get(_SESSION_INFO_KEY))
+
+
+def record_read(session):
+    """
+    Records a read made by the current thread.  Values read
+    by a session with uncommitted writes may never be committed
+    so reads through the caches check uncommitted_reads to
+    avoid caching them.
+
+    :param Session session: The session used for the read
+    """
+    if has_uncommitted_writes(session):
+        _reads.uncommitted = uncommitted_reads() + 1
+
+
+def uncommitted_reads():
+    """
+    :return: The number of reads made by the current thread
+        with sessions that had uncommitted writes.
+    :rtype: int
+    """
+    return getattr(_reads, 'uncommitted', 0)
+
+
+def _get_written_rows(session):
+    """
+    :param Session session: The flushed session
+    :return: The written rows and tables
+    :rtype: dict
+    """
+    rows = {}
+    tables = set()
+    for instance in list(session.new) + list(session.dirty) + list(session.deleted):
+        state = inspect(instance)
+        mapper = state.mapper
+        identity = mapper.primary_key_from_instance(instance)
+        rows.setdefault(get_table_name(mapper), set()).add(tuple(identity))
+        tables.update(table.fullname for table in mapper.tables)
+        for prop in mapper.relationships:
+            if prop.secondary is not None:
+                tables.add(prop.secondary.fullname)
+    return dict(rows=rows, tables=tables)
+
+
+@event.listens_for(Session, 'after_flush')
+def _after_flush(session, flush_context):  # pylint: disable=unused-argument
+    """Invalidates the rows written by the flush"""
+    if _caches:
+        invalidate(session, **_get_written_rows(session))
+
+
+def _do_orm_execute(orm_execute_state):
+    """Invalidates the rows or tables written by a statement"""
+    statement = orm_execute_state.statement
+    if not _caches or not getattr(statement, 'is_dml', False):
+        return
+    table = getattr(statement, 'table', None)
+    if table is None:
+        return
+    mapper = orm_execute_state.bind_mapper
+    table_name = get_table_name(mapper) if mapper is not None else table.fullname
+    tables = set([table.fullname, table_name])
+    identities = orm_execute_state.execution_options.get(INVALIDATE_ROWS_OPTION)
+    if getattr(statement, 'is_insert', False):
+        invalidate(orm_execute_state.session, tables=tables)
+    elif identities is not None:
+        invalidate(orm_execute_state.session, tables=tables,
+                   rows={table_name: set(tuple(identity) for identity in identities)})
+    else:
+        invalidate(orm_execute_state.session, tables=tables, generations=tables)
+
+
+@event.listens_for(Session, 'after_commit')
+def _after_commit(session):
+    """Invalidates the writes of the transaction again"""
+    for kwargs in session.info.pop(_SESSION_INFO_KEY, ()):
+        table_versions.invalidate(**kwargs)
+
+
+@event.listens_for(Session, 'after_soft_rollback')
+def _after_soft_rollback(session, previous_transaction):
+    """
+    Invalidates the writes that were rolled back since values
+    read inside the transaction may have been cached.
+    """
+    invalidations = session.info.get(_SESSION_INFO_KEY, ())
+    if previous_transaction.parent is None:
+        invalidations = session.info.pop(_SESSION_INFO_KEY, ())
+    for kwargs in invalidations:
+        table_versions.invalidate(**kwargs)
+
+
+if _ORM_EXECUTE_EVENTS:
+    event.listen(Session, 'do_orm_execute', _do_orm_execute)
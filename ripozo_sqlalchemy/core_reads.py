@@ -0,0 +1,271 @@
+"""
+Reads the fields of the AlchemyManager with Core selects
+and serializes them straight from the result rows without
+creating model instances.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy.serialization import _get_json_converter, _get_primary_key_names
+
+from sqlalchemy import orm, select, tuple_
+from sqlalchemy.inspection import inspect
+
+import six
+
+_COLUMN = 'column'
+_RELATED = 'related'
+_COLLECTION = 'collection'
+_CORE_IN_CHUNK_SIZE = 500
+
+
+class _CoreUnsupported(Exception):
+    """
+    Raised when a field dict cannot be read with a Core select.
+    """
+
+
+class _CoreQuery(object):
+    """
+    Wraps the select of a _CoreReader so that it can be
+    filtered and paginated like an ORM Query.  ``all()`` returns
+    the raw result rows instead of model instances.
+    """
+
+    def __init__(self, session, statement):
+        self.session = session
+        self.statement = statement
+
+    def filter(self, *criterion):
+        return _CoreQuery(self.session, self.statement.where(*criterion))
+
+    def order_by(self, *clauses):
+        return _CoreQuery(self.session, self.statement.order_by(*clauses))
+
+    def limit(self, limit):
+        return _CoreQuery(self.session, self.statement.limit(limit))
+
+    def offset(self, offset):
+        return _CoreQuery(self.session, self.statement.offset(offset))
+
+    def all(self):
+        return self.session.execute(self.statement).fetchall()
+
+    def partitions(self, size):
+        """
+        Streams the rows with a server side cursor.
+
+        :param int size: The number of rows per partition
+        :return: An iterator of lists of at most size rows
+        :rtype: iterator
+        """
+        result = self.session.execute(self.statement,
+                                      execution_options=dict(stream_results=True))
+        return result.partitions(size)
+
+
+class _CoreLevel(object):
+    """
+    The columns, joins and nested collections selected for
+    one level of a field dict.  Many-to-one relationships are
+    outer joined into the same select while collections are
+    loaded by a separate select per level, keyed on the
+    primary key of their parent.
+    """
+
+    def __init__(self):
+        self.columns = []
+        self.joins = []
+        self.collections = []
+
+    def _add_column(self, expression, label=None):
+        """
+        Adds a column to the select.
+
+        :return: The position of the column in the result rows
+        :rtype: int
+        """
+        self.columns.append(expression.label(label or '_c{0}'.format(len(self.columns))))
+        return len(self.columns) - 1
+
+    def _add_primary_key(self, entity, mapper):
+        """
+        Adds the primary key columns of the entity to the select.
+
+        :return: The positions of the primary key columns.
+        :rtype: tuple
+        """
+        return tuple(self._add_column(getattr(entity, name))
+                     for name in _get_primary_key_names(mapper))
+
+    def _build(self, entity, mapper, frozen):
+        """
+        Adds the columns and joins needed for the frozen
+        field dict and compiles the function that assembles
+        a result row into the serialized dictionary.
+
+        :param entity: The model or alias the fields are selected from.
+        :param Mapper mapper: The mapper of the entity
+        :param tuple frozen: The frozen field dict.
+        :return: A function taking a row and the loaded collections
+        :rtype: function
+        :raises: _CoreUnsupported
+        """
+        specs = []
+        for name, sub in frozen or ():
+            if not sub and name in mapper.column_attrs:
+                specs.append((name, _COLUMN, self._add_column(getattr(entity, name)),
+                              _get_json_converter(mapper, name)))
+            elif sub and name in mapper.relationships:
+                prop = mapper.relationships[name]
+                if prop.uselist:
+                    keys = self._add_primary_key(entity, mapper)
+                    self.collections.append((keys, _CoreCollection(mapper.class_, prop, sub)))
+                    specs.append((name, _COLLECTION, keys, len(self.collections) - 1))
+                else:
+                    alias = orm.aliased(prop.mapper.class_)
+                    self.joins.append((alias, getattr(entity, name)))
+                    keys = self._add_primary_key(alias, prop.mapper)
+                    specs.append((name, _RELATED, keys, self._build(alias, prop.mapper, sub)))
+            else:
+                raise _CoreUnsupported(name)
+        specs = tuple(specs)
+
+        def assemble(row, loaded):
+            """Assembles the serialized dictionary from a row"""
+            model_dict = {}
+            for name, kind, position, extra in specs:
+                if kind is _COLUMN:
+                    value = row[position]
+                    model_dict[name] = extra(value) if extra else value
+                elif kind is _RELATED:
+                    if all(row[index] is None for index in position):
+                        model_dict[name] = None
+                    else:
+                        model_dict[name] = extra(row, loaded)
+                else:
+                    key = tuple(row[index] for index in position)
+                    model_dict[name] = loaded[extra].get(key, [])
+            return model_dict
+        return assemble
+
+    def _load_collections(self, session, rows):
+        """
+        Loads the collections for the rows.
+
+        :return: A list with a dictionary per collection mapping
+            the parent's primary key to the serialized collection.
+        :rtype: list
+        """
+        loaded = []
+        for keys, collection in self.collections:
+            parent_keys = set(tuple(row[index] for index in keys) for row in rows)
+            parent_keys = [key for key in parent_keys if None not in key]
+            loaded.append(collection.load(session, parent_keys) if parent_keys else {})
+        return loaded
+
+
+class _CoreReader(_CoreLevel):
+    """
+    Compiles a field dict into a Core select with explicit
+    joins and assembles the serialized dictionaries straight
+    from the result rows without creating model instances.
+    """
+
+    def __init__(self, model, frozen, extra=()):
+        """
+        :param DeclarativeMeta model: The model being read.
+        :param tuple frozen: The frozen field dict.
+        :param tuple extra: Additional attribute names to select.
+            They are labeled with their name so that they can be
+            accessed as attributes of the rows.
+        :raises: _CoreUnsupported
+        """
+        super(_CoreReader, self).__init__()
+        self.model = model
+        for name in extra:
+            self._add_column(getattr(model, name), label=name)
+        self.assemble = self._build(model, inspect(model), frozen)
+        statement = select(*self.columns).select_from(model)
+        for alias, relationship in self.joins:
+            statement = statement.outerjoin(alias, relationship)
+        self.statement = statement
+
+    def query(self, session, filters):
+        """
+        :param Session session: The SQLAlchemy session to use
+        :param dict filters: Attribute names and the values to filter on
+        :return: The filtered select
+        :rtype: _CoreQuery
+        """
+        criterion = [getattr(self.model, name) == value for name, value in six.iteritems(filters)]
+        return _CoreQuery(session, self.statement.where(*criterion))
+
+    def serialize(self, session, rows):
+        """
+        Serializes the result rows of the query.
+
+        :param Session session: The SQLAlchemy session to use
+        :param list rows: The rows returned by the query
+        :return: A list of the serialized dictionaries
+        :rtype: list
+        """
+        loaded = self._load_collections(session, rows)
+        return [self.assemble(row, loaded) for row in rows]
+
+
+class _CoreCollection(_CoreLevel):
+    """
+    Loads a collection relationship for many parents at once.
+    """
+
+    def __init__(self, parent, prop, frozen):
+        """
+        :param DeclarativeMeta parent: The model with the relationship.
+        :param RelationshipProperty prop: The collection relationship.
+        :param tuple frozen: The frozen field dict for the collection.
+        :raises: _CoreUnsupported
+        """
+        super(_CoreCollection, self).__init__()
+        self.parent_key = [getattr(parent, name) for name in _get_primary_key_names(parent)]
+        for column in self.parent_key:
+            self._add_column(column)
+        alias = orm.aliased(prop.mapper.class_)
+        self.assemble = self._build(alias, prop.mapper, frozen)
+        statement = select(*self.columns).select_from(parent).join(alias, getattr(parent, prop.key))
+        for related_alias, relationship in self.joins:
+            statement = statement.outerjoin(related_alias, relationship)
+        if prop.order_by:
+            statement = statement.order_by(*[
+                getattr(alias, prop.mapper.get_property_by_column(column).key)
+                for column in prop.order_by
+            ])
+        self.statement = statement
+
+    def load(self, session, parent_keys):
+        """
+        Loads the collections of the parents.
+
+        :param Session session: The SQLAlchemy session to use
+        :param list parent_keys: The primary keys of the parents
+        :return: The parent's primary key mapped to the
+            serialized collection.
+        :rtype: dict
+        """
+        rows = []
+        for start in range(0, len(parent_keys), _CORE_IN_CHUNK_SIZE):
+            chunk = parent_keys[start:start + _CORE_IN_CHUNK_SIZE]
+            if len(self.parent_key) == 1:
+                criterion = self.parent_key[0].in_([key[0] for key in chunk])
+            else:
+                criterion = tuple_(*self.parent_key).in_(chunk)
+            rows.extend(session.execute(self.statement.where(criterion)).fetchall())
+
+        loaded = self._load_collections(session, rows)
+        size = len(self.parent_key)
+        collections = {}
+        for row in rows:
+            collections.setdefault(tuple(row[:size]), []).append(self.assemble(row, loaded))
+        return collections
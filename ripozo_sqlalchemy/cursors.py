@@ -0,0 +1,191 @@
+"""
+Encodes the keyset values of a row into the opaque
+cursors used by keyset pagination and builds the
+criterion that seeks past them.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, date, time, timedelta, tzinfo
+from decimal import Decimal
+
+from ripozo.exceptions import TranslationException
+
+from sqlalchemy import and_, or_
+
+import base64
+import binascii
+import json
+import six
+
+_NEXT = 'next'
+_PREVIOUS = 'previous'
+
+_CURSOR_FORMATS = (
+    (datetime, 'datetime', '%Y-%m-%dT%H:%M:%S.%f'),
+    (date, 'date', '%Y-%m-%d'),
+    (time, 'time', '%H:%M:%S.%f'),
+)
+
+# Keyset values that are stored in a cursor as they are
+_JSON_SAFE_CURSOR_TYPES = six.string_types + six.integer_types + (float, bool)
+
+
+class _UTCOffset(tzinfo):
+    """
+    A fixed offset from UTC for the timezone aware
+    values in a cursor.  datetime.timezone is not
+    available on python 2.
+    """
+
+    def __init__(self, minutes):
+        self.offset = timedelta(minutes=minutes)
+
+    def utcoffset(self, dt):
+        return self.offset
+
+    def dst(self, dt):
+        return timedelta(0)
+
+    def tzname(self, dt):
+        return _format_utc_offset(self.offset)
+
+    def __repr__(self):
+        return '_UTCOffset({0})'.format(self.tzname(None))
+
+
+def _format_utc_offset(offset):
+    """
+    :param timedelta offset: The utcoffset of an aware value
+    :return: The offset in the ISO 8601 form e.g. ``'+05:30'``
+    :rtype: unicode
+    """
+    minutes = (offset.days * 86400 + offset.seconds) // 60
+    sign = '-' if minutes < 0 else '+'
+    return '{0}{1:02d}:{2:02d}'.format(sign, *divmod(abs(minutes), 60))
+
+
+def _parse_utc_offset(value):
+    """
+    Splits the ISO 8601 offset from the end of a value
+    dumped by _dump_cursor_value.
+
+    :param unicode value: The dumped datetime or time
+    :return: The value without the offset and the tzinfo
+        or None if the value is naive.
+    :rtype: unicode, tzinfo
+    """
+    if len(value) > 6 and value[-6] in '+-' and value[-3] == ':':
+        minutes = int(value[-5:-3]) * 60 + int(value[-2:])
+        return value[:-6], _UTCOffset(-minutes if value[-6] == '-' else minutes)
+    return value, None
+
+
+def _dump_cursor_value(value):
+    """
+    Makes a keyset value json serializable in a way
+    that can be reversed by _load_cursor_value.  Values
+    of other types (e.g. a UUID) are stored as text.
+    Timezone aware datetimes and times keep their offset.
+    """
+    for python_type, tag, fmt in _CURSOR_FORMATS:
+        if isinstance(value, python_type):
+            text = value.strftime(fmt)
+            if python_type is not date and value.utcoffset() is not None:
+                text += _format_utc_offset(value.utcoffset())
+            return [tag, text]
+    if isinstance(value, Decimal):
+        return ['decimal', six.text_type(value)]
+    if value is None or isinstance(value, _JSON_SAFE_CURSOR_TYPES):
+        return value
+    return ['text', six.text_type(value)]
+
+
+def _load_cursor_value(value, field):
+    """
+    Reverses _dump_cursor_value
+
+    :param object value: The dumped value
+    :param BaseField field: The field type of the keyset field
+        used to translate values stored as text.
+    """
+    if not isinstance(value, list):
+        return value
+    tag, value = value
+    if tag == 'decimal':
+        return Decimal(value)
+    if tag == 'text':
+        return field.translate(value)
+    for python_type, cursor_tag, fmt in _CURSOR_FORMATS:
+        if tag == cursor_tag:
+            value, offset = _parse_utc_offset(value)
+            parsed = datetime.strptime(value, fmt).replace(tzinfo=offset)
+            if python_type is date:
+                return parsed.date()
+            elif python_type is time:
+                return parsed.timetz()
+            return parsed
+    raise ValueError('Unknown cursor value type {0}'.format(tag))
+
+
+def _encode_cursor(direction, values):
+    """
+    Encodes the keyset values of a row into an opaque
+    cursor for the next or previous links.
+
+    :param unicode direction: Either _NEXT or _PREVIOUS
+    :param list values: The keyset values of the row
+        to page after (or before).
+    :return: A url safe cursor
+    :rtype: unicode
+    """
+    payload = json.dumps([direction, [_dump_cursor_value(v) for v in values]])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def _decode_cursor(cursor, fields):
+    """
+    Decodes a cursor created by _encode_cursor.
+
+    :param unicode cursor: The opaque cursor.
+    :param list fields: The field types of the keyset fields.
+    :return: A tuple of the direction and the keyset values
+    :rtype: tuple
+    :raises: TranslationException
+    """
+    try:
+        payload = base64.urlsafe_b64decode(cursor.encode('ascii'))
+        direction, values = json.loads(payload.decode('utf-8'))
+        if len(values) != len(fields):
+            raise ValueError('Expected {0} keyset values'.format(len(fields)))
+        values = [_load_cursor_value(v, field) for v, field in zip(values, fields)]
+    except (binascii.Error, TypeError, ValueError, UnicodeError, TranslationException):
+        raise TranslationException('Invalid pagination cursor {0}'.format(cursor))
+    if direction not in (_NEXT, _PREVIOUS):
+        raise TranslationException('Invalid pagination cursor {0}'.format(cursor))
+    return direction, values
+
+
+def _keyset_criterion(columns, values, reverse=False):
+    """
+    Builds the criterion for seeking past the row with
+    the provided keyset values.  It is equivalent to the
+    row value comparison ``(a, b) > (:a, :b)`` but
+    is written out so that it works on every backend.
+
+    :param list columns: The ordered keyset columns
+    :param list values: The keyset values of the row to seek past
+    :param bool reverse: Seek backwards instead of forwards.
+    :return: The sqlalchemy criterion
+    """
+    clauses = []
+    for index, column in enumerate(columns):
+        if reverse:
+            comparison = column < values[index]
+        else:
+            comparison = column > values[index]
+        equalities = [columns[i] == values[i] for i in range(index)]
+        clauses.append(and_(*(equalities + [comparison])))
+    return or_(*clauses)
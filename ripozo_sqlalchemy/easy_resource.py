@@ -8,6 +8,7 @@ from ripozo.resources.constructor import ResourceMetaClass
 from ripozo.resources.restmixins import CRUDL
 
 from ripozo_sqlalchemy import AlchemyManager
+from ripozo_sqlalchemy.restmixins import CreateMany, DeleteMany, Import
 
 from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import class_mapper, RelationshipProperty
@@ -70,7 +71,8 @@ def create_resource(model, session_handler, resource_bases=(CRUDL,),
                     relationships=None, links=None, preprocessors=None,
                     postprocessors=None, fields=None, paginate_by=100,
                     auto_relationships=True, pks=None, create_fields=None,
-                    update_fields=None, list_fields=None, append_slash=False):
+                    update_fields=None, list_fields=None, append_slash=False,
+                    bulk_create=False, bulk_delete=False, bulk_import=False):
         """
         Creates a ResourceBase subclass by inspecting a SQLAlchemy
         Model. This is somewhat more restrictive than explicitly
@@ -115,6 +117,12 @@ def create_resource(model, session_handler, resource_bases=(CRUDL,),
             attribute.
         :param bool append_slash: A flag to forcibly append slashes to
             the end of urls.
+        :param bool bulk_create: If True, the resource also inherits from
+            CreateMany which exposes the manager's create_many method.
+        :param bool bulk_delete: If True, the resource also inherits from
+            DeleteMany which exposes the manager's delete_many method.
+        :param bool bulk_import: If True, the resource also inherits from
+            Import which exposes the manager's import_records method.
         :return: A ResourceBase subclass and AlchemyManager subclass
         :rtype: ResourceMetaClass
         """
@@ -127,6 +135,12 @@ def create_resource(model, session_handler, resource_bases=(CRUDL,),
         pks = pks or _get_pks(model)
         fields = fields or _get_fields_for_model(model)
         list_fields = list_fields or fields
+        if bulk_create:
+            resource_bases += (CreateMany,)
+        if bulk_delete:
+            resource_bases += (DeleteMany,)
+        if bulk_import:
+            resource_bases += (Import,)
 
         create_fields = create_fields or [x for x in fields if x not in set(pks)]
         update_fields = update_fields or [x for x in fields if x not in set(pks)]
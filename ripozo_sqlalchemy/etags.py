@@ -0,0 +1,194 @@
+"""
+The conditional reads of the AlchemyManager that
+return ETags and raise a NotModifiedException when
+the client's copy is current.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy.access_points import db_read_access_point
+from ripozo_sqlalchemy.exceptions import NotModifiedException
+
+from sqlalchemy import func
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm.exc import NoResultFound
+
+import hashlib
+import json
+import six
+
+
+def _make_etag(*parts):
+    """
+    Makes a strong ETag from the parts.
+
+    :param list parts: JSON serializable values that change
+        whenever the representation changes.
+    :return: The quoted ETag
+    :rtype: unicode
+    """
+    dumped = json.dumps(parts, sort_keys=True, default=six.text_type)
+    return '"{0}"'.format(hashlib.sha1(dumped.encode('utf-8')).hexdigest())
+
+
+def _etag_matches(etag, if_none_match):
+    """
+    :param unicode etag: The current ETag.
+    :param unicode if_none_match: The value of an If-None-Match
+        header.  It may be a comma separated list of weak or
+        strong ETags or ``*``.
+    :return: Whether the client's copy is current.
+    :rtype: bool
+    """
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(','):
+        candidate = candidate.strip()
+        if candidate.startswith('W/'):
+            candidate = candidate[2:]
+        if candidate == '*' or candidate == etag:
+            return True
+    return False
+
+
+class ConditionalMixin(object):
+    """
+    Adds retrieve_conditional and retrieve_list_conditional
+    to the AlchemyManager.
+    """
+
+    def retrieve_conditional(self, lookup_keys, if_none_match=None):
+        """
+        Retrieves a model along with its ETag.  If the ETag matches
+        if_none_match, a NotModifiedException is raised instead.  When
+        there is an etag column and every field is a column of the
+        model, the model is not loaded or serialized in that case.
+
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :param unicode if_none_match: The If-None-Match header
+            sent by the client.
+        :return: The serialized model and its ETag
+        :rtype: dict, unicode
+        :raises: NotModifiedException
+        :raises: NotFoundException
+        """
+        column = self._get_etag_column(self.fields)
+        if column is not None:
+            etag = _make_etag(self.fields, self._get_etag_value(lookup_keys, column))
+            if _etag_matches(etag, if_none_match):
+                raise NotModifiedException(etag)
+            props = self.retrieve(lookup_keys)
+        else:
+            props = self.retrieve(lookup_keys)
+            etag = _make_etag(props)
+            if _etag_matches(etag, if_none_match):
+                raise NotModifiedException(etag)
+        return props, etag
+
+    def retrieve_list_conditional(self, filters, if_none_match=None):
+        """
+        Retrieves a page of the models and adds its ETag to the meta
+        data.  If the ETag matches if_none_match, a NotModifiedException
+        is raised instead.  When there is an etag column and every
+        list field is a column of the model, the ETag is computed from
+        the maximum of the column and the number of models matching
+        the filters so the page is not loaded in that case.
+
+        :param dict filters: The filters to restrict the returned
+            models on
+        :param unicode if_none_match: The If-None-Match header
+            sent by the client.
+        :return: A tuple of the list of dictionary representation
+            of the models and the dictionary of meta data
+        :rtype: list, dict
+        :raises: NotModifiedException
+        """
+        list_args = self._pop_list_args(filters)
+        column = self._get_etag_column(self.list_fields)
+        etag = None
+        if column is not None:
+            aggregate = self._get_list_etag_values(filters, column)
+            etag = _make_etag(self.list_fields, sorted(six.iteritems(filters)),
+                              list_args, aggregate)
+            if _etag_matches(etag, if_none_match):
+                raise NotModifiedException(etag)
+        cache = self.list_cache
+        key = self._get_list_cache_key(filters, list_args) if cache is not None else None
+        props, meta = self._read_through(cache, key, self._read_list, filters, list_args)
+        if etag is None:
+            etag = _make_etag(props, meta)
+            if _etag_matches(etag, if_none_match):
+                raise NotModifiedException(etag)
+        meta['etag'] = etag
+        return props, meta
+
+    def _get_etag_column(self, fields):
+        """
+        :param list fields: The fields in the representation
+        :return: The name of the column used for ETags or None
+            if there is none or a field is not a column of the model
+            (e.g. ``'children.name'``) so that the column may be
+            unchanged while the representation changed.
+        :rtype: unicode
+        """
+        mapper = inspect(self.model)
+        columns = set(prop.key for prop in mapper.column_attrs)
+        if not all(field in columns for field in fields):
+            return None
+        if self.etag_column:
+            return self.etag_column
+        if mapper.version_id_col is None:
+            return None
+        return mapper.get_property_by_column(mapper.version_id_col).key
+
+    @db_read_access_point
+    def _get_etag_value(self, session, lookup_keys, column):
+        """
+        Reads the etag column of the model alone.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict lookup_keys: A dictionary mapping the fields
+            and their expected values
+        :param unicode column: The name of the etag column
+        :return: The value of the column
+        :rtype: object
+        :raises: NotFoundException
+        """
+        query = self.queryset(session).filter_by(**lookup_keys)
+        try:
+            return query.with_entities(getattr(self.model, column)).one()[0]
+        except NoResultFound:
+            raise self._not_found(lookup_keys)
+
+    def _get_list_etag_values(self, filters, column):
+        """
+        Aggregates the etag column over the models matching
+        the filters.  The version_id_col is summed since an
+        update does not change its maximum, other columns
+        (e.g. timestamps) use the maximum.
+
+        :param dict filters: The filters without the list arguments
+        :param unicode column: The name of the etag column
+        :return: The aggregate of the column and the number of models
+        :rtype: list
+        """
+        mapper = inspect(self.model)
+        attribute = getattr(self.model, column)
+        summed = mapper.version_id_col is not None and \
+            mapper.get_property_by_column(mapper.version_id_col).key == column
+        aggregate = func.sum(attribute) if summed else func.max(attribute)
+
+        def read_aggregate(session):
+            query = self.queryset(session).filter_by(**filters).order_by(None)
+            return query.with_entities(aggregate, func.count()).one()
+
+        results = self._map_read_sessions(read_aggregate)
+        values = [value for value, count in results if value is not None]
+        if values:
+            value = sum(values) if summed else max(values)
+        else:
+            value = None
+        return [value, sum(count for value_, count in results)]
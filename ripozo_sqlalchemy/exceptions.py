@@ -0,0 +1,26 @@
+"""
+Exceptions specific to ripozo-sqlalchemy.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import RestException
+
+
+class NotModifiedException(RestException):
+    """
+    This exception is raised when a conditional
+    retrieve matches the ETag the client already has.
+    """
+    def __init__(self, etag, message=None, status_code=304, *args, **kwargs):
+        """
+        :param unicode etag: The current ETag of the resource.
+        :param unicode message: The message of the exception.
+        :param int status_code: Defaults to 304 Not Modified.
+        """
+        message = message or 'The resource has not been modified'
+        super(NotModifiedException, self).__init__(message, status_code=status_code,
+                                                   *args, **kwargs)
+        self.etag = etag
@@ -0,0 +1,190 @@
+"""
+Contains the ExecutorManager which lets asyncio applications
+call an AlchemyManager without blocking the event loop by
+running its operations in a bounded thread pool.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from ripozo_sqlalchemy.session_handlers import SessionHandler
+
+from sqlalchemy.pool import QueuePool
+
+import asyncio
+import threading
+import time
+
+_DEFAULT_MAX_WORKERS = 5
+
+
+def get_pool_capacity(engine):
+    """
+    Overflow connections are not counted since they are
+    opened and closed for every checkout beyond the pool size.
+
+    :param Engine engine: A SQLAlchemy engine.
+    :return: The number of connections the engine's QueuePool
+        keeps open or None if it does not use a QueuePool.
+    :rtype: int
+    """
+    pool = getattr(engine, 'pool', None)
+    if not isinstance(pool, QueuePool):
+        return None
+    return pool.size()
+
+
+class ExecutorManager(object):
+    """
+    Wraps an AlchemyManager so that its operations can be
+    awaited from asyncio.  Each call runs the manager's method
+    in a ThreadPoolExecutor and returns an asyncio future.
+
+    The executor has as many workers as the engine's connection
+    pool can hand out so that calls queue in the executor rather
+    than waiting for a connection inside a worker thread.  The
+    manager's session handler must give every thread its own
+    session, so the shared SessionHandler is rejected.
+
+    .. code-block:: python
+
+        people = ExecutorManager(PersonManager(ScopedSessionHandler(engine)))
+        person = await people.retrieve(dict(id=1))
+    """
+
+    def __init__(self, manager, max_workers=None):
+        """
+        :param AlchemyManager manager: The manager to call
+        :param int max_workers: The number of worker threads.
+            Defaults to the capacity of the engine's connection pool.
+        """
+        if isinstance(manager.session_handler, SessionHandler):
+            raise ValueError('The SessionHandler shares one session between threads. '
+                             'Use a ScopedSessionHandler with the ExecutorManager.')
+        if max_workers is None:
+            engine = getattr(manager.session_handler, 'engine', None)
+            max_workers = get_pool_capacity(engine) or _DEFAULT_MAX_WORKERS
+        self.manager = manager
+        self.max_workers = max_workers
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self._lock = threading.Lock()
+        self.queue_depth = 0
+        self.active = 0
+        self.completed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    @property
+    def stats(self):
+        """
+        :return: The number of queued, running and completed calls
+            and the seconds completed calls waited for a worker.
+        :rtype: dict
+        """
+        with self._lock:
+            started = self.active + self.completed
+            return dict(queue_depth=self.queue_depth, active=self.active,
+                        completed=self.completed, max_workers=self.max_workers,
+                        total_wait=self.total_wait, max_wait=self.max_wait,
+                        average_wait=self.total_wait / started if started else 0.0)
+
+    def create(self, values, *args, **kwargs):
+        """
+        :return: A future of the serialized model.
+        :rtype: asyncio.Future
+        """
+        return self._submit(self.manager.create, values, *args, **kwargs)
+
+    def retrieve(self, lookup_keys, *args, **kwargs):
+        """
+        :return: A future of the serialized model.
+        :rtype: asyncio.Future
+        """
+        return self._submit(self.manager.retrieve, lookup_keys, *args, **kwargs)
+
+    def retrieve_list(self, filters, *args, **kwargs):
+        """
+        :return: A future of the list of serialized models and the meta data
+        :rtype: asyncio.Future
+        """
+        return self._submit(self.manager.retrieve_list, filters, *args, **kwargs)
+
+    def update(self, lookup_keys, updates, *args, **kwargs):
+        """
+        :return: A future of the serialized model.
+        :rtype: asyncio.Future
+        """
+        return self._submit(self.manager.update, lookup_keys, updates, *args, **kwargs)
+
+    def delete(self, lookup_keys, *args, **kwargs):
+        """
+        :return: A future of an empty dictionary
+        :rtype: asyncio.Future
+        """
+        return self._submit(self.manager.delete, lookup_keys, *args, **kwargs)
+
+    def shutdown(self, wait=True):
+        """
+        Shuts down the executor.
+
+        :param bool wait: Whether to wait for the queued calls to finish
+        """
+        self.executor.shutdown(wait=wait)
+
+    def _submit(self, method, *args, **kwargs):
+        """
+        Queues a call to the method in the executor.
+
+        :param function method: The bound method of the manager
+        :return: A future of the method's return value
+        :rtype: asyncio.Future
+        """
+        with self._lock:
+            self.queue_depth += 1
+        func = partial(self._call, time.time(), method, *args, **kwargs)
+        try:
+            future = self.executor.submit(func)
+        except Exception:
+            with self._lock:
+                self.queue_depth -= 1
+            raise
+        future.add_done_callback(self._forget_cancelled)
+        return asyncio.wrap_future(future)
+
+    def _forget_cancelled(self, future):
+        """
+        Removes calls that were cancelled before
+        they started from the queue depth.
+
+        :param concurrent.futures.Future future: The finished call
+        """
+        if future.cancelled():
+            with self._lock:
+                self.queue_depth -= 1
+
+    def _call(self, submitted, method, *args, **kwargs):
+        """
+        Runs the method in a worker thread and records
+        how long the call waited for it.
+
+        :param float submitted: When the call was queued
+        :param function method: The bound method of the manager
+        :return: The method's return value
+        :rtype: object
+        """
+        wait = time.time() - submitted
+        with self._lock:
+            self.queue_depth -= 1
+            self.active += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+        try:
+            return method(*args, **kwargs)
+        finally:
+            with self._lock:
+                self.active -= 1
+                self.completed += 1
@@ -0,0 +1,233 @@
+"""
+Contains the GroupCommitter which commits the writes
+of many threads together in a single transaction.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy.session_handlers import SessionHandler
+
+from six.moves import queue
+
+import logging
+import threading
+import time
+
+_logger = logging.getLogger(__name__)
+
+_STOP = object()
+
+
+class _PendingWrite(object):
+    """
+    A write waiting in the queue of a GroupCommitter.
+    """
+
+    def __init__(self, manager, method, args):
+        """
+        :param AlchemyManager manager: The manager making the write
+        :param unicode method: The name of the manager method that
+            writes to a session without committing.
+        :param tuple args: The arguments for the method
+        """
+        self.manager = manager
+        self.method = method
+        self.args = args
+        self.result = None
+        self.exc = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        """
+        :return: Whether the result or exception is set
+        :rtype: bool
+        """
+        return self._done.is_set()
+
+    def run(self, session):
+        """
+        :param Session session: The session of the batch
+        :return: The return value of the write
+        :rtype: object
+        """
+        return getattr(self.manager, self.method)(session, *self.args)
+
+    def set_result(self, result):
+        """
+        :param object result: The return value for the caller
+        """
+        self.result = result
+        self._done.set()
+
+    def set_exception(self, exc):
+        """
+        :param Exception exc: The exception to raise for the caller
+        """
+        self.exc = exc
+        self._done.set()
+
+    def wait(self):
+        """
+        Waits until the write is committed.
+
+        :return: The return value of the write
+        :rtype: object
+        """
+        self._done.wait()
+        if self.exc is not None:
+            raise self.exc
+        return self.result
+
+
+class GroupCommitter(object):
+    """
+    Commits the creates, updates and deletes of many threads
+    in a single transaction.  Set it as the group_commit of
+    one or more AlchemyManagers to use it.
+
+    A worker thread collects the queued writes until
+    max_batch_size writes are queued or max_delay seconds
+    have passed since the first one.  The batch is then
+    run in one session and committed once.  Every caller
+    blocks until its write is committed and gets its own
+    result.  If any write in the batch fails the batch is
+    rolled back and every write is retried in a transaction
+    of its own so that only the failing callers get an exception.
+
+    .. code-block:: python
+
+        class PersonManager(AlchemyManager):
+            model = Person
+            fields = ('id', 'first_name')
+            group_commit = GroupCommitter(max_batch_size=50, max_delay=0.005)
+    """
+
+    def __init__(self, max_batch_size=100, max_delay=0.005):
+        """
+        :param int max_batch_size: The most writes in a transaction
+        :param float max_delay: The most seconds a write waits
+            for other writes to join its transaction.
+        """
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.batches = 0
+        self.writes = 0
+        self.retried_batches = 0
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker = None
+
+    @property
+    def stats(self):
+        """
+        :return: The number of committed batches and
+            writes and the number of batches that were retried.
+        :rtype: dict
+        """
+        return dict(batches=self.batches, writes=self.writes,
+                    retried_batches=self.retried_batches)
+
+    def submit(self, manager, method, *args):
+        """
+        Queues a write and waits until it is committed.
+
+        :param AlchemyManager manager: The manager making the write
+        :param unicode method: The name of the manager method that
+            writes to a session without committing.
+        :return: The return value of the method
+        :rtype: object
+        :raises: ValueError
+        """
+        if isinstance(manager.session_handler, SessionHandler):
+            raise ValueError('The SessionHandler session cannot be used by the '
+                             'GroupCommitter thread.  Use a ScopedSessionHandler.')
+        write = _PendingWrite(manager, method, args)
+        self._start()
+        self._queue.put(write)
+        return write.wait()
+
+    def close(self):
+        """
+        Commits the queued writes and stops the worker thread.
+        """
+        with self._lock:
+            worker, self._worker = self._worker, None
+        if worker is not None:
+            self._queue.put(_STOP)
+            worker.join()
+
+    def _start(self):
+        """
+        Starts the worker thread if it is not running.
+        """
+        with self._lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name='GroupCommitter')
+                self._worker.daemon = True
+                self._worker.start()
+
+    def _run(self):
+        """
+        Collects and commits batches until close is called.
+        """
+        stop = False
+        while not stop:
+            write = self._queue.get()
+            if write is _STOP:
+                return
+            batch = [write]
+            deadline = time.time() + self.max_delay
+            while len(batch) < self.max_batch_size:
+                timeout = deadline - time.time()
+                if timeout <= 0:
+                    break
+                try:
+                    write = self._queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if write is _STOP:
+                    stop = True
+                    break
+                batch.append(write)
+            groups = {}
+            for write in batch:
+                groups.setdefault(id(write.manager.session_handler), []).append(write)
+            for group in groups.values():
+                try:
+                    self._commit(group)
+                except Exception as exc:  # pylint: disable=broad-except
+                    _logger.exception('Unable to commit a batch of %d writes', len(group))
+                    for write in group:
+                        if not write.done:
+                            write.set_exception(exc)
+
+    def _commit(self, batch):
+        """
+        Runs the writes in one session and commits them.  If one
+        fails, each write is retried in a transaction of its own.
+
+        :param list batch: The writes sharing a session handler
+        """
+        handler = batch[0].manager.session_handler
+        session = handler.get_session()
+        try:
+            results = [write.run(session) for write in batch]
+            session.commit()
+        except Exception as exc:  # pylint: disable=broad-except
+            handler.handle_session(session, exc=exc)
+            if len(batch) == 1:
+                batch[0].set_exception(exc)
+                return
+            _logger.debug('Retrying the %d writes of a failed batch', len(batch), exc_info=True)
+            self.retried_batches += 1
+            for write in batch:
+                self._commit([write])
+            return
+        self.batches += 1
+        self.writes += len(batch)
+        for write, result in zip(batch, results):
+            write.set_result(result)
+        handler.handle_session(session)
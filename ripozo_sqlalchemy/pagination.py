@@ -0,0 +1,541 @@
+"""
+Reads the pages of retrieve_list with offset or keyset
+pagination, from a single database or merged from
+every shard, and counts their totals.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import TranslationException
+from ripozo.resources.fields.common import StringField, IntegerField
+
+from ripozo_sqlalchemy import caching
+from ripozo_sqlalchemy.access_points import db_read_access_point
+from ripozo_sqlalchemy.cursors import _NEXT, _PREVIOUS, _decode_cursor, _encode_cursor, \
+    _keyset_criterion
+from ripozo_sqlalchemy.serialization import _freeze_field_dict, _freeze_value, \
+    _get_primary_key_names
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.inspection import inspect
+
+import heapq
+import json
+import logging
+import six
+
+_logger = logging.getLogger(__name__)
+
+TOTAL_COUNT_EXACT = 'exact'
+TOTAL_COUNT_CAPPED = 'capped'
+TOTAL_COUNT_ESTIMATE = 'estimate'
+_TOTAL_COUNT_STRATEGIES = (TOTAL_COUNT_EXACT, TOTAL_COUNT_CAPPED, TOTAL_COUNT_ESTIMATE)
+
+
+class PaginationMixin(object):
+    """
+    Adds retrieve_list to the AlchemyManager.
+    """
+
+    def retrieve_list(self, filters, *args, **kwargs):
+        """
+        Retrieves a list of the model for this manager.
+        It is restricted by the filters provided.  If the
+        list_cache is set, the page is read from the cache
+        when possible.
+
+        :param dict filters: The filters to restrict the returned
+            models on
+        :return: A tuple of the list of dictionary representation
+            of the models and the dictionary of meta data
+        :rtype: list, dict
+        """
+        list_args = self._pop_list_args(filters)
+        cache = self.list_cache
+        key = self._get_list_cache_key(filters, list_args) if cache is not None else None
+        return self._read_through(cache, key, self._read_list,
+                                  filters, list_args, *args, **kwargs)
+
+    def _pop_list_args(self, filters):
+        """
+        Pops the pagination and total count arguments
+        from the retrieve_list filters.
+
+        :param dict filters: The retrieve_list filters
+        :return: A tuple of the page size, the total count strategy
+            and the page, which is the cursor for keyset pagination.
+        :rtype: tuple
+        :raises: TranslationException
+        """
+        translator = IntegerField('tmp')
+        pagination_count = translator.translate(
+            filters.pop(self.pagination_count_query_arg, self.paginate_by)
+        )
+        total_count_strategy = self._get_total_count_strategy(filters)
+        if self.keyset_pagination:
+            pagination_pk = StringField('tmp').translate(
+                filters.pop(self.pagination_pk_query_arg, None)
+            )
+        else:
+            pagination_pk = translator.translate(
+                filters.pop(self.pagination_pk_query_arg, 1)
+            )
+        return pagination_count, total_count_strategy, pagination_pk
+
+    def _get_list_cache_key(self, filters, list_args):
+        """
+        :param dict filters: The filters without the list arguments
+        :param tuple list_args: The arguments from _pop_list_args
+        :return: The key of the page in the list_cache or None
+            if the page cannot be cached.
+        :rtype: tuple
+        """
+        if not self._uses_default_queryset():
+            return None
+        try:
+            frozen_filters = _freeze_value(filters)
+            hash(frozen_filters)
+        except TypeError:
+            return None
+        table, field_key, tables = self._memoize(
+            ('list_cache_key', self.model, tuple(self.list_fields)),
+            self._create_list_cache_key)
+        return (table, frozen_filters, list_args, field_key,
+                caching.table_versions.stamp(tables))
+
+    def _create_list_cache_key(self):
+        """
+        Creates the parts of the key for _get_list_cache_key
+
+        :return: The table, the frozen field dict and the
+            tables the page depends on.
+        :rtype: tuple
+        """
+        mapper = inspect(self.model)
+        field_dict = self.dot_field_list_to_dict(self.list_fields)
+        table = caching.get_table_name(mapper)
+        tables = set(caching.get_related_table_names(mapper, field_dict))
+        tables.add(table)
+        return table, _freeze_field_dict(field_dict), tuple(sorted(tables))
+
+    def _read_list(self, filters, list_args, *args, **kwargs):
+        """
+        Reads the page from the database or, if the session
+        handler is sharded, from every shard.
+
+        :param dict filters: The filters without the list arguments
+        :param tuple list_args: The arguments from _pop_list_args
+        :return: A tuple of the list of dictionary representation
+            of the models and the dictionary of meta data
+        :rtype: list, dict
+        """
+        if hasattr(self.session_handler, 'map_shards'):
+            return self._retrieve_list_shards(filters, list_args)
+        return self._retrieve_list(filters, list_args, *args, **kwargs)
+
+    @db_read_access_point
+    def _retrieve_list(self, session, filters, list_args, *args, **kwargs):
+        """
+        Retrieves the page from the database.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict filters: The filters without the list arguments
+        :param tuple list_args: The arguments from _pop_list_args
+        :return: A tuple of the list of dictionary representation
+            of the models and the dictionary of meta data
+        :rtype: list, dict
+        """
+        pagination_count, total_count_strategy, pagination_pk = list_args
+        query = self.queryset(session)
+        field_dict = self.dot_field_list_to_dict(self.list_fields)
+        query = query.filter_by(**filters)
+        keyset_names = self._get_keyset_field_names() if self.keyset_pagination else ()
+        reader = self._get_core_reader(field_dict, extra=keyset_names)
+        if reader is not None:
+            paginated = reader.query(session, filters)
+        else:
+            paginated = query.options(*self._get_loader_options(field_dict, extra=keyset_names))
+        if self.keyset_pagination:
+            models, next_link, previous_link = self._paginate_keyset(
+                paginated, pagination_pk, pagination_count)
+        else:
+            models, next_link, previous_link = self._paginate_offset(
+                paginated, pagination_pk, pagination_count)
+
+        if reader is not None:
+            props = reader.serialize(session, models)
+        else:
+            props = self.serialize_model(models, field_dict=field_dict)
+        meta = dict(links=dict(next=next_link, previous=previous_link))
+        if total_count_strategy:
+            meta['total'], meta['total_strategy'] = self._count_total(
+                session, query, total_count_strategy)
+        return props, meta
+
+    def _retrieve_list_shards(self, filters, list_args):
+        """
+        Retrieves the page from every shard in parallel.  Each
+        shard reads its rows in the keyset order (the primary key
+        unless keyset_fields are set) and the rows are merged in
+        that order.  For offset pagination every shard reads the
+        rows up to the end of the page.
+
+        :param dict filters: The filters without the list arguments
+        :param tuple list_args: The arguments from _pop_list_args
+        :return: A tuple of the list of dictionary representation
+            of the models and the dictionary of meta data
+        :rtype: list, dict
+        """
+        pagination_count, total_count_strategy, pagination_pk = list_args
+        values, reverse, skip = None, False, 0
+        if self.keyset_pagination:
+            if pagination_pk:
+                direction, values = _decode_cursor(pagination_pk, self._get_keyset_field_types())
+                reverse = direction == _PREVIOUS
+        else:
+            skip = (pagination_pk - 1) * pagination_count
+        limit = skip + pagination_count + 1 if pagination_count else None
+
+        def read_shard(session):
+            return self._read_shard_page(session, filters, values, reverse,
+                                         limit, total_count_strategy)
+
+        results = self.session_handler.map_shards(read_shard)
+        # The shard and position break ties so that the props are never compared
+        merged = list(heapq.merge(*[
+            [(keyset, shard, position, props)
+             for position, (keyset, props) in enumerate(rows)]
+            for shard, (rows, total) in enumerate(results)
+        ]))
+        if not pagination_count:
+            rows, has_more = merged, False
+        elif reverse:
+            rows = merged[-(pagination_count + 1):]
+            has_more = len(rows) > pagination_count
+            rows = rows[-pagination_count:]
+        else:
+            rows = merged[skip:limit]
+            has_more = len(rows) > pagination_count
+            rows = rows[:pagination_count]
+
+        if self.keyset_pagination:
+            next_link, previous_link = self._get_keyset_links(
+                [row[0] for row in rows], values, reverse, has_more, pagination_count)
+        else:
+            next_link, previous_link = self._get_offset_links(
+                pagination_pk - 1, pagination_count, has_more)
+        meta = dict(links=dict(next=next_link, previous=previous_link))
+        if total_count_strategy:
+            totals = [total for rows_, total in results]
+            strategies = set(strategy for count, strategy in totals)
+            # Shards without statistics fall back to a capped count
+            strategy = strategies.pop() if len(strategies) == 1 else TOTAL_COUNT_CAPPED
+            meta['total'], meta['total_strategy'] = self._format_total(
+                sum(count for count, strategy_ in totals), strategy)
+        return [row[3] for row in rows], meta
+
+    def _read_shard_page(self, session, filters, values, reverse, limit, total_count_strategy):
+        """
+        Reads the rows of one shard for _retrieve_list_shards and
+        a chunk of AsyncAlchemyManager.retrieve_list_stream.
+
+        :param Session session: A session for the shard
+        :param dict filters: The filters without the list arguments
+        :param list values: The keyset values to seek past or None
+        :param bool reverse: Whether to read the rows before the values
+        :param int limit: The maximum number of rows or None
+        :param unicode total_count_strategy: The total count strategy or None
+        :return: A list of the keyset values and serialized
+            models in the keyset order and the unformatted total
+            for the shard from _count_rows.
+        :rtype: list, tuple
+        """
+        names = self._get_keyset_field_names()
+        field_dict = self.dot_field_list_to_dict(self.list_fields)
+        query = self.queryset(session).filter_by(**filters)
+        reader = self._get_core_reader(field_dict, extra=names)
+        if reader is not None:
+            paginated = reader.query(session, filters)
+        else:
+            paginated = query.options(*self._get_loader_options(field_dict, extra=names))
+        models = self._seek_keyset(paginated, values, reverse, limit).all()
+        if reverse:
+            models.reverse()
+        if reader is not None:
+            props = reader.serialize(session, models)
+        else:
+            props = self.serialize_model(models, field_dict=field_dict)
+        keysets = [tuple(getattr(model, name) for name in names) for model in models]
+        total = None
+        if total_count_strategy:
+            total = self._count_rows(session, query, total_count_strategy)
+        return list(zip(keysets, props)), total
+
+    def _get_total_count_strategy(self, filters):
+        """
+        Pops the requested total count strategy from the filters
+        if a client is allowed to choose one.  The requested
+        strategy is never more expensive than the class strategy.
+
+        :param dict filters: The retrieve_list filters
+        :return: The strategy to use or None
+        :rtype: unicode
+        :raises: TranslationException
+        """
+        strategy = self.total_count_strategy
+        if self.total_count_query_arg and self.total_count_query_arg in filters:
+            requested = StringField('tmp').translate(filters.pop(self.total_count_query_arg))
+            if requested and requested not in _TOTAL_COUNT_STRATEGIES:
+                raise TranslationException('Unknown total count strategy {0}.  Valid strategies '
+                                           'are {1}'.format(requested, _TOTAL_COUNT_STRATEGIES))
+            # The strategies are ordered from the most to the least expensive
+            if not requested or strategy and _TOTAL_COUNT_STRATEGIES.index(requested) >= \
+                    _TOTAL_COUNT_STRATEGIES.index(strategy):
+                strategy = requested
+        return strategy
+
+    def _count_total(self, session, query, strategy):
+        """
+        Counts the models matching the filtered query.
+
+        :param Session session: The SQLAlchemy session to use
+        :param Query query: The filtered query without pagination
+        :param unicode strategy: The total count strategy
+        :return: A tuple of the total and the strategy that was
+            actually used.  The total is ``'<cap>+'`` when a capped
+            count reached the cap.
+        :rtype: tuple
+        """
+        return self._format_total(*self._count_rows(session, query, strategy))
+
+    def _count_rows(self, session, query, strategy):
+        """
+        Counts the models matching the filtered query without
+        formatting the total so that the counts of several shards
+        can be added up.  A capped count stops at total_count_cap + 1
+        which marks that the cap was reached.
+
+        :param Session session: The SQLAlchemy session to use
+        :param Query query: The filtered query without pagination
+        :param unicode strategy: The total count strategy
+        :return: A tuple of the count and the strategy that was
+            actually used.
+        :rtype: tuple
+        """
+        query = query.order_by(None)
+        if strategy == TOTAL_COUNT_EXACT:
+            return query.count(), strategy
+        if strategy == TOTAL_COUNT_ESTIMATE:
+            estimate = self._estimate_total(session, query)
+            if estimate is not None:
+                return estimate, strategy
+        return query.limit(self.total_count_cap + 1).count(), TOTAL_COUNT_CAPPED
+
+    def _format_total(self, count, strategy):
+        """
+        :param int count: The count from _count_rows or the sum
+            of the counts of every shard
+        :param unicode strategy: The strategy the count used
+        :return: A tuple of the total and the strategy.  The total
+            is ``'<cap>+'`` when a capped count is over the cap.
+        :rtype: tuple
+        """
+        if strategy == TOTAL_COUNT_CAPPED and count > self.total_count_cap:
+            count = '{0}+'.format(self.total_count_cap)
+        return count, strategy
+
+    def _estimate_total(self, session, query):
+        """
+        Estimates the number of rows the query returns from the
+        statistics the database keeps.  Unfiltered queries use
+        ``sqlite_stat1`` on SQLite and ``pg_class.reltuples`` on
+        PostgreSQL.  Filtered queries are only estimated on
+        PostgreSQL using the planner's row estimate.
+
+        :param Session session: The SQLAlchemy session to use
+        :param Query query: The filtered query
+        :return: The estimate or None if no statistics are available
+        :rtype: int
+        """
+        table = inspect(self.model).local_table
+        dialect = session.get_bind(inspect(self.model)).dialect.name
+        unfiltered = query.whereclause is None
+        try:
+            if dialect == 'sqlite' and unfiltered:
+                stats = session.execute(text('SELECT stat FROM sqlite_stat1 WHERE tbl = :tbl'),
+                                        dict(tbl=table.name)).fetchall()
+                if stats:
+                    return max(int(row[0].split()[0]) for row in stats)
+            elif dialect == 'postgresql' and unfiltered:
+                reltuples = session.execute(text('SELECT reltuples FROM pg_class '
+                                                 'WHERE oid = to_regclass(:name)'),
+                                            dict(name=table.fullname)).scalar()
+                if reltuples is not None and reltuples >= 0:
+                    return int(reltuples)
+            elif dialect == 'postgresql':
+                connection = session.connection()
+                compiled = query.statement.compile(dialect=connection.dialect)
+                execute = getattr(connection, 'exec_driver_sql', connection.execute)
+                plan = execute('EXPLAIN (FORMAT JSON) {0}'.format(compiled.string),
+                               compiled.params).scalar()
+                if isinstance(plan, six.string_types):
+                    plan = json.loads(plan)
+                return int(plan[0]['Plan']['Plan Rows'])
+        except DBAPIError:
+            # e.g. sqlite_stat1 does not exist until ANALYZE is run
+            _logger.debug('Unable to estimate the total for %s', table.name, exc_info=True)
+        return None
+
+    def _paginate_offset(self, query, pagination_pk, pagination_count):
+        """
+        Paginates the query using an offset.  The page and
+        the row after it are fetched in a single query.
+
+        :param Query query: The filtered query
+        :param int pagination_pk: The one based page to return
+        :param int pagination_count: The number of models on a page.
+        :return: A tuple of the models on the page, the next link
+            and the previous link.
+        :rtype: tuple
+        """
+        pagination_pk -= 1  # logic works zero based. Pagination shouldn't be though
+
+        if pagination_pk:
+            query = query.offset(pagination_pk * pagination_count)
+        if pagination_count:
+            query = query.limit(pagination_count + 1)
+
+        # The extra row tells us whether there is a next page
+        # without running a separate COUNT query.
+        models = query.all()
+        next_link, previous_link = self._get_offset_links(
+            pagination_pk, pagination_count, len(models) > pagination_count)
+        return models[:pagination_count], next_link, previous_link
+
+    def _get_offset_links(self, pagination_pk, pagination_count, has_next):
+        """
+        :param int pagination_pk: The zero based page
+        :param int pagination_count: The number of models on a page.
+        :param bool has_next: Whether there is a next page
+        :return: The next link and the previous link
+        :rtype: tuple
+        """
+        next_link = None
+        previous_link = None
+        if has_next:
+            next_link = {self.pagination_pk_query_arg: pagination_pk + 2,
+                         self.pagination_count_query_arg: pagination_count}
+        if pagination_pk > 0:
+            previous_link = {self.pagination_pk_query_arg: pagination_pk,
+                             self.pagination_count_query_arg: pagination_count}
+        return next_link, previous_link
+
+    def _paginate_keyset(self, query, cursor, pagination_count):
+        """
+        Paginates the query by seeking past the keyset values
+        encoded in the cursor.  Unlike an offset, the database
+        can use the index on the keyset fields to jump straight
+        to the page so deep pages cost the same as the first.
+
+        :param Query query: The filtered query
+        :param unicode cursor: The opaque cursor from a previous
+            page's links.  None for the first page.
+        :param int pagination_count: The number of models on a page.
+        :return: A tuple of the models on the page, the next link
+            and the previous link.
+        :rtype: tuple
+        :raises: TranslationException
+        """
+        names = self._get_keyset_field_names()
+        direction, values = _NEXT, None
+        if cursor:
+            direction, values = _decode_cursor(cursor, self._get_keyset_field_types())
+        reverse = direction == _PREVIOUS
+
+        limit = pagination_count + 1 if pagination_count else None
+        models = self._seek_keyset(query, values, reverse, limit).all()
+        has_more = len(models) > pagination_count
+        models = models[:pagination_count]
+        if reverse:
+            models.reverse()
+
+        keysets = [[getattr(model, name) for name in names] for model in models]
+        next_link, previous_link = self._get_keyset_links(
+            keysets, values, reverse, has_more, pagination_count)
+        return models, next_link, previous_link
+
+    def _seek_keyset(self, query, values, reverse, limit):
+        """
+        Orders the query by the keyset fields and
+        seeks past the keyset values.
+
+        :param Query query: The filtered query
+        :param list values: The keyset values to seek past or None
+        :param bool reverse: Whether to seek backwards
+        :param int limit: The maximum number of rows or None
+        :return: The query for the page
+        :rtype: Query
+        """
+        columns = [getattr(self.model, name) for name in self._get_keyset_field_names()]
+        if values is not None:
+            query = query.filter(_keyset_criterion(columns, values, reverse=reverse))
+        if reverse:
+            query = query.order_by(*[column.desc() for column in columns])
+        else:
+            query = query.order_by(*columns)
+        if limit:
+            query = query.limit(limit)
+        return query
+
+    def _get_keyset_links(self, keysets, values, reverse, has_more, pagination_count):
+        """
+        :param list keysets: The keyset values of the models on the page
+        :param list values: The keyset values of the cursor or None
+        :param bool reverse: Whether the page was read backwards
+        :param bool has_more: Whether there are more models in
+            the direction the page was read
+        :param int pagination_count: The number of models on a page.
+        :return: The next link and the previous link
+        :rtype: tuple
+        """
+        def link(link_direction, keyset_values):
+            return {self.pagination_pk_query_arg: _encode_cursor(link_direction,
+                                                                 list(keyset_values)),
+                    self.pagination_count_query_arg: pagination_count}
+
+        if reverse:
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_link = None
+        previous_link = None
+        if keysets and has_next:
+            next_link = link(_NEXT, keysets[-1])
+        if keysets and has_previous:
+            previous_link = link(_PREVIOUS, keysets[0])
+        return next_link, previous_link
+
+    @classmethod
+    def _get_keyset_field_names(cls):
+        """
+        The ordered names of the fields that keyset
+        pagination seeks on.
+
+        :return: The keyset_fields or the primary key names.
+        :rtype: tuple
+        """
+        return cls._memoize(('keyset_fields', cls.model),
+                            lambda: tuple(cls.keyset_fields or _get_primary_key_names(cls.model)))
+
+    @classmethod
+    def _get_keyset_field_types(cls):
+        """
+        :return: The field types of the keyset fields
+            for translating the values in a cursor.
+        :rtype: list
+        """
+        return [cls.get_field_type(name) for name in cls._get_keyset_field_names()]
@@ -0,0 +1,197 @@
+"""
+Resource mixins for the bulk operations
+provided by the AlchemyManager.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.decorators import apimethod, manager_translate
+from ripozo.exceptions import ValidationException
+from ripozo.resources.resource_base import ResourceBase
+from ripozo.resources.restmixins import Retrieve, RetrieveList
+
+import logging
+import six
+
+_logger = logging.getLogger(__name__)
+
+
+def _get_bulk_values(cls, request):
+    """
+    Gets the list of values from the request body.
+
+    :param ResourceMetaClass cls: The resource class handling the request.
+    :param RequestContainer request: The request in the standardized
+        ripozo style.
+    :return: The list of dictionaries of values.
+    :rtype: list
+    :raises: ValidationException
+    """
+    values_list = request.body_args.get(cls.bulk_body_arg)
+    if not isinstance(values_list, (list, tuple)) or \
+            not all(isinstance(values, dict) for values in values_list):
+        raise ValidationException('The {0} body argument must be a list '
+                                  'of objects'.format(cls.bulk_body_arg))
+    return values_list
+
+
+def _get_if_none_match(request):
+    """
+    :param RequestContainer request: The request in the standardized
+        ripozo style.
+    :return: The If-None-Match header of the request
+    :rtype: unicode
+    """
+    headers = request.headers or {}
+    return headers.get('If-None-Match', headers.get('if-none-match'))
+
+
+class CreateMany(ResourceBase):
+    """
+    A base class to extend that allows for
+    creating many resources in a single request
+    using the manager's create_many method.  The
+    request body must contain a list of objects
+    in the bulk_body_arg.
+    """
+    __abstract__ = True
+    bulk_body_arg = 'items'
+
+    @apimethod(route='/bulk', methods=['POST'], no_pks=True)
+    def create_many(cls, request):
+        """
+        Creates the resources in the request body.
+
+        :param RequestContainer request: The request in the standardized
+            ripozo style.
+        :return: An instance of the class
+            that was called.
+        :rtype: CreateMany
+        """
+        _logger.debug('Creating many resources using manager %s', cls.manager)
+        props = cls.manager.create_many(_get_bulk_values(cls, request))
+        return cls(properties={cls.resource_name: props}, status_code=201, no_pks=True)
+
+
+class Import(ResourceBase):
+    """
+    A base class to extend that allows for importing
+    a feed of resources using the manager's import_records
+    method.  The import_body_arg must hold either a list
+    of objects or a string of newline delimited JSON.
+    Invalid records are reported instead of failing the request.
+    """
+    __abstract__ = True
+    import_body_arg = 'records'
+
+    @apimethod(route='/import', methods=['POST'], no_pks=True)
+    def import_records(cls, request):
+        """
+        Imports the records in the request body.
+
+        :param RequestContainer request: The request in the standardized
+            ripozo style.
+        :return: An instance of the class
+            that was called.
+        :rtype: Import
+        :raises: ValidationException
+        """
+        _logger.debug('Importing resources using manager %s', cls.manager)
+        records = request.body_args.get(cls.import_body_arg)
+        if isinstance(records, six.string_types):
+            records = records.splitlines()
+        elif not isinstance(records, (list, tuple)):
+            raise ValidationException('The {0} body argument must be a list of objects '
+                                      'or newline delimited JSON'.format(cls.import_body_arg))
+        props = cls.manager.import_records(records)
+        return cls(properties=props, status_code=200, no_pks=True)
+
+
+class DeleteMany(ResourceBase):
+    """
+    A base class to extend that allows for
+    deleting every resource matching the query
+    arguments using the manager's delete_many method.
+    """
+    __abstract__ = True
+
+    @apimethod(route='/bulk', methods=['DELETE'], no_pks=True)
+    @manager_translate(fields_attr='list_fields')
+    def delete_many(cls, request):
+        """
+        Deletes the resources matching the query arguments.
+
+        :param RequestContainer request: The request in the standardized
+            ripozo style.
+        :return: An instance of the class
+            that was called.
+        :rtype: DeleteMany
+        """
+        _logger.debug('Deleting many resources using manager %s', cls.manager)
+        props = cls.manager.delete_many(request.query_args)
+        return cls(properties=props, status_code=200, no_pks=True)
+
+
+class ConditionalRetrieve(Retrieve):
+    """
+    Retrieves an individual resource using the manager's
+    retrieve_conditional method.  The ETag is added to the
+    meta data and a NotModifiedException is raised if it
+    matches the If-None-Match header.  It must come before
+    any other Retrieve class in the bases of a resource.
+    """
+    __abstract__ = True
+
+    @apimethod(methods=['GET'])
+    @manager_translate()
+    def retrieve(cls, request):
+        """
+        Retrieves an individual resource unless the client's copy is current.
+
+        :param RequestContainer request: The request in the standardized
+            ripozo style.
+        :return: An instance of the class
+            that was called.
+        :rtype: ConditionalRetrieve
+        :raises: NotFoundException
+        :raises: NotModifiedException
+        """
+        _logger.debug('Conditionally retrieving a resource using the manager %s', cls.manager)
+        props, etag = cls.manager.retrieve_conditional(
+            request.url_params, if_none_match=_get_if_none_match(request))
+        return cls(properties=props, meta=dict(etag=etag), status_code=200)
+
+
+class ConditionalRetrieveList(RetrieveList):
+    """
+    Retrieves a list of resources using the manager's
+    retrieve_list_conditional method.  The ETag is added to the
+    meta data and a NotModifiedException is raised if it
+    matches the If-None-Match header.  It must come before
+    any other RetrieveList class in the bases of a resource.
+    """
+    __abstract__ = True
+
+    @apimethod(methods=['GET'], no_pks=True)
+    @manager_translate(fields_attr='list_fields')
+    def retrieve_list(cls, request):
+        """
+        Retrieves a list of resources unless the client's copy is current.
+
+        :param RequestContainer request: The request in the standardized
+            ripozo style.
+        :return: An instance of the class
+            that was called.
+        :rtype: ConditionalRetrieveList
+        :raises: NotModifiedException
+        """
+        _logger.debug('Conditionally retrieving a list of resources using manager %s',
+                      cls.manager)
+        props, meta = cls.manager.retrieve_list_conditional(
+            request.query_args, if_none_match=_get_if_none_match(request))
+        return_props = {cls.resource_name: props}
+        return_props.update(request.query_args)
+        return cls(properties=return_props, meta=meta,
+                   status_code=200, query_args=cls.manager.fields, no_pks=True)
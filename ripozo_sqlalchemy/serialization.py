@@ -0,0 +1,244 @@
+"""
+Compiles the eager loader options and the serializers
+for the field dicts of the AlchemyManager.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, date, time, timedelta
+from decimal import Decimal
+from operator import attrgetter
+
+from ripozo.utilities import make_json_safe
+
+from sqlalchemy import orm
+from sqlalchemy.inspection import inspect
+from sqlalchemy.orm.query import Query
+
+import six
+
+# selectinload was added in SQLAlchemy 1.2
+_LOADERS = {
+    'selectin': 'selectinload' if hasattr(orm, 'selectinload') else 'subqueryload',
+    'subquery': 'subqueryload',
+    'joined': 'joinedload',
+    'lazy': 'lazyload',
+}
+
+# Column types whose values are already json safe.
+_JSON_SAFE_TYPES = frozenset([six.text_type, six.binary_type, float, bool] +
+                             list(six.integer_types))
+
+
+def _get_primary_key_names(model):
+    """
+    Gets the attribute names of the primary key
+    columns on the model.
+
+    :param DeclarativeMeta model: The SQLAlchemy ORM model.
+    :return: tuple of unicode attribute names
+    :rtype: tuple
+    """
+    mapper = inspect(model)
+    return tuple(mapper.get_property_by_column(col).key for col in mapper.primary_key)
+
+
+def _get_loader_options(model, field_dict, overrides, project=False, parent=None, path=''):
+    """
+    Recursively builds the loader options that eagerly load
+    every relationship in the field_dict.  Collections use
+    a selectin load and many-to-one relationships use a joined load
+    unless the dotted relationship path is in the overrides.
+
+    :param DeclarativeMeta model: The model the field_dict applies to.
+    :param dict field_dict: The dictionary of fields to load.
+    :param dict overrides: Dotted relationship paths mapped to
+        one of ``'selectin'``, ``'subquery'``, ``'joined'`` or ``'lazy'``
+    :param bool project: If true, the related models only load
+        the columns in their part of the field_dict.
+    :param Load parent: The option for the parent relationship.
+    :param unicode path: The dotted path of the parent relationship.
+    :return: A list of loader options.
+    :rtype: list
+    """
+    relationships = inspect(model).relationships
+    options = []
+    for name, sub in six.iteritems(field_dict):
+        if not sub or name not in relationships:
+            continue
+        prop = relationships[name]
+        if prop.lazy == 'dynamic':  # Dynamic relationships are always queries
+            continue
+        dotted = path + name
+        strategy = overrides.get(dotted) or ('selectin' if prop.uselist else 'joined')
+        loader = getattr(parent if parent is not None else orm, _LOADERS[strategy])
+        option = loader(getattr(model, name))
+        children = _get_loader_options(prop.mapper.class_, sub, overrides, project=project,
+                                       parent=option, path=dotted + '.')
+        options.extend(children or [option])
+        attributes = project and _get_projected_attributes(prop.mapper, sub, parent_prop=prop)
+        if attributes:
+            options.append(option.load_only(*attributes))
+    return options
+
+
+def _get_projected_attributes(mapper, field_dict, extra=(), parent_prop=None):
+    """
+    Gets the column attributes that have to be loaded to serialize
+    the field_dict.  That is the columns named in the field_dict,
+    the primary key and any columns the relationships
+    (including the one the model was loaded through) join on.
+
+    :param Mapper mapper: The mapper the field_dict applies to.
+    :param dict field_dict: The dictionary of fields to load.
+    :param tuple extra: Additional column attribute names to load.
+    :param RelationshipProperty parent_prop: The relationship
+        the models are being loaded through.
+    :return: A list of column attributes or None if a field
+        is not a column or relationship (e.g. a python property)
+        and the columns it uses cannot be known.
+    :rtype: list
+    """
+    names = set(extra)
+    columns = list(mapper.primary_key)
+    for name in field_dict:
+        if name in mapper.column_attrs:
+            names.add(name)
+        elif name in mapper.relationships:
+            columns.extend(mapper.relationships[name].local_columns)
+        else:
+            return None
+    if parent_prop is not None:
+        columns.extend(parent_prop.remote_side)
+    for column in (mapper.version_id_col, mapper.polymorphic_on):
+        if column is not None:
+            columns.append(column)
+    for column in columns:
+        try:
+            names.add(mapper.get_property_by_column(column).key)
+        except orm.exc.UnmappedColumnError:
+            continue  # e.g. a column on a secondary table
+    return [getattr(mapper.class_, name) for name in sorted(names)]
+
+
+def _freeze_field_dict(field_dict):
+    """
+    Turns a field_dict into a hashable equivalent
+    so that it can be used as a cache key.
+
+    :param dict field_dict: The dictionary of fields.
+    :return: A nested tuple of (name, frozen sub fields) pairs.
+    :rtype: tuple
+    """
+    if not field_dict:
+        return None
+    return tuple(sorted((name, _freeze_field_dict(sub))
+                        for name, sub in six.iteritems(field_dict)))
+
+
+def _freeze_value(value):
+    """
+    Converts the value into a hashable value that can
+    be used as part of a cache key.
+
+    :param object value: A value or a dict or list of values.
+    :return: The hashable value.
+    :rtype: object
+    """
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze_value(val)) for key, val in six.iteritems(value)))
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze_value(val) for val in value)
+    return value
+
+
+def _get_json_converter(mapper, name):
+    """
+    Gets the function that makes the value of the named
+    attribute json safe.  Returns None if the column type's
+    values are already json safe so that no call is needed.
+
+    :param Mapper mapper: The mapper of the model or None
+        if the model is unknown.
+    :param unicode name: The attribute name
+    :return: The converter or None
+    :rtype: function
+    """
+    if mapper is None or name not in mapper.column_attrs:
+        return make_json_safe
+    try:
+        python_type = mapper.column_attrs[name].columns[0].type.python_type
+    except NotImplementedError:
+        return make_json_safe
+    if python_type in _JSON_SAFE_TYPES:
+        return None
+    if python_type in (datetime, date, time, timedelta):
+        return _text_or_none
+    if python_type is Decimal:
+        return _float_or_none
+    return make_json_safe
+
+
+def _text_or_none(value):
+    return None if value is None else six.text_type(value)
+
+
+def _float_or_none(value):
+    return None if value is None else float(value)
+
+
+def _compile_serializer(model, frozen, cache):
+    """
+    Compiles a function that serializes an instance, a list
+    of instances or None according to the frozen field dict.
+    The attribute getters, json converters and the serializers
+    for relationships are all resolved once here rather than
+    for every row.
+
+    :param DeclarativeMeta model: The model class being serialized
+        or None if it is unknown.
+    :param tuple frozen: The frozen field dict.
+    :param dict cache: The cache of already compiled serializers
+        keyed on the model and frozen field dict.
+    :return: The serializer
+    :rtype: function
+    """
+    key = (model, frozen)
+    if key in cache:
+        return cache[key]
+
+    mapper = inspect(model, raiseerr=False) if model is not None else None
+    specs = []
+    for name, sub in frozen or ():
+        if sub:
+            related = None
+            if mapper is not None and name in mapper.relationships:
+                related = mapper.relationships[name].mapper.class_
+            converter = _compile_serializer(related, sub, cache)
+        else:
+            converter = _get_json_converter(mapper, name)
+        specs.append((name, attrgetter(name), converter))
+    specs = tuple(specs)
+
+    def serialize_row(row):
+        """Serializes a single model instance"""
+        model_dict = {}
+        for name, getter, converter in specs:
+            value = getter(row)
+            model_dict[name] = converter(value) if converter else value
+        return model_dict
+
+    def serialize(value):
+        """Serializes None, a query, a list or a single instance"""
+        if value is None:
+            return None
+        if isinstance(value, Query):
+            value = value.all()
+        if isinstance(value, (list, set)):
+            return [None if row is None else serialize_row(row) for row in value]
+        return serialize_row(value)
+
+    cache[key] = serialize
+    return serialize
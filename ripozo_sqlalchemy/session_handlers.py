@@ -6,7 +6,17 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from multiprocessing.pool import ThreadPool
+
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import sessionmaker, scoped_session
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter, BooleanClauseList
+
+import itertools
+import threading
+import time
 
 
 class ScopedSessionHandler(object):
@@ -89,3 +99,343 @@ class SessionHandler(object):
         """
         if exc:
             session.rollback()
+
+
+class RoutingSessionHandler(object):
+    """
+    A ScopedSessionHandler for a primary database with read
+    replicas.  Manager reads get their sessions from
+    get_read_session and are sent to a replica while
+    writes are sent to the primary.
+
+    After a successful write the current thread is pinned
+    to the primary so that its following reads see the write.
+    The pin lasts for pin_seconds or, if that is None, until
+    end_request is called at the end of the request.  A write
+    is a session from get_session and reads made while pinned
+    do not renew the pin.
+    """
+    ROUND_ROBIN = 'round_robin'
+    LEAST_CONNECTIONS = 'least_connections'
+
+    def __init__(self, primary, replicas, strategy=ROUND_ROBIN, pin_seconds=5):
+        """
+        :param Engine primary: The engine of the primary database.
+        :param list replicas: The engines of the replicas.
+        :param unicode strategy: How a replica is chosen for a read.
+            Either round_robin or least_connections, which picks
+            the replica with the fewest checked out connections.
+        :param float pin_seconds: How long reads are sent to the
+            primary after a write.  Should cover the replication lag.
+            If None the thread is pinned until end_request is called.
+        """
+        if strategy not in (self.ROUND_ROBIN, self.LEAST_CONNECTIONS):
+            raise ValueError('Unknown replica strategy {0}.  Valid strategies '
+                             'are {1} and {2}'.format(strategy, self.ROUND_ROBIN,
+                                                      self.LEAST_CONNECTIONS))
+        self.engine = primary
+        self.replicas = tuple(replicas)
+        self.strategy = strategy
+        self.pin_seconds = pin_seconds
+        self.session_maker = scoped_session(sessionmaker(bind=self.engine))
+        self.replica_session_makers = tuple(scoped_session(sessionmaker(bind=replica))
+                                            for replica in self.replicas)
+        self._counter = itertools.count()
+        self._local = threading.local()
+
+    @property
+    def pinned(self):
+        """
+        :return: Whether the reads of the current thread
+            are sent to the primary.
+        :rtype: bool
+        """
+        return getattr(self._local, 'pinned_until', 0) > time.time()
+
+    def pin(self):
+        """
+        Sends the reads of the current thread to the primary.
+        """
+        if self.pin_seconds is None:
+            self._local.pinned_until = float('inf')
+        else:
+            self._local.pinned_until = time.time() + self.pin_seconds
+
+    def end_request(self):
+        """
+        Releases the pin of the current thread.  Call it
+        at the end of every request.
+        """
+        self._local.pinned_until = 0
+
+    def get_session(self):
+        """
+        Gets a session for a write to the primary.
+
+        :return: The session object.
+        :rtype: Session
+        """
+        session = self.session_maker()
+        self._local.write_session = session
+        return session
+
+    def get_read_session(self):
+        """
+        Gets a session for a read.  It is for the primary if the
+        current thread is pinned or there are no replicas.
+
+        :return: The session object.
+        :rtype: Session
+        """
+        if not self.replicas or self.pinned:
+            return self.session_maker()
+        return self.replica_session_makers[self._choose_replica()]()
+
+    def _choose_replica(self):
+        """
+        :return: The index of the replica to read from
+        :rtype: int
+        """
+        if self.strategy == self.LEAST_CONNECTIONS:
+            return min(range(len(self.replicas)),
+                       key=lambda index: _get_checked_out(self.replicas[index]))
+        return next(self._counter) % len(self.replicas)
+
+    def handle_session(self, session, exc=None):
+        """
+        Handles closing a session and pins the current
+        thread after a successful write to the primary.
+
+        :param Session session: The session to close.
+        :param Exception exc: The exception raised,
+            If an exception was raised, else None
+        """
+        is_write = session is getattr(self._local, 'write_session', None)
+        self._local.write_session = None
+        if exc:
+            session.rollback()
+        elif is_write:
+            self.pin()
+        session.close()
+
+
+class ShardedSessionHandler(object):
+    """
+    A ScopedSessionHandler for models that are horizontally
+    sharded across databases using SQLAlchemy's ShardedSession.
+
+    The shard_function is called with a model class and a
+    dictionary of attribute values and returns the id of the
+    shard that holds the row or None if the values do not
+    determine it.  New models are routed with their column
+    values.  Statements are routed with the attributes they
+    compare for equality, so retrieves, updates and deletes
+    are routed by their lookup keys.  Anything that cannot
+    be routed is run on every shard.
+
+    The AlchemyManager reads retrieve_list pages from every
+    shard in parallel using map_shards and merges them in
+    the keyset order.  Every shard must use the same dialect.
+
+    .. code-block:: python
+
+        def shard_function(model, values):
+            if values.get('id') is None:
+                return None
+            return 'even' if values['id'] % 2 == 0 else 'odd'
+
+        handler = ShardedSessionHandler(dict(even=even_engine, odd=odd_engine),
+                                        shard_function)
+    """
+
+    def __init__(self, shards, shard_function):
+        """
+        :param dict shards: The shard ids mapped to their engines.
+        :param function shard_function: Returns the shard id for
+            a model class and a dictionary of values or None.
+        """
+        self.shards = shards
+        self.shard_ids = tuple(sorted(shards))
+        self.shard_function = shard_function
+        self.session_maker = scoped_session(sessionmaker(
+            class_=ShardedSession, shards=shards, shard_chooser=self._choose_shard,
+            id_chooser=self._choose_identity_shards,
+            execute_chooser=self._choose_execute_shards))
+        self.shard_session_makers = dict((shard_id, sessionmaker(bind=engine))
+                                         for shard_id, engine in shards.items())
+        self._pool = None
+        self._pool_lock = threading.Lock()
+
+    def get_session(self):
+        """
+        Gets the ShardedSession for the current thread.
+
+        :return: The session object.
+        :rtype: ShardedSession
+        """
+        return self.session_maker()
+
+    @staticmethod
+    def handle_session(session, exc=None):
+        """
+        Handles closing a session.
+
+        :param Session session: The session to close.
+        :param Exception exc: The exception raised,
+            If an exception was raised, else None
+        """
+        if exc:
+            session.rollback()
+        session.close()
+
+    def map_shards(self, func):
+        """
+        Calls the function with a session for every shard
+        in parallel.  The sessions are closed afterwards.
+
+        :param function func: Called with a Session bound to one shard
+        :return: The return values in the order of the shard_ids
+        :rtype: list
+        """
+        def call(shard_id):
+            session = self.shard_session_makers[shard_id]()
+            try:
+                return func(session)
+            finally:
+                session.close()
+        return self._get_pool().map(call, self.shard_ids)
+
+    def close(self):
+        """
+        Stops the threads used by map_shards.
+        """
+        with self._pool_lock:
+            if self._pool is not None:
+                self._pool.close()
+                self._pool = None
+
+    def _get_pool(self):
+        """
+        :return: The thread pool for map_shards
+        :rtype: ThreadPool
+        """
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ThreadPool(len(self.shard_ids))
+            return self._pool
+
+    def _get_shard_ids(self, model, values_list):
+        """
+        :param type model: The model class
+        :param list values_list: Dictionaries of values
+        :return: The ids of the shards that hold the rows or every
+            shard id if one of them cannot be determined.
+        :rtype: list
+        """
+        shard_ids = []
+        for values in values_list:
+            shard_id = self.shard_function(model, values)
+            if shard_id is None:
+                return list(self.shard_ids)
+            if shard_id not in shard_ids:
+                shard_ids.append(shard_id)
+        return shard_ids or list(self.shard_ids)
+
+    def _choose_shard(self, mapper, instance, clause=None):  # pylint: disable=unused-argument
+        """
+        The shard_chooser of the ShardedSession.
+
+        :param Mapper mapper: The mapper of the instance
+        :param object instance: The new model or None
+        :param ClauseElement clause: The statement, if any
+        :return: The id of the shard for the instance.  Without
+            an instance the first shard is returned, which
+            SQLAlchemy only uses to look up the dialect.
+        :rtype: unicode
+        :raises: ValueError
+        """
+        if instance is None:
+            return self.shard_ids[0]
+        state = inspect(instance)
+        values = dict((attr.key, state.dict.get(attr.key)) for attr in mapper.column_attrs)
+        shard_id = self.shard_function(mapper.class_, values)
+        if shard_id is None:
+            raise ValueError('The shard of the {0} cannot be determined from the '
+                             'values {1}'.format(mapper.class_.__name__, values))
+        return shard_id
+
+    def _choose_identity_shards(self, query, identity):
+        """
+        The id_chooser of the ShardedSession.
+
+        :param Query query: The query for the model
+        :param tuple identity: The primary key values
+        :return: The ids of the shards that may hold the row
+        :rtype: list
+        """
+        model = query.column_descriptions[0]['entity']
+        return self._get_shard_ids(model, [_get_primary_key_values(model, identity)])
+
+    def _choose_execute_shards(self, orm_context):
+        """
+        The execute_chooser of the ShardedSession.  Statements
+        whose criteria determine the shard are only run on it.
+
+        :param ORMExecuteState orm_context: The statement's context
+        :return: The ids of the shards to run the statement on
+        :rtype: list
+        """
+        mapper = orm_context.bind_mapper
+        whereclause = getattr(orm_context.statement, 'whereclause', None)
+        if mapper is None or whereclause is None:
+            return list(self.shard_ids)
+        values = _get_equality_values(mapper, whereclause, orm_context.parameters or {})
+        return self._get_shard_ids(mapper.class_, [values])
+
+
+def _get_primary_key_values(model, identity):
+    """
+    :param type model: The model class
+    :param tuple identity: The primary key values
+    :return: The primary key attribute names mapped to the values
+    :rtype: dict
+    """
+    mapper = inspect(model)
+    names = [mapper.get_property_by_column(column).key for column in mapper.primary_key]
+    return dict(zip(names, identity))
+
+
+def _get_equality_values(mapper, clause, parameters):
+    """
+    Gets the values of the columns that the criterion
+    compares for equality.  Only comparisons that every
+    row must satisfy (i.e. are not nested in an OR) are used.
+
+    :param Mapper mapper: The mapper of the statement
+    :param ClauseElement clause: The criterion of the statement
+    :param dict parameters: The parameters of the execution
+    :return: The attribute names mapped to their values
+    :rtype: dict
+    """
+    values = {}
+    if isinstance(clause, BooleanClauseList) and clause.operator is operators.and_:
+        for sub_clause in clause.clauses:
+            values.update(_get_equality_values(mapper, sub_clause, parameters))
+    elif isinstance(clause, BinaryExpression) and clause.operator is operators.eq \
+            and isinstance(clause.right, BindParameter):
+        for prop in mapper.column_attrs:
+            if any(clause.left.shares_lineage(column) for column in prop.columns):
+                value = clause.right.effective_value
+                values[prop.key] = parameters.get(clause.right.key, value)
+                break
+    return values
+
+
+def _get_checked_out(engine):
+    """
+    :param Engine engine: A SQLAlchemy engine.
+    :return: The number of connections checked out of its pool
+    :rtype: int
+    """
+    checked_out = getattr(engine.pool, 'checkedout', None)
+    return checked_out() if checked_out is not None else 0
@@ -0,0 +1,187 @@
+"""
+Streams every model matching the filters with
+AlchemyManager.retrieve_list_stream and turns the
+dictionaries into chunks of NDJSON or CSV text that
+can be written to a response as they are generated.
+"""
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+import csv
+import heapq
+import json
+import six
+
+
+class StreamingMixin(object):
+    """
+    Adds retrieve_list_stream to the AlchemyManager.
+    """
+
+    def retrieve_list_stream(self, filters, *args, **kwargs):
+        """
+        Streams every model matching the filters in the order
+        of the keyset fields.  Unlike retrieve_list the rows are
+        not paginated.  They are fetched stream_chunk_size at a time
+        with a server side cursor so that the memory used does not
+        grow with the number of rows.  The session is handled once
+        the generator is exhausted or closed.
+
+        :param dict filters: The filters to restrict the returned
+            models on.  The pagination arguments are ignored.
+        :return: A generator of the dictionary representation
+            of the models
+        :rtype: generator
+        """
+        self._pop_list_args(filters)
+        handler = self.session_handler
+        shard_session_makers = getattr(handler, 'shard_session_makers', None)
+        if shard_session_makers is not None:
+            sessions = [shard_session_makers[shard_id]() for shard_id in handler.shard_ids]
+            try:
+                streams = [self._stream_rows(session, filters, shard=shard)
+                           for shard, session in enumerate(sessions)]
+                for _keyset, _shard, props in heapq.merge(*streams):
+                    yield props
+            finally:
+                for session in sessions:
+                    session.close()
+            return
+        get_session = getattr(handler, 'get_read_session', handler.get_session)
+        session = get_session()
+        exc = None
+        try:
+            for _keyset, _shard, props in self._stream_rows(session, filters):
+                yield props
+        except Exception as error:
+            exc = error
+            raise
+        finally:
+            handler.handle_session(session, exc=exc)
+
+    def _stream_rows(self, session, filters, shard=0):
+        """
+        Streams the rows of one session for retrieve_list_stream.
+
+        :param Session session: The SQLAlchemy session to use
+        :param dict filters: The filters without the list arguments
+        :param int shard: The index of the shard the session is for
+        :return: A generator of the keyset values, the shard
+            and the serialized model in the keyset order.
+        :rtype: generator
+        """
+        names = self._get_keyset_field_names()
+        columns = [getattr(self.model, name) for name in names]
+        field_dict = self.dot_field_list_to_dict(self.list_fields)
+        reader = self._get_core_reader(field_dict, extra=names)
+        if reader is not None:
+            query = reader.query(session, filters).order_by(*columns)
+            for rows in query.partitions(self.stream_chunk_size):
+                for row, props in zip(rows, reader.serialize(session, rows)):
+                    yield tuple(getattr(row, name) for name in names), shard, props
+            return
+        query = self.queryset(session).filter_by(**filters)
+        query = query.options(*self._get_loader_options(field_dict, extra=names))
+        query = query.order_by(*columns).yield_per(self.stream_chunk_size)
+        for model in query:
+            props = self.serialize_model(model, field_dict=field_dict)
+            yield tuple(getattr(model, name) for name in names), shard, props
+
+
+def ndjson_chunks(rows, rows_per_chunk=100):
+    """
+    Encodes the rows as newline delimited JSON.
+
+    .. code-block:: python
+
+        rows = manager.retrieve_list_stream({})
+        return Response(ndjson_chunks(rows), mimetype='application/x-ndjson')
+
+    :param iterator rows: The serialized models
+    :param int rows_per_chunk: The number of rows in a chunk
+    :return: A generator of text chunks each holding
+        at most rows_per_chunk lines.
+    :rtype: generator
+    """
+    lines = []
+    for row in rows:
+        lines.append(json.dumps(row, sort_keys=True))
+        if len(lines) >= rows_per_chunk:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+
+def csv_chunks(rows, fieldnames=None, rows_per_chunk=100):
+    """
+    Encodes the rows as CSV with a header line in the first chunk.
+    Relationships are written to their cell as JSON.
+
+    :param iterator rows: The serialized models
+    :param list fieldnames: The fields to write in order.
+        Defaults to the sorted fields of the first row.
+    :param int rows_per_chunk: The number of rows in a chunk
+    :return: A generator of text chunks each holding
+        at most rows_per_chunk rows.
+    :rtype: generator
+    """
+    buf = _CSVBuffer()
+    for count, row in enumerate(rows, 1):
+        if fieldnames is None:
+            fieldnames = sorted(row)
+        if count == 1:
+            buf.writerow(fieldnames)
+        buf.writerow([row.get(name) for name in fieldnames])
+        if count % rows_per_chunk == 0:
+            yield buf.flush()
+    chunk = buf.flush()
+    if chunk:
+        yield chunk
+    elif fieldnames is not None and buf.empty:
+        buf.writerow(fieldnames)
+        yield buf.flush()
+
+
+class _CSVBuffer(object):
+    """
+    Writes CSV rows to a buffer that is emptied on flush.
+    """
+
+    def __init__(self):
+        self.stream = six.BytesIO() if six.PY2 else six.StringIO()
+        self.writer = csv.writer(self.stream)
+        self.empty = True
+
+    def writerow(self, values):
+        """
+        :param list values: The values of the cells
+        """
+        self.writer.writerow([_csv_cell(value) for value in values])
+        self.empty = False
+
+    def flush(self):
+        """
+        :return: The text written since the last flush
+        :rtype: unicode
+        """
+        chunk = self.stream.getvalue()
+        self.stream.seek(0)
+        self.stream.truncate()
+        return chunk.decode('utf-8') if six.PY2 else chunk
+
+
+def _csv_cell(value):
+    """
+    :param object value: A serialized value
+    :return: The text to write to the cell
+    :rtype: unicode
+    """
+    if value is None:
+        value = ''
+    elif isinstance(value, (dict, list)):
+        value = json.dumps(value, sort_keys=True)
+    value = six.text_type(value)
+    return value.encode('utf-8') if six.PY2 else value
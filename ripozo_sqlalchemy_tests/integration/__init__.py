@@ -3,4 +3,4 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from . import alchemymanager, columns, common, pagination, relationships
+from . import alchemymanager, async_manager, bulk_operations, columns, common, core_reads, delete_fast_path, eager_loading, etags, executor, group_commit, keyset_pagination, list_cache, pagination, relationships, replica_routing, retrieve_cache, sharding, statements, streaming, total_count
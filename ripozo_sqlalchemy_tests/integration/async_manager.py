@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest2
+
+try:
+    import aiosqlite
+    from ripozo_sqlalchemy import AsyncAlchemyManager, AsyncScopedSessionHandler, \
+        AsyncSessionHandler
+    from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+except (ImportError, SyntaxError):
+    aiosqlite = None
+
+if sys.version_info >= (3, 4):
+    import asyncio
+
+
+@unittest2.skipIf(aiosqlite is None, 'Requires Python 3.6+, SQLAlchemy 1.4+ and aiosqlite')
+class TestAsyncAlchemyManager(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'test.db')
+        self.engine = create_engine('sqlite:///{0}'.format(path))
+        self.async_engine = create_async_engine('sqlite+aiosqlite:///{0}'.format(path))
+        self.Base = declarative_base()
+        self.loop = asyncio.new_event_loop()
+
+        class Person(self.Base):
+            __tablename__ = 'person'
+            id = Column(Integer, primary_key=True)
+            first_name = Column(String(length=50))
+            last_name = Column(String(length=50))
+
+        self.Base.metadata.create_all(self.engine)
+        self.model = Person
+
+        class PersonManager(AsyncAlchemyManager):
+            model = Person
+            fields = ('id', 'first_name', 'last_name')
+            update_fields = ('first_name', 'last_name')
+            paginate_by = 2
+
+        self.manager_class = PersonManager
+        self.manager = PersonManager(AsyncScopedSessionHandler(self.async_engine))
+
+    def tearDown(self):
+        self.await_(self.async_engine.dispose())
+        self.loop.close()
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def await_(self, coroutine):
+        return self.loop.run_until_complete(coroutine)
+
+    def count(self):
+        return self.engine.execute('SELECT COUNT(*) FROM person').scalar()
+
+    def test_create_and_retrieve(self):
+        created = self.await_(self.manager.create(dict(first_name='John', last_name='Doe')))
+        self.assertEqual(created, dict(id=1, first_name='John', last_name='Doe'))
+        retrieved = self.await_(self.manager.retrieve(dict(id=created['id'])))
+        self.assertEqual(retrieved, created)
+        self.assertEqual(self.count(), 1)
+
+    def test_retrieve_not_found(self):
+        self.assertRaises(NotFoundException, self.await_, self.manager.retrieve(dict(id=10)))
+
+    def test_retrieve_list(self):
+        for i in range(3):
+            self.await_(self.manager.create(dict(first_name='name{0}'.format(i))))
+        props, meta = self.await_(self.manager.retrieve_list({}))
+        self.assertEqual([p['id'] for p in props], [1, 2])
+        next_page = meta['links']['next']
+        self.assertIsNotNone(next_page)
+        props, meta = self.await_(self.manager.retrieve_list(dict(next_page)))
+        self.assertEqual([p['id'] for p in props], [3])
+        self.assertIsNone(meta['links']['next'])
+
+    def test_update(self):
+        created = self.await_(self.manager.create(dict(first_name='John')))
+        updated = self.await_(self.manager.update(dict(id=created['id']), dict(first_name='Jane')))
+        self.assertEqual(updated['first_name'], 'Jane')
+        self.assertEqual(self.await_(self.manager.retrieve(dict(id=created['id']))), updated)
+
+    def test_delete(self):
+        created = self.await_(self.manager.create(dict(first_name='John')))
+        self.assertEqual(self.await_(self.manager.delete(dict(id=created['id']))), {})
+        self.assertEqual(self.count(), 0)
+        self.assertRaises(NotFoundException, self.await_, self.manager.delete(dict(id=created['id'])))
+
+    def test_bulk_operations(self):
+        self.await_(self.manager.create_many([dict(first_name='a'), dict(first_name='b')]))
+        result = self.await_(self.manager.update_many(dict(first_name='a'), dict(last_name='x')))
+        self.assertEqual(result['count'], 1)
+        self.assertEqual(self.await_(self.manager.delete_many(dict(last_name='x')))['count'], 1)
+        self.assertEqual(self.count(), 1)
+
+    def test_scoped_sessions_removed(self):
+        registry = self.manager.session_handler.session_maker.registry
+        for i in range(5):
+            self.await_(self.manager.create(dict(first_name='name{0}'.format(i))))
+        self.assertRaises(NotFoundException, self.await_, self.manager.retrieve(dict(id=10)))
+        self.assertEqual(len(registry.registry), 0)
+
+    def test_import_records(self):
+        class ImportManager(self.manager_class):
+            create_fields = ('id', 'first_name')
+            import_chunk_size = 2
+
+        manager = ImportManager(self.manager.session_handler)
+        progress = []
+        records = ['{"id": 1, "first_name": "a"}', '{"id": 2}', '{"id": 1}', '{"id": 3}', '[]']
+        report = self.await_(manager.import_records(iter(records), progress=progress.append))
+        self.assertEqual(report['imported'], 3)
+        self.assertEqual([e['index'] for e in report['errors']], [2, 4])
+        self.assertEqual(len(progress), 2)
+        self.assertEqual(self.count(), 3)
+
+    def collect(self, stream):
+        rows = []
+        while True:
+            try:
+                rows.append(self.await_(stream.__anext__()))
+            except StopAsyncIteration:
+                return rows
+
+    def test_retrieve_list_stream(self):
+        class StreamManager(self.manager_class):
+            stream_chunk_size = 2
+
+        manager = StreamManager(self.manager.session_handler)
+        self.await_(manager.create_many([dict(first_name='name{0}'.format(i % 2))
+                                         for i in range(1, 6)]))
+        props = self.collect(manager.retrieve_list_stream(dict(page=2)))
+        self.assertEqual([p['id'] for p in props], [1, 2, 3, 4, 5])
+        props = self.collect(manager.retrieve_list_stream(dict(first_name='name1')))
+        self.assertEqual([p['id'] for p in props], [1, 3, 5])
+
+    def test_retrieve_list_stream_closed(self):
+        registry = self.manager.session_handler.session_maker.registry
+        self.await_(self.manager.create_many([dict(first_name='a'), dict(first_name='b')]))
+        stream = self.manager.retrieve_list_stream({})
+        self.assertEqual(self.await_(stream.__anext__())['id'], 1)
+        self.assertEqual(len(registry.registry), 1)
+        self.await_(stream.aclose())
+        self.assertEqual(len(registry.registry), 0)
+
+    def test_session_handler(self):
+        """
+        Tests the AsyncSessionHandler that leaves committing
+        and closing the session to the application.
+        """
+        session = AsyncSession(self.async_engine)
+        manager = self.manager_class(AsyncSessionHandler(session))
+        created = self.await_(manager.create(dict(first_name='John')))
+        self.assertEqual(self.await_(manager.retrieve(dict(id=created['id']))), created)
+        self.assertRaises(NotFoundException, self.await_, manager.retrieve(dict(id=10)))
+        self.await_(session.close())
+        self.assertEqual(self.count(), 1)
+
+    def test_synchronous_class_memoized(self):
+        self.assertIs(self.manager_class._get_synchronous_class(),
+                      self.manager_class._get_synchronous_class())
@@ -0,0 +1,245 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from ripozo import RequestContainer
+from ripozo.exceptions import ValidationException
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, create_resource
+
+from sqlalchemy import create_engine, Column, DateTime, Integer, String, ForeignKey, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+import json
+import unittest2
+
+
+class TestBulkOperations(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class Parent(self.Base):
+            __tablename__ = 'parent'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            created = Column(DateTime)
+            secret = Column(String(length=50), default='default')
+            children = relationship('Child')
+
+        class Child(self.Base):
+            __tablename__ = 'child'
+            id = Column(Integer, primary_key=True)
+            parent_id = Column(Integer, ForeignKey('parent.id'))
+
+        self.Base.metadata.create_all()
+        self.model, self.child_model = Parent, Child
+
+        class MyManager(AlchemyManager):
+            model = Parent
+            fields = ('id', 'value', 'created', 'secret', 'children.id')
+            create_fields = ('value', 'created', 'children')
+            update_fields = ('value', 'created')
+            bulk_chunk_size = 10
+
+        self.manager = MyManager(self.session_handler)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def get_values(self, *columns):
+        session = self.session_handler.get_session()
+        values = session.query(*[getattr(self.model, c) for c in columns]).order_by(self.model.id).all()
+        session.close()
+        return [tuple(row) for row in values]
+
+    def test_create_many(self):
+        values = [dict(value='{0}'.format(i), created='2015-01-0{0}T00:00:00.000000Z'.format(i % 9 + 1))
+                  for i in range(25)]
+        created = self.manager.create_many(values)
+        self.assertEqual(len(created), 25)
+        self.assertEqual(created[1], dict(value='1', created='2015-01-02 00:00:00'))
+        json.dumps(created)
+        inserts = [s for s in self.statements if s.startswith('INSERT')]
+        self.assertEqual(len(inserts), 3)
+        rows = self.get_values('value', 'created', 'secret')
+        self.assertEqual(len(rows), 25)
+        self.assertEqual(rows[3], ('3', datetime(2015, 1, 4), 'default'))
+
+    def test_create_many_ignores_invalid_fields(self):
+        self.manager.create_many([dict(value='a', secret='b', id=10)])
+        self.assertListEqual(self.get_values('id', 'value', 'secret'), [(1, 'a', 'default')])
+
+    def test_create_many_returns_fields(self):
+        class FieldsManager(self.manager.__class__):
+            fields = ('id', 'created')
+            create_fields = ('id', 'value', 'created')
+
+        created = FieldsManager(self.session_handler).create_many(
+            [dict(id=5, value='a', created='2015-01-01T00:00:00.000000Z')])
+        self.assertEqual(created, [dict(id=5, created='2015-01-01 00:00:00')])
+
+    def test_create_many_relationship_field(self):
+        self.assertRaises(ValidationException, self.manager.create_many,
+                          [dict(value='a', children=[])])
+
+    def test_create_many_single_transaction(self):
+        """
+        Tests that nothing is inserted if a row is invalid.
+        """
+        values = [dict(value='a') for _ in range(15)] + [dict(created='not a date')]
+        self.assertRaises(Exception, self.manager.create_many, values)
+        self.assertListEqual(self.get_values('id'), [])
+
+    def test_create_many_resource(self):
+        resource_class = create_resource(self.model, self.session_handler, bulk_create=True,
+                                         fields=('id', 'value'))
+        request = RequestContainer(body_args=dict(items=[dict(value='a'), dict(value='b')]))
+        resource = resource_class.create_many(request)
+        self.assertEqual(resource.status_code, 201)
+        related = dict((r.name, r.resource) for r in resource.related_resources)
+        self.assertEqual(len(related[resource_class.resource_name]), 2)
+        self.assertListEqual(self.get_values('value'), [('a',), ('b',)])
+
+    def test_create_many_resource_invalid_body(self):
+        resource_class = create_resource(self.model, self.session_handler, bulk_create=True)
+        request = RequestContainer(body_args=dict(items='a'))
+        self.assertRaises(ValidationException, resource_class.create_many, request)
+
+    def create_models(self, count=10):
+        self.manager.create_many([dict(value='{0}'.format(i % 2)) for i in range(count)])
+        del self.statements[:]
+
+    def test_update_many(self):
+        self.create_models()
+        resp = self.manager.update_many(dict(value='1'), dict(value='updated', secret='no'))
+        self.assertEqual(resp, dict(count=5))
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(self.statements[0].startswith('UPDATE'))
+        values = self.get_values('value', 'secret')
+        self.assertListEqual(values, [('0', 'default'), ('updated', 'default')] * 5)
+
+    def test_update_many_translates(self):
+        self.create_models(count=2)
+        resp = self.manager.update_many(dict(value='1'),
+                                        dict(created='2015-01-01T00:00:00.000000Z'))
+        self.assertEqual(resp, dict(count=1))
+        self.assertListEqual(self.get_values('created'), [(None,), (datetime(2015, 1, 1),)])
+
+    def test_update_many_no_updates(self):
+        self.assertRaises(ValidationException, self.manager.update_many,
+                          dict(value='a'), dict(secret='a'))
+
+    def test_update_many_no_filters(self):
+        self.create_models()
+        self.assertRaises(ValidationException, self.manager.update_many, {}, dict(value='a'))
+        self.assertListEqual(self.get_values('value'), [('0',), ('1',)] * 5)
+
+    def test_update_many_no_matches(self):
+        self.create_models(count=2)
+        self.assertEqual(self.manager.update_many(dict(value='2'), dict(value='a')), dict(count=0))
+
+    def test_delete_many(self):
+        self.create_models()
+        self.assertEqual(self.manager.delete_many(dict(value='1')), dict(count=5))
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(self.statements[0].startswith('DELETE'))
+        self.assertListEqual(self.get_values('value'), [('0',)] * 5)
+
+    def test_delete_many_no_filters(self):
+        self.create_models()
+        self.assertRaises(ValidationException, self.manager.delete_many, {})
+        self.assertEqual(len(self.get_values('id')), 10)
+
+    def test_delete_many_resource(self):
+        self.create_models()
+        resource_class = create_resource(self.model, self.session_handler, bulk_delete=True,
+                                         fields=('id', 'value'))
+        resource = resource_class.delete_many(RequestContainer(query_args=dict(value='0')))
+        self.assertEqual(resource.properties, dict(count=5))
+        self.assertListEqual(self.get_values('value'), [('1',)] * 5)
+
+    def test_import_records(self):
+        class ImportManager(self.manager.__class__):
+            import_chunk_size = 10
+
+        progress = []
+        manager = ImportManager(self.session_handler)
+        records = (dict(value='{0}'.format(i)) for i in range(25))
+        report = manager.import_records(records, progress=progress.append)
+        self.assertEqual(report, dict(imported=25, failed=0, chunks=3, errors=[]))
+        self.assertEqual(progress[-1], dict(chunk=3, imported=5, total_imported=25,
+                                            total_failed=0))
+        self.assertEqual([p['imported'] for p in progress], [10, 10, 5])
+        self.assertEqual(len(self.get_values('id')), 25)
+
+    def test_import_records_ndjson(self):
+        lines = [
+            b'{"value": "a", "created": "2015-01-01T00:00:00.000000Z"}\n',
+            '\n',
+            '{"value": \n',
+            '[1, 2]\n',
+            '{"created": "not a date"}\n',
+            '{"children": []}\n',
+            '{"value": "b"}',
+        ]
+        report = self.manager.import_records(iter(lines))
+        self.assertEqual(report['imported'], 2)
+        self.assertEqual(report['failed'], 4)
+        self.assertEqual(report['chunks'], 1)
+        self.assertEqual([e['index'] for e in report['errors']], [2, 3, 4, 5])
+        self.assertListEqual(self.get_values('value', 'created'),
+                             [('a', datetime(2015, 1, 1)), ('b', None)])
+
+    def test_import_records_max_errors(self):
+        class ImportManager(self.manager.__class__):
+            import_max_errors = 2
+
+        manager = ImportManager(self.session_handler)
+        report = manager.import_records(['[]'] * 5)
+        self.assertEqual(report['failed'], 5)
+        self.assertEqual(len(report['errors']), 2)
+        self.assertEqual(report['chunks'], 0)
+
+    def test_import_records_rejected_rows_retried(self):
+        class ImportManager(self.manager.__class__):
+            create_fields = ('id', 'value')
+            import_chunk_size = 3
+
+        self.create_models(count=1)
+        manager = ImportManager(self.session_handler)
+        progress = []
+        report = manager.import_records([dict(id=i, value='x') for i in range(2, 6)] +
+                                        [dict(id=1, value='x')], progress=progress.append)
+        self.assertEqual(report['imported'], 4)
+        self.assertEqual(report['failed'], 1)
+        self.assertEqual(report['errors'][0]['index'], 4)
+        self.assertEqual(progress[-1]['total_failed'], 1)
+        self.assertListEqual(self.get_values('id', 'value'),
+                             [(1, '0')] + [(i, 'x') for i in range(2, 6)])
+
+    def test_import_resource(self):
+        resource_class = create_resource(self.model, self.session_handler, bulk_import=True,
+                                         fields=('id', 'value'))
+        request = RequestContainer(body_args=dict(records='{"value": "a"}\n{"value": "b"}\n'))
+        resource = resource_class.import_records(request)
+        self.assertEqual(resource.status_code, 200)
+        self.assertEqual(resource.properties, dict(imported=2, failed=0, chunks=1, errors=[]))
+        request = RequestContainer(body_args=dict(records=[dict(value='c')]))
+        self.assertEqual(resource_class.import_records(request).properties['imported'], 1)
+        self.assertListEqual(self.get_values('value'), [('a',), ('b',), ('c',)])
+
+    def test_import_resource_invalid_body(self):
+        resource_class = create_resource(self.model, self.session_handler, bulk_import=True)
+        request = RequestContainer(body_args=dict(records=1))
+        self.assertRaises(ValidationException, resource_class.import_records, request)
@@ -0,0 +1,148 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta
+
+from ripozo.exceptions import NotFoundException
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, SessionHandler
+
+from sqlalchemy import create_engine, Column, DateTime, Integer, String, ForeignKey, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship, sessionmaker
+
+import unittest2
+
+
+class TestCoreReads(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class Owner(self.Base):
+            __tablename__ = 'owner'
+            id = Column(Integer, primary_key=True)
+            name = Column(String(length=50))
+
+        class Parent(self.Base):
+            __tablename__ = 'parent'
+            id = Column(Integer, primary_key=True)
+            created = Column(DateTime)
+            owner_id = Column(Integer, ForeignKey('owner.id'))
+            owner = relationship(Owner)
+            children = relationship('Child', backref='parent', order_by='Child.id')
+
+        class Child(self.Base):
+            __tablename__ = 'child'
+            id = Column(Integer, primary_key=True)
+            name = Column(String(length=50))
+            parent_id = Column(Integer, ForeignKey('parent.id'))
+            toys = relationship('Toy')
+
+        class Toy(self.Base):
+            __tablename__ = 'toy'
+            id = Column(Integer, primary_key=True)
+            child_id = Column(Integer, ForeignKey('child.id'))
+
+        self.Base.metadata.create_all()
+        self.Owner, self.Parent, self.Child, self.Toy = Owner, Parent, Child, Toy
+
+        class ORMManager(AlchemyManager):
+            model = Parent
+            fields = ('id', 'created', 'owner.id', 'owner.name',
+                      'children.id', 'children.name', 'children.toys.id')
+            paginate_by = 10
+
+        class CoreManager(ORMManager):
+            core_reads = True
+
+        self.orm_manager = ORMManager(self.session_handler)
+        self.core_manager = CoreManager(self.session_handler)
+        self.create_models()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def create_models(self, count=25):
+        session = self.session_handler.get_session()
+        start = datetime(2015, 1, 1)
+        for i in range(count):
+            parent = self.Parent(created=start + timedelta(days=i))
+            if i % 2:
+                parent.owner = self.Owner(name='owner{0}'.format(i))
+            parent.children = [self.Child(name='child', toys=[self.Toy() for _ in range(j)])
+                               for j in range(i % 3)]
+            session.add(parent)
+        session.commit()
+        session.close()
+
+    def test_retrieve_list_matches_orm(self):
+        for page in range(1, 4):
+            core = self.core_manager.retrieve_list(dict(page=page))
+            orm = self.orm_manager.retrieve_list(dict(page=page))
+            self.assertEqual(core, orm)
+
+    def test_retrieve_list_queries(self):
+        props, meta = self.core_manager.retrieve_list({})
+        self.assertEqual(len(props), 10)
+        # The parents joined with their owners, the children and the toys
+        self.assertEqual(len(self.statements), 3)
+
+    def test_retrieve_matches_orm(self):
+        for pk in (1, 2, 3):
+            self.assertEqual(self.core_manager.retrieve(dict(id=pk)),
+                             self.orm_manager.retrieve(dict(id=pk)))
+
+    def test_retrieve_not_found(self):
+        self.assertRaises(NotFoundException, self.core_manager.retrieve, dict(id=1000))
+
+    def test_filters(self):
+        props, meta = self.core_manager.retrieve_list(dict(owner_id=2))
+        self.assertEqual(len(props), 1)
+        self.assertEqual(props[0]['owner'], dict(id=2, name='owner3'))
+
+    def test_keyset_pagination(self):
+        class KeysetManager(self.core_manager.__class__):
+            keyset_pagination = True
+            keyset_fields = ('created', 'id')
+
+        manager = KeysetManager(self.session_handler)
+        props, meta = manager.retrieve_list({})
+        ids = [p['id'] for p in props]
+        while meta['links']['next']:
+            props, meta = manager.retrieve_list(dict(meta['links']['next']))
+            ids.extend(p['id'] for p in props)
+        self.assertEqual(ids, list(range(1, 26)))
+
+    def test_identity_map_empty(self):
+        session = sessionmaker(self.engine)()
+        manager = self.core_manager.__class__(SessionHandler(session))
+        manager.retrieve_list({})
+        manager.retrieve(dict(id=1))
+        self.assertEqual(len(session.identity_map), 0)
+        session.close()
+
+    def test_unsupported_fields_fall_back(self):
+        self.Parent.child_count = property(lambda parent: len(parent.children))
+
+        class PropertyManager(self.core_manager.__class__):
+            fields = ('id', 'child_count')
+
+        props, meta = PropertyManager(self.session_handler).retrieve_list({})
+        self.assertEqual(props[2], dict(id=3, child_count=2))
+
+    def test_overridden_queryset_falls_back(self):
+        class QuerysetManager(self.core_manager.__class__):
+            def queryset(self, session):
+                return session.query(self.model).filter(self.model.id > 20)
+
+        props, meta = QuerysetManager(self.session_handler).retrieve_list({})
+        self.assertEqual([p['id'] for p in props], [21, 22, 23, 24, 25])
@@ -0,0 +1,166 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler
+
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+import unittest2
+
+
+class TestDeleteFastPath(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def create(self, *models):
+        self.Base.metadata.create_all()
+        session = self.session_handler.get_session()
+        session.add_all(models)
+        session.commit()
+        session.close()
+        del self.statements[:]
+
+    def get_manager(self, model_class, **attrs):
+        attrs.update(model=model_class, fields=('id', 'value'))
+        return type(str('Manager'), (AlchemyManager,), attrs)(self.session_handler)
+
+    def count(self, model_class):
+        session = self.session_handler.get_session()
+        count = session.query(model_class).count()
+        session.close()
+        return count
+
+    def get_simple_model(self):
+        class Simple(self.Base):
+            __tablename__ = 'simple'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+        return Simple
+
+    def test_delete_by_primary_key(self):
+        model = self.get_simple_model()
+        self.create(model(value='a'), model(value='b'))
+        self.assertEqual(self.get_manager(model).delete(dict(id=1)), {})
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(self.statements[0].startswith('DELETE'))
+        self.assertEqual(self.count(model), 1)
+
+    def test_delete_by_primary_key_not_found(self):
+        model = self.get_simple_model()
+        self.create(model(value='a'))
+        self.assertRaises(NotFoundException, self.get_manager(model).delete, dict(id=2))
+        self.assertEqual(self.count(model), 1)
+
+    def test_delete_not_primary_key(self):
+        model = self.get_simple_model()
+        self.create(model(value='a'))
+        self.get_manager(model).delete(dict(value='a'))
+        self.assertTrue(self.statements[0].startswith('SELECT'))
+        self.assertEqual(self.count(model), 0)
+
+    def test_delete_overridden_queryset(self):
+        model = self.get_simple_model()
+        self.create(model(value='a'))
+
+        def queryset(manager, session):
+            return session.query(model).filter(model.value != 'a')
+
+        manager = self.get_manager(model, queryset=queryset)
+        self.assertRaises(NotFoundException, manager.delete, dict(id=1))
+        self.assertEqual(self.count(model), 1)
+
+    def test_delete_event(self):
+        model = self.get_simple_model()
+        self.create(model(value='a'))
+        deleted = []
+        event.listen(model, 'before_delete', lambda mapper, conn, target: deleted.append(target.id))
+        self.get_manager(model).delete(dict(id=1))
+        self.assertListEqual(deleted, [1])
+
+    def test_delete_one_to_many(self):
+        """
+        Tests that the ORM nulls the foreign keys of the children
+        """
+        class Parent(self.Base):
+            __tablename__ = 'parent'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            children = relationship('Child')
+
+        class Child(self.Base):
+            __tablename__ = 'child'
+            id = Column(Integer, primary_key=True)
+            parent_id = Column(Integer, ForeignKey('parent.id'))
+
+        self.create(Parent(children=[Child(), Child()]))
+        self.get_manager(Parent).delete(dict(id=1))
+        self.assertTrue(self.statements[0].startswith('SELECT'))
+        session = self.session_handler.get_session()
+        self.assertListEqual([c.parent_id for c in session.query(Child).all()], [None, None])
+        session.close()
+
+    def test_delete_passive_deletes(self):
+        class Parent(self.Base):
+            __tablename__ = 'parent'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            children = relationship('Child', passive_deletes=True)
+
+        class Child(self.Base):
+            __tablename__ = 'child'
+            id = Column(Integer, primary_key=True)
+            parent_id = Column(Integer, ForeignKey('parent.id', ondelete='CASCADE'))
+
+        self.create(Parent(children=[Child()]))
+        self.get_manager(Parent).delete(dict(id=1))
+        self.assertEqual(len(self.statements), 1)
+        self.assertTrue(self.statements[0].startswith('DELETE'))
+
+    def test_delete_cascade(self):
+        class Owner(self.Base):
+            __tablename__ = 'owner'
+            id = Column(Integer, primary_key=True)
+
+        class Pet(self.Base):
+            __tablename__ = 'pet'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            owner_id = Column(Integer, ForeignKey('owner.id'))
+            owner = relationship(Owner, cascade='all')
+
+        self.create(Pet(owner=Owner()))
+        self.get_manager(Pet).delete(dict(id=1))
+        self.assertEqual(self.count(Owner), 0)
+
+    def test_delete_many_to_one(self):
+        class Owner(self.Base):
+            __tablename__ = 'owner'
+            id = Column(Integer, primary_key=True)
+
+        class Pet(self.Base):
+            __tablename__ = 'pet'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            owner_id = Column(Integer, ForeignKey('owner.id'))
+            owner = relationship(Owner)
+
+        self.create(Pet(owner=Owner()))
+        self.get_manager(Pet).delete(dict(id=1))
+        self.assertEqual(len(self.statements), 1)
+        self.assertEqual(self.count(Owner), 1)
@@ -0,0 +1,141 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler
+
+from sqlalchemy import create_engine, Column, Integer, String, Text, ForeignKey, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+import unittest2
+
+
+class TestEagerLoading(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class Owner(self.Base):
+            __tablename__ = 'owner'
+            id = Column(Integer, primary_key=True)
+            name = Column(String(length=50))
+
+        class Parent(self.Base):
+            __tablename__ = 'parent'
+            id = Column(Integer, primary_key=True)
+            document = Column(Text)
+            owner_id = Column(Integer, ForeignKey('owner.id'))
+            owner = relationship(Owner)
+            children = relationship('Child', backref='parent')
+
+        class Child(self.Base):
+            __tablename__ = 'child'
+            id = Column(Integer, primary_key=True)
+            document = Column(Text)
+            parent_id = Column(Integer, ForeignKey('parent.id'))
+            toys = relationship('Toy')
+
+        class Toy(self.Base):
+            __tablename__ = 'toy'
+            id = Column(Integer, primary_key=True)
+            child_id = Column(Integer, ForeignKey('child.id'))
+
+        self.Base.metadata.create_all()
+        self.Owner, self.Parent, self.Child, self.Toy = Owner, Parent, Child, Toy
+
+        class ParentManager(AlchemyManager):
+            model = Parent
+            fields = ('id', 'owner.id', 'owner.name', 'children.id', 'children.toys.id')
+            paginate_by = 100
+
+        self.manager_class = ParentManager
+        self.create_models()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def create_models(self, count=20):
+        session = self.session_handler.get_session()
+        for i in range(count):
+            parent = self.Parent(owner=self.Owner(name='owner'))
+            parent.children = [self.Child(toys=[self.Toy(), self.Toy()]) for _ in range(2)]
+            session.add(parent)
+        session.commit()
+        session.close()
+
+    def test_retrieve_list_constant_queries(self):
+        props, meta = self.manager_class(self.session_handler).retrieve_list({})
+        self.assertEqual(len(props), 20)
+        for parent in props:
+            self.assertEqual(parent['owner']['name'], 'owner')
+            self.assertEqual(len(parent['children']), 2)
+            for child in parent['children']:
+                self.assertEqual(len(child['toys']), 2)
+        # The parents joined with their owners, the children and the toys
+        self.assertEqual(len(self.statements), 3)
+
+    def test_retrieve_constant_queries(self):
+        props = self.manager_class(self.session_handler).retrieve(dict(id=1))
+        self.assertEqual(len(props['children']), 2)
+        self.assertEqual(len(self.statements), 3)
+
+    def test_eager_loader_override(self):
+        class Manager(self.manager_class):
+            eager_loaders = {'children': 'lazy'}
+
+        props, meta = Manager(self.session_handler).retrieve_list({})
+        self.assertEqual(len(props), 20)
+        self.assertEqual(len(props[0]['children'][0]['toys']), 2)
+        # A lazy load of the children per parent, each
+        # followed by a selectin load of their toys.
+        self.assertEqual(len(self.statements), 1 + 20 + 20)
+
+    def test_eager_load_disabled(self):
+        class Manager(self.manager_class):
+            eager_load = False
+
+        props, meta = Manager(self.session_handler).retrieve_list({})
+        self.assertEqual(len(props), 20)
+        self.assertGreater(len(self.statements), 20)
+
+    def test_project_columns(self):
+        """
+        Tests that columns not in the fields are not loaded
+        """
+        manager = self.manager_class(self.session_handler)
+        props, meta = manager.retrieve_list({})
+        props = manager.retrieve(dict(id=1))
+        self.assertEqual(len(self.statements), 6)
+        for statement in self.statements:
+            self.assertNotIn('document', statement)
+
+    def test_project_columns_disabled(self):
+        class Manager(self.manager_class):
+            project_columns = False
+
+        Manager(self.session_handler).retrieve_list({})
+        self.assertIn('parent.document', self.statements[0])
+        self.assertIn('child.document', self.statements[1])
+
+    def test_project_columns_property_field(self):
+        """
+        Tests that every column is loaded when a field
+        is not a column or relationship.
+        """
+        self.Parent.document_length = property(lambda parent: len(parent.document or ''))
+
+        class Manager(self.manager_class):
+            fields = ('id', 'document_length')
+
+        props, meta = Manager(self.session_handler).retrieve_list({})
+        self.assertEqual(props[0]['document_length'], 0)
+        self.assertEqual(len(self.statements), 1)
@@ -0,0 +1,192 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime
+
+from ripozo import RequestContainer
+from ripozo.exceptions import NotFoundException
+from ripozo.resources.restmixins import CRUDL
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, NotModifiedException, \
+    create_resource
+from ripozo_sqlalchemy.restmixins import ConditionalRetrieve, ConditionalRetrieveList
+
+from sqlalchemy import create_engine, Column, DateTime, ForeignKey, Integer, String, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+import unittest2
+
+
+class TestETags(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class MyModel(self.Base):
+            __tablename__ = 'etag_model'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+
+        class Versioned(self.Base):
+            __tablename__ = 'etag_versioned'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            version = Column(Integer, nullable=False)
+            __mapper_args__ = {'version_id_col': version}
+
+        self.Base.metadata.create_all()
+        self.model, self.versioned = MyModel, Versioned
+
+        class MyManager(AlchemyManager):
+            model = MyModel
+            fields = ('id', 'value')
+            etag_column = 'updated_at'
+
+        self.manager = MyManager(self.session_handler)
+        session = self.session_handler.get_session()
+        session.add_all([MyModel(value='a'), MyModel(value='b'), Versioned(value='a')])
+        session.commit()
+        session.close()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    def assert_not_modified(self, func, *args, **kwargs):
+        count = len(self.statements)
+        self.assertRaises(NotModifiedException, func, *args, **kwargs)
+        return self.statements[count:]
+
+    def test_retrieve_conditional(self):
+        props, etag = self.manager.retrieve_conditional(dict(id=1))
+        self.assertDictEqual(props, dict(id=1, value='a'))
+        statements = self.assert_not_modified(self.manager.retrieve_conditional,
+                                              dict(id=1), if_none_match=etag)
+        self.assertEqual(len(statements), 1)
+        self.assertNotIn('value', statements[0])
+
+    def test_retrieve_conditional_modified(self):
+        props, etag = self.manager.retrieve_conditional(dict(id=1))
+        self.manager.update(dict(id=1), dict(value='c'))
+        props, new_etag = self.manager.retrieve_conditional(dict(id=1), if_none_match=etag)
+        self.assertNotEqual(etag, new_etag)
+        self.assertEqual(props['value'], 'c')
+
+    def test_retrieve_conditional_not_found(self):
+        self.assertRaises(NotFoundException, self.manager.retrieve_conditional,
+                          dict(id=10), if_none_match='*')
+
+    def test_if_none_match_formats(self):
+        props, etag = self.manager.retrieve_conditional(dict(id=1))
+        for header in ['"other", {0}'.format(etag), 'W/{0}'.format(etag), '*']:
+            self.assert_not_modified(self.manager.retrieve_conditional,
+                                     dict(id=1), if_none_match=header)
+        self.manager.retrieve_conditional(dict(id=1), if_none_match='"other"')
+
+    def test_version_id_col(self):
+        class VersionedManager(AlchemyManager):
+            model = self.versioned
+            fields = ('id', 'value')
+
+        manager = VersionedManager(self.session_handler)
+        props, etag = manager.retrieve_conditional(dict(id=1))
+        self.assert_not_modified(manager.retrieve_conditional, dict(id=1), if_none_match=etag)
+        props, list_meta = manager.retrieve_list_conditional({})
+        manager.update(dict(id=1), dict(value='b'))
+        self.assertNotEqual(manager.retrieve_conditional(dict(id=1))[1], etag)
+        self.assertNotEqual(manager.retrieve_list_conditional({})[1]['etag'], list_meta['etag'])
+
+    def test_version_id_col_with_relationships(self):
+        class Child(self.Base):
+            __tablename__ = 'etag_child'
+            id = Column(Integer, primary_key=True)
+            name = Column(String(length=50))
+            parent_id = Column(Integer, ForeignKey('etag_versioned.id'))
+
+        self.versioned.children = relationship(Child)
+        self.Base.metadata.create_all()
+
+        class ChildrenManager(AlchemyManager):
+            model = self.versioned
+            fields = ('id', 'children.name')
+
+        class ChildManager(AlchemyManager):
+            model = Child
+            fields = ('id', 'name', 'parent_id')
+            create_fields = ('name', 'parent_id')
+            update_fields = ('name',)
+
+        manager, children = ChildrenManager(self.session_handler), ChildManager(self.session_handler)
+        children.create(dict(name='a', parent_id=1))
+        props, etag = manager.retrieve_conditional(dict(id=1))
+        props, meta = manager.retrieve_list_conditional({})
+        children.update(dict(id=1), dict(name='b'))
+        props, new_etag = manager.retrieve_conditional(dict(id=1), if_none_match=etag)
+        self.assertEqual(props['children'], [dict(name='b')])
+        self.assertNotEqual(new_etag, etag)
+        props, new_meta = manager.retrieve_list_conditional({}, if_none_match=meta['etag'])
+        self.assertEqual(props[0]['children'], [dict(name='b')])
+        self.assertNotEqual(new_meta['etag'], meta['etag'])
+
+    def test_serialized_hash(self):
+        class HashManager(AlchemyManager):
+            model = self.model
+            fields = ('id', 'value')
+
+        manager = HashManager(self.session_handler)
+        props, etag = manager.retrieve_conditional(dict(id=1))
+        self.assert_not_modified(manager.retrieve_conditional, dict(id=1), if_none_match=etag)
+        props, meta = manager.retrieve_list_conditional({})
+        self.assert_not_modified(manager.retrieve_list_conditional, {},
+                                 if_none_match=meta['etag'])
+
+    def test_retrieve_list_conditional(self):
+        props, meta = self.manager.retrieve_list_conditional(dict(value='a'))
+        self.assertEqual(len(props), 1)
+        statements = self.assert_not_modified(self.manager.retrieve_list_conditional,
+                                              dict(value='a'), if_none_match=meta['etag'])
+        self.assertEqual(len(statements), 1)
+        self.assertIn('max(', statements[0])
+
+        props, other = self.manager.retrieve_list_conditional(dict(value='b'))
+        self.assertNotEqual(other['etag'], meta['etag'])
+        props, other = self.manager.retrieve_list_conditional(dict(value='a', page=2))
+        self.assertNotEqual(other['etag'], meta['etag'])
+
+    def test_retrieve_list_conditional_modified(self):
+        props, meta = self.manager.retrieve_list_conditional({})
+        self.manager.create(dict(value='c'))
+        props, new_meta = self.manager.retrieve_list_conditional({}, if_none_match=meta['etag'])
+        self.assertEqual(len(props), 3)
+        self.assertNotEqual(meta['etag'], new_meta['etag'])
+
+    def test_resources(self):
+        resource_class = create_resource(self.model, self.session_handler,
+                                         resource_bases=(ConditionalRetrieve,
+                                                         ConditionalRetrieveList, CRUDL),
+                                         fields=('id', 'value'))
+        resource_class.manager.etag_column = 'updated_at'
+        resource = resource_class.retrieve(RequestContainer(url_params=dict(id=1)))
+        etag = resource.meta['etag']
+        request = RequestContainer(url_params=dict(id=1), headers={'If-None-Match': etag})
+        self.assertRaises(NotModifiedException, resource_class.retrieve, request)
+
+        resource = resource_class.retrieve_list(RequestContainer())
+        etag = resource.meta['etag']
+        request = RequestContainer(headers={'If-None-Match': etag})
+        try:
+            resource_class.retrieve_list(request)
+        except NotModifiedException as exc:
+            self.assertEqual(exc.status_code, 304)
+            self.assertEqual(exc.etag, etag)
+        else:
+            self.fail('NotModifiedException was not raised')
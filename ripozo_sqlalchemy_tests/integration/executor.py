@@ -0,0 +1,125 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, SessionHandler
+
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.pool import QueuePool
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest2
+
+try:
+    import asyncio
+    from ripozo_sqlalchemy.executor import ExecutorManager, get_pool_capacity
+except ImportError:
+    ExecutorManager = None
+
+
+@unittest2.skipIf(ExecutorManager is None, 'Requires asyncio and concurrent.futures')
+class TestExecutorManager(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        path = os.path.join(self.directory, 'test.db')
+        self.engine = create_engine('sqlite:///{0}'.format(path), poolclass=QueuePool,
+                                    pool_size=2, max_overflow=1,
+                                    connect_args=dict(check_same_thread=False))
+        self.Base = declarative_base()
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+
+        class Person(self.Base):
+            __tablename__ = 'person'
+            id = Column(Integer, primary_key=True)
+            first_name = Column(String(length=50))
+
+        self.Base.metadata.create_all(self.engine)
+
+        class PersonManager(AlchemyManager):
+            model = Person
+            fields = ('id', 'first_name')
+            update_fields = ('first_name',)
+            paginate_by = 10
+
+        self.manager_class = PersonManager
+        self.executor = ExecutorManager(PersonManager(ScopedSessionHandler(self.engine)))
+
+    def tearDown(self):
+        self.executor.shutdown()
+        asyncio.set_event_loop(None)
+        self.loop.close()
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def await_(self, future):
+        return self.loop.run_until_complete(future)
+
+    def test_sized_to_pool(self):
+        self.assertEqual(get_pool_capacity(self.engine), 2)
+        self.assertEqual(self.executor.max_workers, 2)
+        executor = ExecutorManager(self.executor.manager, max_workers=7)
+        self.assertEqual(executor.max_workers, 7)
+        executor.shutdown()
+
+    def test_not_queue_pool(self):
+        engine = create_engine('sqlite://')
+        self.assertIsNone(get_pool_capacity(engine))
+        executor = ExecutorManager(self.manager_class(ScopedSessionHandler(engine)))
+        self.assertEqual(executor.max_workers, 5)
+        executor.shutdown()
+
+    def test_shared_session_handler_rejected(self):
+        manager = self.manager_class(SessionHandler(object()))
+        self.assertRaises(ValueError, ExecutorManager, manager)
+
+    def test_crud(self):
+        created = self.await_(self.executor.create(dict(first_name='John')))
+        self.assertEqual(self.await_(self.executor.retrieve(dict(id=created['id']))), created)
+        updated = self.await_(self.executor.update(dict(id=created['id']), dict(first_name='Jane')))
+        self.assertEqual(updated['first_name'], 'Jane')
+        props, meta = self.await_(self.executor.retrieve_list({}))
+        self.assertEqual(props, [updated])
+        self.await_(self.executor.delete(dict(id=created['id'])))
+        self.assertRaises(NotFoundException, self.await_,
+                          self.executor.retrieve(dict(id=created['id'])))
+        self.assertEqual(self.executor.stats['completed'], 6)
+
+    def test_queue_depth_and_wait(self):
+        """
+        Tests that calls queue once every worker is busy
+        and that their wait is recorded.
+        """
+        release = threading.Event()
+        started = threading.Semaphore(0)
+        retrieve = self.executor.manager.retrieve
+
+        def blocking_retrieve(lookup_keys):
+            started.release()
+            release.wait()
+            return retrieve(lookup_keys)
+
+        self.executor.manager.retrieve = blocking_retrieve
+        created = self.await_(self.executor.create(dict(first_name='John')))
+        futures = [self.executor.retrieve(dict(id=created['id'])) for _ in range(5)]
+        for _ in range(2):
+            started.acquire()
+        stats = self.executor.stats
+        self.assertEqual(stats['active'], 2)
+        self.assertEqual(stats['queue_depth'], 3)
+        release.set()
+        results = self.await_(asyncio.gather(*futures))
+        self.assertEqual(results, [created] * 5)
+        stats = self.executor.stats
+        self.assertEqual(stats['queue_depth'], 0)
+        self.assertEqual(stats['active'], 0)
+        self.assertEqual(stats['completed'], 6)
+        self.assertGreater(stats['max_wait'], 0)
+        self.assertGreaterEqual(stats['max_wait'], stats['average_wait'])
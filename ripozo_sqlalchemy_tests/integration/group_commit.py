@@ -0,0 +1,134 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+
+from ripozo_sqlalchemy import AlchemyManager, GroupCommitter, ScopedSessionHandler, \
+    SessionHandler
+
+from sqlalchemy import create_engine, event, Column, Integer, String
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.declarative import declarative_base
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest2
+
+
+class TestGroupCommit(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engine = create_engine('sqlite:///{0}'.format(os.path.join(self.directory, 'test.db')))
+        self.Base = declarative_base()
+
+        class Person(self.Base):
+            __tablename__ = 'person'
+            id = Column(Integer, primary_key=True)
+            first_name = Column(String(length=50), unique=True)
+
+        self.Base.metadata.create_all(self.engine)
+        self.model = Person
+        self.session_handler = ScopedSessionHandler(self.engine)
+        self.group_commit = GroupCommitter(max_batch_size=10, max_delay=1)
+
+        class PersonManager(AlchemyManager):
+            model = Person
+            fields = ('id', 'first_name')
+            update_fields = ('first_name',)
+            group_commit = self.group_commit
+
+        self.manager = PersonManager(self.session_handler)
+        self.commits = []
+        event.listen(self.engine, 'commit', self.on_commit)
+
+    def tearDown(self):
+        self.group_commit.close()
+        event.remove(self.engine, 'commit', self.on_commit)
+        self.engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def on_commit(self, conn):
+        self.commits.append(conn)
+
+    def run_concurrently(self, func, args_list):
+        """
+        Calls the function in a thread per arguments and
+        returns the results or exceptions in the same order.
+        """
+        results = [None] * len(args_list)
+
+        def call(index, args):
+            try:
+                results[index] = func(*args)
+            except Exception as exc:
+                results[index] = exc
+
+        threads = [threading.Thread(target=call, args=(index, args))
+                   for index, args in enumerate(args_list)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def count(self):
+        return self.engine.execute('SELECT COUNT(*) FROM person').scalar()
+
+    def test_concurrent_creates_share_commit(self):
+        values = [(dict(first_name='name{0}'.format(i)),) for i in range(10)]
+        results = self.run_concurrently(self.manager.create, values)
+        self.assertEqual(sorted(r['first_name'] for r in results),
+                         sorted('name{0}'.format(i) for i in range(10)))
+        self.assertEqual(len(set(r['id'] for r in results)), 10)
+        self.assertEqual(self.count(), 10)
+        self.assertEqual(len(self.commits), 1)
+        self.assertEqual(self.group_commit.stats, dict(batches=1, writes=10, retried_batches=0))
+
+    def test_max_delay(self):
+        self.group_commit.max_delay = 0.01
+        created = self.manager.create(dict(first_name='John'))
+        self.assertEqual(created['first_name'], 'John')
+        self.assertEqual(self.group_commit.stats['batches'], 1)
+
+    def test_failed_item_retried_alone(self):
+        self.group_commit.max_batch_size = 5
+        values = [(dict(first_name='name{0}'.format(i)),) for i in range(4)]
+        values.append((dict(first_name='name0'),))
+        results = self.run_concurrently(self.manager.create, values)
+        failures = [r for r in results if isinstance(r, Exception)]
+        self.assertEqual(len(failures), 1)
+        self.assertIsInstance(failures[0], IntegrityError)
+        self.assertEqual(self.count(), 4)
+        self.assertEqual(self.group_commit.stats, dict(batches=4, writes=4, retried_batches=1))
+
+    def test_update_and_delete(self):
+        self.group_commit.max_delay = 0.01
+        created = self.manager.create(dict(first_name='John'))
+        self.group_commit.max_batch_size = 3
+        self.group_commit.max_delay = 1
+        results = self.run_concurrently(self.manager.update, [
+            (dict(id=created['id']), dict(first_name='Jane')),
+            (dict(id=100), dict(first_name='Nobody')),
+            (dict(id=101), dict(first_name='Nobody')),
+        ])
+        self.assertEqual(results[0], dict(id=created['id'], first_name='Jane'))
+        self.assertIsInstance(results[1], NotFoundException)
+        self.assertIsInstance(results[2], NotFoundException)
+        self.group_commit.max_batch_size = 1
+        self.assertEqual(self.manager.delete(dict(id=created['id'])), {})
+        self.assertEqual(self.count(), 0)
+
+    def test_session_handler_rejected(self):
+        manager = self.manager.__class__(SessionHandler(object()))
+        self.assertRaises(ValueError, manager.create, dict(first_name='John'))
+
+    def test_close_restarts(self):
+        self.group_commit.max_delay = 0.01
+        self.manager.create(dict(first_name='John'))
+        self.group_commit.close()
+        self.manager.create(dict(first_name='Jane'))
+        self.assertEqual(self.count(), 2)
@@ -0,0 +1,242 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from datetime import datetime, timedelta, tzinfo
+
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler
+from ripozo import restmixins, RequestContainer
+from ripozo.exceptions import TranslationException
+
+from sqlalchemy import create_engine, Column
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import CHAR, Integer, String, DateTime, TypeDecorator
+
+import six
+import unittest2
+import uuid
+
+
+class GUID(TypeDecorator):
+    impl = CHAR(36)
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        return None if value is None else six.text_type(uuid.UUID(six.text_type(value)))
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else uuid.UUID(value)
+
+
+class PlusTwo(tzinfo):
+    def utcoffset(self, dt):
+        return timedelta(hours=2)
+
+    def dst(self, dt):
+        return timedelta(0)
+
+
+class AwareDateTime(TypeDecorator):
+    """
+    Stores aware datetimes in UTC and refuses naive ones.
+    """
+    impl = DateTime
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if value.utcoffset() is None:
+            raise ValueError('Naive datetime {0}'.format(value))
+        return (value - value.utcoffset()).replace(tzinfo=None)
+
+    def process_result_value(self, value, dialect):
+        return None if value is None else (value + timedelta(hours=2)).replace(tzinfo=PlusTwo())
+
+
+class TestKeysetPagination(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class MyModel(self.Base):
+            __tablename__ = 'my_model'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=63))
+            created = Column(DateTime)
+
+        self.model = MyModel
+        self.Base.metadata.create_all()
+
+        class MyManager(AlchemyManager):
+            model = self.model
+            fields = ('id', 'value',)
+            paginate_by = 10
+            pagination_pk_query_arg = 'cursor'
+            keyset_pagination = True
+
+        self.manager = MyManager(self.session_handler)
+
+        class MyResource(restmixins.RetrieveList):
+            manager = self.manager
+            pks = ('id',)
+            resource_name = 'my_resource'
+
+        self.resource = MyResource
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def create_models(self, count=5):
+        session = self.session_handler.get_session()
+        start = datetime(2015, 1, 1)
+        for i in range(count):
+            # Insert out of order so the keyset order differs from the id order
+            session.add(self.model(value='{0:03d}'.format(i),
+                                   created=start - timedelta(days=i)))
+        session.commit()
+        session.close()
+
+    def get_linked_resource(self, resource, name):
+        for linked in resource.linked_resources:
+            if linked.name == name:
+                return linked.resource
+        return None
+
+    def test_first_page(self):
+        """
+        Tests that the first page has a next cursor
+        and no previous link.
+        """
+        self.create_models(count=15)
+        props, meta = self.manager.retrieve_list({})
+        self.assertEqual([p['id'] for p in props], list(range(1, 11)))
+        self.assertIsNotNone(meta['links']['next'])
+        self.assertIsNone(meta['links']['previous'])
+        self.assertNotIn('page', meta['links']['next'])
+        self.assertEqual(meta['links']['next']['count'], 10)
+
+    def test_not_enough_for_pagination(self):
+        self.create_models(count=10)
+        props, meta = self.manager.retrieve_list({})
+        self.assertEqual(len(props), 10)
+        self.assertIsNone(meta['links']['next'])
+        self.assertIsNone(meta['links']['previous'])
+
+    def test_next_and_previous_pagination(self):
+        """
+        Walks forward through every page using the
+        next links and then back using the previous links.
+        """
+        self.create_models(count=101)
+        req = RequestContainer()
+        resource = self.resource.retrieve_list(req)
+        pages = [[p['id'] for p in resource.properties['my_resource']]]
+        while self.get_linked_resource(resource, 'next'):
+            next_link = self.get_linked_resource(resource, 'next')
+            req = RequestContainer(query_args=next_link.get_query_arg_dict())
+            resource = self.resource.retrieve_list(req)
+            pages.append([p['id'] for p in resource.properties['my_resource']])
+        self.assertEqual(len(pages), 11)
+        self.assertEqual(sum(pages, []), list(range(1, 102)))
+
+        backwards = [pages[-1]]
+        while self.get_linked_resource(resource, 'previous'):
+            previous = self.get_linked_resource(resource, 'previous')
+            req = RequestContainer(query_args=previous.get_query_arg_dict())
+            resource = self.resource.retrieve_list(req)
+            backwards.append([p['id'] for p in resource.properties['my_resource']])
+        self.assertListEqual(list(reversed(backwards)), pages)
+
+    def test_keyset_fields(self):
+        """
+        Tests paging on a configured set of columns.
+        """
+        class CreatedManager(self.manager.__class__):
+            keyset_fields = ('created', 'id')
+            paginate_by = 4
+
+        self.create_models(count=10)
+        manager = CreatedManager(self.session_handler)
+        props, meta = manager.retrieve_list({})
+        ids = [p['id'] for p in props]
+        while meta['links']['next']:
+            props, meta = manager.retrieve_list(dict(meta['links']['next']))
+            ids.extend(p['id'] for p in props)
+        self.assertEqual(ids, list(range(10, 0, -1)))
+
+    def test_filters_applied(self):
+        self.create_models(count=30)
+        props, meta = self.manager.retrieve_list(dict(value='005'))
+        self.assertEqual(len(props), 1)
+        self.assertIsNone(meta['links']['next'])
+
+    def test_invalid_cursor(self):
+        self.assertRaises(TranslationException, self.manager.retrieve_list,
+                          dict(cursor='not a cursor'))
+
+    def test_uuid_keys(self):
+        """
+        Tests paging on a key whose values are not json serializable.
+        """
+        class Token(self.Base):
+            __tablename__ = 'token'
+            id = Column(GUID, primary_key=True)
+
+        self.Base.metadata.create_all()
+        session = self.session_handler.get_session()
+        keys = sorted(uuid.uuid4() for _ in range(7))
+        session.add_all([Token(id=key) for key in keys])
+        session.commit()
+        session.close()
+
+        class TokenManager(AlchemyManager):
+            model = Token
+            fields = ('id',)
+            paginate_by = 3
+            keyset_pagination = True
+
+        manager = TokenManager(self.session_handler)
+        props, meta = manager.retrieve_list({})
+        pages = [[p['id'] for p in props]]
+        while meta['links']['next']:
+            props, meta = manager.retrieve_list(dict(meta['links']['next']))
+            pages.append([p['id'] for p in props])
+        self.assertEqual(pages, [keys[:3], keys[3:6], keys[6:]])
+        props, meta = manager.retrieve_list(dict(meta['links']['previous']))
+        self.assertEqual([p['id'] for p in props], keys[3:6])
+
+    def test_timezone_aware_keys(self):
+        """
+        Tests paging on a timezone aware column.
+        """
+        class Event(self.Base):
+            __tablename__ = 'event'
+            id = Column(Integer, primary_key=True)
+            happened = Column(AwareDateTime)
+
+        self.Base.metadata.create_all()
+        session = self.session_handler.get_session()
+        start = datetime(2015, 1, 1, 23, 30, tzinfo=PlusTwo())
+        session.add_all([Event(id=i, happened=start + timedelta(minutes=i)) for i in range(1, 8)])
+        session.commit()
+        session.close()
+
+        class EventManager(AlchemyManager):
+            model = Event
+            fields = ('id', 'happened')
+            keyset_fields = ('happened', 'id')
+            paginate_by = 3
+            keyset_pagination = True
+
+        manager = EventManager(self.session_handler)
+        props, meta = manager.retrieve_list({})
+        pages = [[p['id'] for p in props]]
+        while meta['links']['next']:
+            props, meta = manager.retrieve_list(dict(meta['links']['next']))
+            pages.append([p['id'] for p in props])
+        self.assertEqual(pages, [[1, 2, 3], [4, 5, 6], [7]])
+        props, meta = manager.retrieve_list(dict(meta['links']['previous']))
+        self.assertEqual([p['id'] for p in props], [4, 5, 6])
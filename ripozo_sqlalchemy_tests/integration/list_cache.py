@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo import restmixins, RequestContainer
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, SessionHandler, LRUCache
+
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+import unittest2
+
+
+class TestListCache(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class Parent(self.Base):
+            __tablename__ = 'list_parent'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            children = relationship('Child')
+
+        class Child(self.Base):
+            __tablename__ = 'list_child'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            parent_id = Column(Integer, ForeignKey('list_parent.id'))
+
+        class Other(self.Base):
+            __tablename__ = 'list_other'
+            id = Column(Integer, primary_key=True)
+
+        self.Base.metadata.create_all()
+        self.Parent, self.Child, self.Other = Parent, Child, Other
+
+        class ParentManager(AlchemyManager):
+            model = Parent
+            fields = ('id', 'value', 'children.id', 'children.value')
+            paginate_by = 2
+            list_cache = LRUCache()
+
+        self.manager = ParentManager(self.session_handler)
+
+        class ParentResource(restmixins.RetrieveList):
+            manager = self.manager
+            pks = ('id',)
+            resource_name = 'parent'
+
+        self.resource = ParentResource
+        session = self.session_handler.get_session()
+        for i in range(3):
+            session.add(Parent(value='{0}'.format(i % 2), children=[Child(value='child')]))
+        session.commit()
+        session.close()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    @property
+    def cache(self):
+        return self.manager.list_cache
+
+    def assert_cached(self, filters):
+        count = len(self.statements)
+        resp = self.manager.retrieve_list(dict(filters))
+        self.assertEqual(len(self.statements), count)
+        return resp
+
+    def test_first_page_cached(self):
+        expected = self.manager.retrieve_list({})
+        self.assertEqual(self.assert_cached({}), expected)
+        self.assertDictEqual(self.cache.stats, dict(hits=1, misses=1))
+
+    def test_keyed_on_arguments(self):
+        self.manager.retrieve_list({})
+        props, meta = self.manager.retrieve_list(dict(page=2))
+        self.assertEqual([p['id'] for p in props], [3])
+        props, meta = self.manager.retrieve_list(dict(value='1'))
+        self.assertEqual([p['id'] for p in props], [2])
+        props, meta = self.manager.retrieve_list(dict(count=3))
+        self.assertEqual(len(props), 3)
+        self.assertEqual(len(self.cache), 4)
+        self.assert_cached(dict(page=2))
+        self.assert_cached(dict(count=3))
+
+    def test_list_arguments_popped(self):
+        """
+        Tests that the list arguments are removed from the
+        filters whether or not the page was cached.
+        """
+        for _ in range(2):
+            filters = dict(page=1, count=2, value='0')
+            self.manager.retrieve_list(filters)
+            self.assertDictEqual(filters, dict(value='0'))
+
+    def test_resource(self):
+        request = RequestContainer(query_args=dict(page=1))
+        first = self.resource.retrieve_list(request)
+        second = self.resource.retrieve_list(RequestContainer(query_args=dict(page=1)))
+        self.assertDictEqual(first.properties, second.properties)
+        self.assertEqual(len(second.properties['parent']), 2)
+        self.assertEqual(second.properties['page'], 1)
+
+    def test_create_invalidates(self):
+        self.manager.retrieve_list(dict(page=2))
+        self.manager.create(dict(value='new'))
+        props, meta = self.manager.retrieve_list(dict(page=2))
+        self.assertEqual(len(props), 2)
+
+    def test_related_write_invalidates(self):
+        self.manager.retrieve_list({})
+        session = self.session_handler.get_session()
+        session.query(self.Child).get(1).value = 'updated'
+        session.commit()
+        session.close()
+        props, meta = self.manager.retrieve_list({})
+        self.assertEqual(props[0]['children'][0]['value'], 'updated')
+
+    def test_unrelated_write(self):
+        self.manager.retrieve_list({})
+        session = self.session_handler.get_session()
+        session.add(self.Other())
+        session.commit()
+        session.close()
+        self.assert_cached({})
+
+    def test_bulk_delete_invalidates(self):
+        self.manager.retrieve_list(dict(value='1'))
+        session = self.session_handler.get_session()
+        session.query(self.Child).delete()
+        session.commit()
+        session.close()
+        self.manager.delete_many(dict(value='1'))
+        props, meta = self.manager.retrieve_list(dict(value='1'))
+        self.assertListEqual(props, [])
+
+    def test_uncommitted_read_not_cached(self):
+        session = self.session_handler.session_maker.session_factory()
+        manager = self.manager.__class__(SessionHandler(session))
+        session.query(self.Parent).get(1).value = 'uncommitted'
+        session.flush()
+        props, meta = manager.retrieve_list({})
+        self.assertEqual(props[0]['value'], 'uncommitted')
+        session.rollback()
+        for _ in range(2):
+            props, meta = manager.retrieve_list({})
+            self.assertEqual(props[0]['value'], '0')
+        session.close()
+
+    def test_rollback_invalidates(self):
+        """
+        Tests that a page cached by another session that could
+        see the uncommitted row is invalidated by the rollback.
+        The in memory database shares one connection per thread.
+        """
+        session = self.session_handler.session_maker.session_factory()
+        session.add(self.Parent(value='uncommitted'))
+        session.flush()
+        self.assertEqual(len(self.manager.retrieve_list(dict(count=5))[0]), 4)
+        self.assertEqual(len(self.cache), 1)
+        session.rollback()
+        session.close()
+        self.assertEqual(len(self.manager.retrieve_list(dict(count=5))[0]), 3)
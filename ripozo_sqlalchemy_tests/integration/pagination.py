@@ -6,7 +6,7 @@ from __future__ import unicode_literals
 from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler
 from ripozo import restmixins, RequestContainer
 
-from sqlalchemy import create_engine, Column
+from sqlalchemy import create_engine, Column, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.types import Integer, String
 
@@ -180,3 +180,23 @@ class TestPagination(unittest2.TestCase):
         self.assertEqual(meta['links']['next']['count'], 10)
         self.assertEqual(meta['links']['previous']['page'], 1)
         self.assertEqual(meta['links']['previous']['count'], 10)
+
+    def test_retrieve_list_single_query(self):
+        """
+        Tests that a page is retrieved in one round trip
+        including determining whether there is a next page.
+        """
+        self.create_models(count=25)
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        event.listen(self.engine, 'before_cursor_execute', before_cursor_execute)
+        try:
+            props, meta = self.manager.retrieve_list({self.manager.pagination_pk_query_arg: 2})
+        finally:
+            event.remove(self.engine, 'before_cursor_execute', before_cursor_execute)
+        self.assertEqual(len(props), 10)
+        self.assertEqual(meta['links']['next']['page'], 3)
+        self.assertEqual(len(statements), 1)
@@ -0,0 +1,67 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+
+from ripozo_sqlalchemy import AlchemyManager, RoutingSessionHandler
+
+from sqlalchemy import create_engine, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+import unittest2
+
+
+class TestReplicaRouting(unittest2.TestCase):
+    """
+    The primary and the replica are separate databases
+    so that the tests can tell where a read was sent.
+    """
+    def setUp(self):
+        self.primary = create_engine('sqlite:///:memory:')
+        self.replica = create_engine('sqlite:///:memory:')
+        self.Base = declarative_base()
+
+        class Person(self.Base):
+            __tablename__ = 'person'
+            id = Column(Integer, primary_key=True)
+            first_name = Column(String(length=50))
+
+        self.Base.metadata.create_all(self.primary)
+        self.Base.metadata.create_all(self.replica)
+        self.replica.execute(Person.__table__.insert(), [dict(id=1, first_name='replica')])
+        self.session_handler = RoutingSessionHandler(self.primary, [self.replica])
+
+        class PersonManager(AlchemyManager):
+            model = Person
+            fields = ('id', 'first_name')
+            update_fields = ('first_name',)
+            paginate_by = 10
+
+        self.manager = PersonManager(self.session_handler)
+
+    def tearDown(self):
+        self.session_handler.end_request()
+        self.primary.dispose()
+        self.replica.dispose()
+
+    def test_reads_sent_to_replica(self):
+        self.assertEqual(self.manager.retrieve(dict(id=1))['first_name'], 'replica')
+        props, meta = self.manager.retrieve_list({})
+        self.assertEqual([p['first_name'] for p in props], ['replica'])
+        props, etag = self.manager.retrieve_conditional(dict(id=1))
+        self.assertEqual(props['first_name'], 'replica')
+
+    def test_writes_sent_to_primary(self):
+        created = self.manager.create(dict(id=2, first_name='primary'))
+        self.assertEqual(self.primary.execute('SELECT COUNT(*) FROM person').scalar(), 1)
+        self.assertEqual(self.replica.execute('SELECT COUNT(*) FROM person').scalar(), 1)
+        self.assertEqual(created['first_name'], 'primary')
+
+    def test_read_your_writes(self):
+        created = self.manager.create(dict(id=2, first_name='primary'))
+        self.assertEqual(self.manager.retrieve(dict(id=2)), created)
+        self.session_handler.end_request()
+        # The replica has not caught up
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=2))
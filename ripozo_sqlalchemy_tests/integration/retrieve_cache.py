@@ -0,0 +1,189 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, SessionHandler, LRUCache
+
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+import unittest2
+
+
+class TestRetrieveCache(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class Parent(self.Base):
+            __tablename__ = 'cached_parent'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            children = relationship('Child')
+
+        class Child(self.Base):
+            __tablename__ = 'cached_child'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+            parent_id = Column(Integer, ForeignKey('cached_parent.id'))
+
+        self.Base.metadata.create_all()
+        self.Parent, self.Child = Parent, Child
+
+        class ParentManager(AlchemyManager):
+            model = Parent
+            fields = ('id', 'value', 'children.id', 'children.value')
+            update_fields = ('value',)
+            retrieve_cache = LRUCache()
+
+        class ChildManager(AlchemyManager):
+            model = Child
+            fields = ('id', 'value', 'parent_id')
+
+        self.manager = ParentManager(self.session_handler)
+        self.child_manager = ChildManager(self.session_handler)
+        session = self.session_handler.get_session()
+        for i in range(2):
+            session.add(Parent(value='parent', children=[Child(value='child')]))
+        session.commit()
+        session.close()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement)
+
+    @property
+    def cache(self):
+        return self.manager.retrieve_cache
+
+    def retrieve_twice(self, pk=1):
+        self.manager.retrieve(dict(id=pk))
+        count = len(self.statements)
+        props = self.manager.retrieve(dict(id=pk))
+        return props, len(self.statements) - count
+
+    def test_cache_hit(self):
+        props, statements = self.retrieve_twice()
+        self.assertEqual(statements, 0)
+        self.assertDictEqual(props, dict(id=1, value='parent',
+                                         children=[dict(id=1, value='child')]))
+        self.assertDictEqual(self.cache.stats, dict(hits=1, misses=1))
+
+    def test_translated_lookup_keys(self):
+        self.manager.retrieve(dict(id=1))
+        count = len(self.statements)
+        self.manager.retrieve(dict(id='1'))
+        self.assertEqual(len(self.statements), count)
+
+    def test_returned_value_copied(self):
+        props = self.manager.retrieve(dict(id=1))
+        props['children'].pop()
+        self.assertEqual(len(self.manager.retrieve(dict(id=1))['children']), 1)
+
+    def test_not_found_not_cached(self):
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=10))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_update_invalidates(self):
+        self.manager.retrieve(dict(id=1))
+        self.manager.update(dict(id=1), dict(value='updated'))
+        self.assertEqual(self.manager.retrieve(dict(id=1))['value'], 'updated')
+
+    def test_delete_invalidates(self):
+        session = self.session_handler.get_session()
+        session.query(self.Child).delete()
+        session.commit()
+        self.manager.retrieve(dict(id=1))
+        self.manager.delete(dict(id=1))
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=1))
+
+    def test_other_session_invalidates(self):
+        self.manager.retrieve(dict(id=1))
+        session = self.session_handler.get_session()
+        session.query(self.Parent).get(1).value = 'other'
+        session.commit()
+        session.close()
+        self.assertEqual(self.manager.retrieve(dict(id=1))['value'], 'other')
+
+    def test_other_rows_stay_cached(self):
+        self.manager.retrieve(dict(id=1))
+        self.manager.update(dict(id=2), dict(value='updated'))
+        count = len(self.statements)
+        self.manager.retrieve(dict(id=1))
+        self.assertEqual(len(self.statements), count)
+
+    def test_related_write_invalidates(self):
+        self.manager.retrieve(dict(id=1))
+        self.child_manager.update(dict(id=1), dict(value='updated'))
+        props = self.manager.retrieve(dict(id=1))
+        self.assertEqual(props['children'][0]['value'], 'updated')
+
+    def test_related_insert_invalidates(self):
+        self.manager.retrieve(dict(id=1))
+        self.child_manager.create_many([dict(value='new', parent_id=1)])
+        self.assertEqual(len(self.manager.retrieve(dict(id=1))['children']), 2)
+
+    def test_bulk_update_invalidates(self):
+        self.manager.retrieve(dict(id=1))
+        self.manager.update_many(dict(value='parent'), dict(value='bulk'))
+        self.assertEqual(self.manager.retrieve(dict(id=1))['value'], 'bulk')
+
+    def test_rollback_keeps_values(self):
+        self.manager.retrieve(dict(id=1))
+        session = self.session_handler.get_session()
+        session.query(self.Parent).get(1).value = 'rolled back'
+        session.flush()
+        session.rollback()
+        session.close()
+        self.assertEqual(self.manager.retrieve(dict(id=1))['value'], 'parent')
+
+    def test_uncommitted_read_not_cached(self):
+        session = self.session_handler.session_maker.session_factory()
+        manager = self.manager.__class__(SessionHandler(session))
+        session.query(self.Parent).get(1).value = 'uncommitted'
+        session.flush()
+        self.assertEqual(manager.retrieve(dict(id=1))['value'], 'uncommitted')
+        session.rollback()
+        self.assertEqual(manager.retrieve(dict(id=1))['value'], 'parent')
+        self.assertEqual(manager.retrieve(dict(id=1))['value'], 'parent')
+        session.close()
+
+    def test_rollback_invalidates(self):
+        """
+        Tests that values read inside a transaction
+        are invalidated when its writes are rolled back.
+        """
+        session = self.session_handler.session_maker.session_factory()
+        session.query(self.Parent).get(1).value = 'uncommitted'
+        session.flush()
+        self.cache.set(self.manager._get_retrieve_cache_key(dict(id=1)), dict(value='stale'))
+        session.rollback()
+        session.close()
+        self.assertEqual(self.manager.retrieve(dict(id=1))['value'], 'parent')
+
+    def test_lookup_not_primary_key(self):
+        self.manager.retrieve(dict(value='parent', id=1))
+        self.assertEqual(len(self.cache), 0)
+
+    def test_delete_by_primary_key_invalidates(self):
+        class ChildManager(self.child_manager.__class__):
+            retrieve_cache = LRUCache()
+
+        manager = ChildManager(self.session_handler)
+        manager.retrieve(dict(id=1))
+        manager.retrieve(dict(id=2))
+        manager.delete(dict(id=1))
+        self.assertEqual(self.statements[-1].split()[0], 'DELETE')
+        self.assertRaises(NotFoundException, manager.retrieve, dict(id=1))
+        count = len(self.statements)
+        manager.retrieve(dict(id=2))
+        self.assertEqual(len(self.statements), count)
@@ -0,0 +1,174 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+
+from ripozo_sqlalchemy import AlchemyManager, ShardedSessionHandler
+
+from sqlalchemy import create_engine, event, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+
+import os
+import shutil
+import tempfile
+import unittest2
+
+
+def shard_function(model, values):
+    if values.get('id') is None:
+        return None
+    return 'even' if values['id'] % 2 == 0 else 'odd'
+
+
+class TestShardedSessionHandler(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engines = dict((name, create_engine('sqlite:///{0}'.format(
+            os.path.join(self.directory, '{0}.db'.format(name))))) for name in ('even', 'odd'))
+        self.Base = declarative_base()
+
+        class Person(self.Base):
+            __tablename__ = 'person'
+            id = Column(Integer, primary_key=True, autoincrement=False)
+            first_name = Column(String(length=50))
+
+        for engine in self.engines.values():
+            self.Base.metadata.create_all(engine)
+        self.model = Person
+        self.session_handler = ShardedSessionHandler(self.engines, shard_function)
+
+        class PersonManager(AlchemyManager):
+            model = Person
+            fields = ('id', 'first_name')
+            create_fields = ('id', 'first_name')
+            update_fields = ('first_name',)
+            paginate_by = 10
+            total_count_strategy = 'exact'
+            total_count_query_arg = 'total'
+
+        self.manager_class = PersonManager
+        self.manager = PersonManager(self.session_handler)
+
+    def tearDown(self):
+        self.session_handler.close()
+        for engine in self.engines.values():
+            engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def get_ids(self, shard):
+        return [row[0] for row in self.engines[shard].execute('SELECT id FROM person ORDER BY id')]
+
+    def create_people(self, count):
+        self.manager.create_many([dict(id=i, first_name='name{0}'.format(i))
+                                  for i in range(1, count + 1)])
+
+    def test_create_routed(self):
+        created = self.manager.create(dict(id=3, first_name='John'))
+        self.assertEqual(created, dict(id=3, first_name='John'))
+        self.assertEqual(self.get_ids('odd'), [3])
+        self.assertEqual(self.get_ids('even'), [])
+
+    def test_create_without_shard_key(self):
+        self.assertRaises(ValueError, self.manager.create, dict(first_name='John'))
+
+    def test_create_many_routed(self):
+        self.create_people(5)
+        self.assertEqual(self.get_ids('odd'), [1, 3, 5])
+        self.assertEqual(self.get_ids('even'), [2, 4])
+
+    def test_retrieve_update_delete(self):
+        self.create_people(4)
+        self.assertEqual(self.manager.retrieve(dict(id=2))['first_name'], 'name2')
+        updated = self.manager.update(dict(id=2), dict(first_name='Jane'))
+        self.assertEqual(updated, dict(id=2, first_name='Jane'))
+        self.assertEqual(self.manager.retrieve(dict(id=2)), updated)
+        self.manager.delete(dict(id=2))
+        self.assertEqual(self.get_ids('even'), [4])
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=2))
+        self.assertRaises(NotFoundException, self.manager.delete, dict(id=2))
+
+    def test_lookups_run_on_one_shard(self):
+        self.create_people(4)
+        statements = []
+        event.listen(self.engines['odd'], 'before_cursor_execute',
+                     lambda *args: statements.append(args[2]))
+        self.manager.retrieve(dict(id=2))
+        self.manager.update(dict(id=2), dict(first_name='Jane'))
+        self.manager.delete(dict(id=2))
+        self.assertEqual(statements, [])
+
+    def test_retrieve_list_keyset(self):
+        class Manager(self.manager_class):
+            keyset_pagination = True
+
+        manager = Manager(self.session_handler)
+        self.create_people(25)
+        props, meta = manager.retrieve_list({})
+        pages = [[p['id'] for p in props]]
+        while meta['links']['next']:
+            props, meta = manager.retrieve_list(dict(meta['links']['next']))
+            pages.append([p['id'] for p in props])
+        self.assertEqual(pages, [list(range(1, 11)), list(range(11, 21)), list(range(21, 26))])
+
+        backwards = [pages[-1]]
+        while meta['links']['previous']:
+            props, meta = manager.retrieve_list(dict(meta['links']['previous']))
+            backwards.append([p['id'] for p in props])
+        self.assertEqual(list(reversed(backwards)), pages)
+
+    def test_retrieve_list_offset(self):
+        self.create_people(25)
+        props, meta = self.manager.retrieve_list(dict(total='exact'))
+        self.assertEqual([p['id'] for p in props], list(range(1, 11)))
+        self.assertEqual(meta['total'], 25)
+        self.assertIsNone(meta['links']['previous'])
+        props, meta = self.manager.retrieve_list(dict(page=3))
+        self.assertEqual([p['id'] for p in props], list(range(21, 26)))
+        self.assertIsNone(meta['links']['next'])
+        self.assertEqual(meta['links']['previous']['page'], 2)
+
+    def test_retrieve_list_capped_total(self):
+        self.manager_class.total_count_cap = 5
+        self.create_people(4)
+        props, meta = self.manager.retrieve_list(dict(total='capped'))
+        self.assertEqual((meta['total'], meta['total_strategy']), (4, 'capped'))
+        self.manager.create_many([dict(id=i) for i in range(5, 30)])
+        props, meta = self.manager.retrieve_list(dict(total='capped'))
+        self.assertEqual((meta['total'], meta['total_strategy']), ('5+', 'capped'))
+
+    def test_retrieve_list_estimated_total(self):
+        self.manager_class.total_count_cap = 5
+        self.create_people(29)
+        props, meta = self.manager.retrieve_list(dict(total='estimate'))
+        self.assertEqual((meta['total'], meta['total_strategy']), ('5+', 'capped'))
+        self.engines['odd'].execute('ANALYZE')
+        props, meta = self.manager.retrieve_list(dict(total='estimate'))
+        self.assertEqual((meta['total'], meta['total_strategy']), ('5+', 'capped'))
+        self.engines['even'].execute('ANALYZE')
+        props, meta = self.manager.retrieve_list(dict(total='estimate'))
+        self.assertEqual((meta['total'], meta['total_strategy']), (29, 'estimate'))
+
+    def test_retrieve_list_filters(self):
+        self.create_people(6)
+        props, meta = self.manager.retrieve_list(dict(first_name='name4'))
+        self.assertEqual(props, [dict(id=4, first_name='name4')])
+
+    def test_bulk_update_and_delete(self):
+        self.create_people(5)
+        self.assertEqual(self.manager.update_many(dict(first_name='name1'),
+                                                  dict(first_name='x'))['count'], 1)
+        self.assertEqual(self.manager.delete_many(dict(first_name='name2'))['count'], 1)
+        self.assertEqual(self.get_ids('even'), [4])
+
+    def test_retrieve_list_conditional(self):
+        class Manager(self.manager_class):
+            etag_column = 'id'
+
+        manager = Manager(self.session_handler)
+        self.create_people(5)
+        props, meta = manager.retrieve_list_conditional({})
+        self.assertEqual(len(props), 5)
+        manager.create(dict(id=6))
+        self.assertNotEqual(manager.retrieve_list_conditional({})[1]['etag'], meta['etag'])
@@ -0,0 +1,91 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo.exceptions import NotFoundException
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, SessionHandler
+
+from sqlalchemy import create_engine, Column, Integer, String, event
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import sessionmaker
+
+import unittest2
+
+
+class TestStatementCounts(unittest2.TestCase):
+    """
+    Tests the number of statements run by the
+    single resource operations.
+    """
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class MyModel(self.Base):
+            __tablename__ = 'my_model'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=50))
+
+        self.model = MyModel
+        self.Base.metadata.create_all()
+
+        class MyManager(AlchemyManager):
+            model = MyModel
+            fields = ('id', 'value')
+
+        self.manager = MyManager(self.session_handler)
+        session = self.session_handler.get_session()
+        session.add(MyModel(value='a'))
+        session.commit()
+        session.close()
+        self.statements = []
+        event.listen(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+
+    def tearDown(self):
+        event.remove(self.engine, 'before_cursor_execute', self.before_cursor_execute)
+        self.engine.dispose()
+
+    def before_cursor_execute(self, conn, cursor, statement, *args):
+        self.statements.append(statement.split()[0])
+
+    def test_update(self):
+        """
+        Tests that the model is not reloaded after the commit
+        when the database does not support UPDATE ... RETURNING
+        """
+        resp = self.manager.update(dict(id=1), dict(value='b'))
+        self.assertDictEqual(resp, dict(id=1, value='b'))
+        self.assertListEqual(self.statements, ['SELECT', 'UPDATE'])
+
+    def test_create(self):
+        """
+        Tests that the created model is not reloaded
+        """
+        resp = self.manager.create(dict(value='b'))
+        self.assertDictEqual(resp, dict(id=2, value='b'))
+        self.assertListEqual(self.statements, ['INSERT'])
+
+    def test_retrieve_identity_map(self):
+        """
+        Tests that primary key lookups use the session's identity map
+        """
+        session = sessionmaker(self.engine)()
+        model = session.query(self.model).filter_by(value='a').one()
+        del self.statements[:]
+        manager = self.manager.__class__(SessionHandler(session))
+        self.assertDictEqual(manager.retrieve(dict(id=model.id)), dict(id=1, value='a'))
+        self.assertDictEqual(manager.retrieve(dict(id=model.id)), dict(id=1, value='a'))
+        self.assertListEqual(self.statements, [])
+        session.close()
+
+    def test_retrieve_primary_key_not_found(self):
+        self.assertRaises(NotFoundException, self.manager.retrieve, dict(id=2))
+
+    def test_retrieve_overridden_queryset(self):
+        class MyManager(self.manager.__class__):
+            def queryset(self, session):
+                return session.query(self.model).filter(self.model.value != 'a')
+
+        self.assertRaises(NotFoundException, MyManager(self.session_handler).retrieve, dict(id=1))
@@ -0,0 +1,125 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler, ShardedSessionHandler
+
+from sqlalchemy import create_engine, Column, Integer, String, ForeignKey
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.orm import relationship
+
+import mock
+import os
+import shutil
+import tempfile
+import unittest2
+
+
+class TestRetrieveListStream(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:')
+        self.Base = declarative_base()
+
+        class Parent(self.Base):
+            __tablename__ = 'parent'
+            id = Column(Integer, primary_key=True)
+            name = Column(String(length=50))
+            children = relationship('Child', order_by='Child.id')
+
+        class Child(self.Base):
+            __tablename__ = 'child'
+            id = Column(Integer, primary_key=True)
+            parent_id = Column(Integer, ForeignKey('parent.id'))
+
+        self.Base.metadata.create_all(self.engine)
+        self.Parent, self.Child = Parent, Child
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class ORMManager(AlchemyManager):
+            model = Parent
+            fields = ('id', 'name', 'children.id')
+            paginate_by = 2
+            stream_chunk_size = 3
+
+        class CoreManager(ORMManager):
+            core_reads = True
+
+        self.managers = [ORMManager(self.session_handler), CoreManager(self.session_handler)]
+        session = self.session_handler.get_session()
+        for i in range(1, 11):
+            session.add(Parent(id=i, name='name{0}'.format(i % 2),
+                               children=[Child(id=i * 10 + j) for j in range(i % 3)]))
+        session.commit()
+        session.close()
+
+    def expected(self, ids):
+        return [dict(id=i, name='name{0}'.format(i % 2),
+                     children=[dict(id=i * 10 + j) for j in range(i % 3)]) for i in ids]
+
+    def test_stream_all(self):
+        for manager in self.managers:
+            props = list(manager.retrieve_list_stream({}))
+            self.assertEqual(props, self.expected(range(1, 11)))
+
+    def test_stream_filtered(self):
+        for manager in self.managers:
+            props = list(manager.retrieve_list_stream(dict(name='name1', count=1, page=2)))
+            self.assertEqual(props, self.expected(range(1, 11, 2)))
+
+    def test_stream_is_lazy(self):
+        for manager in self.managers:
+            with mock.patch.object(self.session_handler, 'handle_session') as handle_session:
+                stream = manager.retrieve_list_stream({})
+                self.assertFalse(handle_session.called)
+                self.assertEqual(next(stream), self.expected([1])[0])
+                self.assertFalse(handle_session.called)
+                stream.close()
+                self.assertEqual(handle_session.call_count, 1)
+                self.assertIsNone(handle_session.call_args[1]['exc'])
+
+    def test_stream_exception_handled(self):
+        manager = self.managers[0]
+        with mock.patch.object(self.session_handler, 'handle_session') as handle_session:
+            with mock.patch.object(manager, 'serialize_model', side_effect=ValueError):
+                self.assertRaises(ValueError, list, manager.retrieve_list_stream({}))
+            self.assertIsInstance(handle_session.call_args[1]['exc'], ValueError)
+
+
+class TestShardedRetrieveListStream(unittest2.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.engines = dict((name, create_engine('sqlite:///{0}'.format(
+            os.path.join(self.directory, '{0}.db'.format(name))))) for name in ('even', 'odd'))
+        self.Base = declarative_base()
+
+        class Person(self.Base):
+            __tablename__ = 'person'
+            id = Column(Integer, primary_key=True, autoincrement=False)
+            first_name = Column(String(length=50))
+
+        for engine in self.engines.values():
+            self.Base.metadata.create_all(engine)
+        self.model = Person
+        self.session_handler = ShardedSessionHandler(
+            self.engines, lambda model, values: ('even', 'odd')[values['id'] % 2])
+
+        class PersonManager(AlchemyManager):
+            model = Person
+            fields = ('id', 'first_name')
+            create_fields = ('id', 'first_name')
+            stream_chunk_size = 2
+
+        self.manager = PersonManager(self.session_handler)
+
+    def tearDown(self):
+        self.session_handler.close()
+        for engine in self.engines.values():
+            engine.dispose()
+        shutil.rmtree(self.directory)
+
+    def test_stream_merged(self):
+        self.manager.create_many([dict(id=i, first_name='name{0}'.format(i))
+                                  for i in range(1, 8)])
+        props = list(self.manager.retrieve_list_stream({}))
+        self.assertEqual([p['id'] for p in props], list(range(1, 8)))
@@ -0,0 +1,129 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy import AlchemyManager, ScopedSessionHandler
+from ripozo.exceptions import TranslationException
+
+from sqlalchemy import create_engine, Column
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.types import Integer, String
+
+import unittest2
+
+
+class TestTotalCount(unittest2.TestCase):
+    def setUp(self):
+        self.engine = create_engine('sqlite:///:memory:', echo=True)
+        self.Base = declarative_base(self.engine)
+        self.session_handler = ScopedSessionHandler(self.engine)
+
+        class MyModel(self.Base):
+            __tablename__ = 'my_model'
+            id = Column(Integer, primary_key=True)
+            value = Column(String(length=63), index=True)
+            total = Column(Integer)
+
+        self.model = MyModel
+        self.Base.metadata.create_all()
+
+        class MyManager(AlchemyManager):
+            model = self.model
+            fields = ('id', 'value',)
+            paginate_by = 5
+            total_count_cap = 8
+
+        class ClientManager(MyManager):
+            total_count_strategy = 'exact'
+            total_count_query_arg = 'total'
+
+        self.manager = MyManager(self.session_handler)
+        self.client_manager = ClientManager(self.session_handler)
+
+    def tearDown(self):
+        self.engine.dispose()
+
+    def create_models(self, count=5, value='blah'):
+        session = self.session_handler.get_session()
+        for i in range(count):
+            session.add(self.model(value=value))
+        session.commit()
+        session.close()
+
+    def test_no_total_by_default(self):
+        self.create_models(count=3)
+        props, meta = self.manager.retrieve_list({})
+        self.assertNotIn('total', meta)
+
+    def test_query_arg_disabled_by_default(self):
+        session = self.session_handler.get_session()
+        session.add(self.model(value='blah', total=1))
+        session.commit()
+        session.close()
+        self.create_models(count=2)
+        props, meta = self.manager.retrieve_list(dict(total=1))
+        self.assertEqual(len(props), 1)
+        self.assertNotIn('total', meta)
+
+    def test_exact(self):
+        self.create_models(count=12)
+        self.create_models(count=2, value='other')
+        props, meta = self.client_manager.retrieve_list(dict(total='exact', value='blah'))
+        self.assertEqual(meta['total'], 12)
+        self.assertEqual(meta['total_strategy'], 'exact')
+        self.assertEqual(len(props), 5)
+
+    def test_capped(self):
+        self.create_models(count=12)
+        props, meta = self.client_manager.retrieve_list(dict(total='capped'))
+        self.assertEqual(meta['total'], '8+')
+        self.assertEqual(meta['total_strategy'], 'capped')
+
+        props, meta = self.client_manager.retrieve_list(dict(total='capped', value='nope'))
+        self.assertEqual(meta['total'], 0)
+
+    def test_class_strategy(self):
+        self.create_models(count=12)
+        props, meta = self.client_manager.retrieve_list({})
+        self.assertEqual(meta['total'], 12)
+
+    def test_client_cannot_escalate(self):
+        class CappedManager(self.client_manager.__class__):
+            total_count_strategy = 'capped'
+
+        self.create_models(count=12)
+        manager = CappedManager(self.session_handler)
+        props, meta = manager.retrieve_list(dict(total='exact'))
+        self.assertEqual(meta['total'], '8+')
+        self.assertEqual(meta['total_strategy'], 'capped')
+        props, meta = manager.retrieve_list(dict(total=''))
+        self.assertNotIn('total', meta)
+
+        class NoTotalManager(self.client_manager.__class__):
+            total_count_strategy = None
+
+        props, meta = NoTotalManager(self.session_handler).retrieve_list(dict(total='exact'))
+        self.assertNotIn('total', meta)
+
+    def test_estimate_sqlite_stat1(self):
+        self.create_models(count=20)
+        self.engine.execute('ANALYZE')
+        self.create_models(count=3)
+        props, meta = self.client_manager.retrieve_list(dict(total='estimate'))
+        self.assertEqual(meta['total'], 20)
+        self.assertEqual(meta['total_strategy'], 'estimate')
+
+    def test_estimate_falls_back_to_capped(self):
+        self.create_models(count=12)
+        props, meta = self.client_manager.retrieve_list(dict(total='estimate'))
+        self.assertEqual(meta['total'], '8+')
+        self.assertEqual(meta['total_strategy'], 'capped')
+
+        self.engine.execute('ANALYZE')
+        props, meta = self.client_manager.retrieve_list(dict(total='estimate', value='blah'))
+        self.assertEqual(meta['total_strategy'], 'capped')
+
+    def test_unknown_strategy(self):
+        self.assertRaises(TranslationException, self.client_manager.retrieve_list,
+                          dict(total='fake'))
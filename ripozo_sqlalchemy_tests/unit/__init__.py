@@ -3,4 +3,4 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from . import alchemy_manager, session_handlers
\ No newline at end of file
+from . import alchemy_manager, caching, session_handlers, streaming
\ No newline at end of file
@@ -3,7 +3,11 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
+from datetime import datetime
+from decimal import Decimal
+
 from ripozo_sqlalchemy.alchemymanager import AlchemyManager, NoResultFound, NotFoundException
+from ripozo_sqlalchemy.serialization import _freeze_value
 
 import mock
 import unittest2
@@ -53,8 +57,162 @@ class TestAlchemyManager(unittest2.TestCase):
         resp = m._serialize_model_helper(model, field_dict=field_dict)
         self.assertDictEqual(dict(first=1, second=dict(third=3)), resp)
 
+    def test_serialize_model_json_safe(self):
+        """
+        Tests that nested values are made json safe.
+        """
+        m = AlchemyManager(None)
+        field_dict = dict(first=None, second=dict(third=None))
+        now = datetime.now()
+        model = mock.Mock(first=now, second=[mock.Mock(third=Decimal('1.5')), None])
+        resp = m.serialize_model(model, field_dict=field_dict)
+        self.assertDictEqual(dict(first=str(now), second=[dict(third=1.5), None]), resp)
+
+    def test_serializer_cached(self):
+        """
+        Tests that the compiled serializer is reused for
+        equal field dicts and cached per manager class.
+        """
+        class Manager(AlchemyManager):
+            pass
+
+        m = Manager(None)
+        serializer = m._get_serializer(dict(first=None, second=dict(third=None)))
+        self.assertIs(serializer, m._get_serializer(dict(second=dict(third=None), first=None)))
+        self.assertIsNot(serializer, m._get_serializer(dict(first=None)))
+        self.assertIn('_class_cache', Manager.__dict__)
+
+    def test_dot_field_list_to_dict_memoized(self):
+        class Manager(AlchemyManager):
+            fields = ('id', 'related.id')
+
+        m = Manager(None)
+        field_dict = m.dot_field_list_to_dict()
+        self.assertDictEqual(dict(id=None, related=dict(id=None)), field_dict)
+        self.assertIs(field_dict, Manager(None).dot_field_list_to_dict(['id', 'related.id']))
+        self.assertDictEqual(dict(id=None), m.dot_field_list_to_dict(['id']))
+
+    def test_get_field_type_memoized(self):
+        class Manager(AlchemyManager):
+            model = mock.MagicMock()
+
+        with mock.patch.object(Manager, '_get_field_python_type', return_value=int) as get_type:
+            field = Manager.get_field_type('id')
+            self.assertIs(field, Manager.get_field_type('id'))
+            self.assertEqual(get_type.call_count, 1)
+
+    def test_clear_cache(self):
+        class Manager(AlchemyManager):
+            fields = ('id',)
+
+        class SubManager(Manager):
+            pass
+
+        field_dict = Manager(None).dot_field_list_to_dict()
+        sub_field_dict = SubManager(None).dot_field_list_to_dict()
+        Manager.clear_cache()
+        self.assertIsNot(field_dict, Manager(None).dot_field_list_to_dict())
+        self.assertIsNot(sub_field_dict, SubManager(None).dot_field_list_to_dict())
+
     def test_queryset(self):
         m = AlchemyManager(None)
         session = mock.MagicMock()
         resp = m.queryset(session)
         self.assertTrue(session.query.called)
+
+    def test_insert_returning(self):
+        """
+        Tests that the returned primary keys are set on the
+        rows and that rows are grouped by their keys.
+        """
+        from sqlalchemy import Column, Integer, String
+        from sqlalchemy.ext.declarative import declarative_base
+        from sqlalchemy.inspection import inspect
+
+        class Model(declarative_base()):
+            __tablename__ = 'model'
+            id = Column(Integer, primary_key=True)
+            value = Column('value_column', String)
+
+        session = mock.MagicMock()
+        session.execute.return_value.fetchall.side_effect = [[(1,), (3,)], [(2,)]]
+        rows = [dict(value='a'), dict(), dict(value='b')]
+        AlchemyManager._insert_returning(session, inspect(Model), rows)
+        self.assertListEqual(rows, [dict(id=1, value='a'), dict(id=2), dict(id=3, value='b')])
+        params = [call[0][1] for call in session.execute.call_args_list]
+        self.assertListEqual(params, [[dict(value_column='a'), dict(value_column='b')], [{}]])
+
+    def test_update_many_returning(self):
+        """
+        Tests that the updated rows are serialized when
+        the database supports UPDATE ... RETURNING
+        """
+        from sqlalchemy import Column, Integer
+        from sqlalchemy.dialects import postgresql
+        from sqlalchemy.ext.declarative import declarative_base
+
+        class Model(declarative_base()):
+            __tablename__ = 'model'
+            id = Column(Integer, primary_key=True)
+            value = Column(Integer)
+
+        class Manager(AlchemyManager):
+            model = Model
+            fields = ('id', 'value')
+
+        session = mock.MagicMock()
+        session.get_bind.return_value.dialect.full_returning = True
+        session.execute.return_value.fetchall.return_value = [(1, 2)]
+        session_handler = mock.MagicMock(get_session=mock.Mock(return_value=session))
+        resp = Manager(session_handler).update_many(dict(id=1), dict(value='2'))
+        self.assertDictEqual(resp, dict(count=1, updated=[dict(id=1, value=2)]))
+        statement = session.execute.call_args[0][0]
+        self.assertIn('RETURNING', str(statement.compile(dialect=postgresql.dialect())))
+
+    def get_returning_manager(self, rows):
+        from sqlalchemy import Column, Integer
+        from sqlalchemy.ext.declarative import declarative_base
+
+        class Model(declarative_base()):
+            __tablename__ = 'model'
+            id = Column(Integer, primary_key=True)
+            value = Column(Integer)
+
+        class Manager(AlchemyManager):
+            model = Model
+            fields = ('id', 'value')
+
+        session = mock.MagicMock()
+        session.get_bind.return_value.dialect.full_returning = True
+        session.execute.return_value.fetchall.return_value = rows
+        session_handler = mock.MagicMock(get_session=mock.Mock(return_value=session))
+        return Manager(session_handler), session
+
+    def test_update_returning(self):
+        from sqlalchemy.dialects import postgresql
+
+        manager, session = self.get_returning_manager([(1, 2)])
+        resp = manager.update(dict(id=1), dict(value=2, other=3))
+        self.assertDictEqual(resp, dict(id=1, value=2))
+        self.assertEqual(session.execute.call_count, 1)
+        self.assertEqual(session.commit.call_count, 1)
+        statement = str(session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+        self.assertIn('UPDATE model SET value=', statement)
+        self.assertIn('RETURNING model.id, model.value', statement)
+
+    def test_update_returning_not_found(self):
+        manager, session = self.get_returning_manager([])
+        self.assertRaises(NotFoundException, manager.update, dict(id=1), dict(value=2))
+        self.assertEqual(session.commit.call_count, 0)
+
+    def test_update_returning_multiple_rows(self):
+        from sqlalchemy.orm.exc import MultipleResultsFound
+
+        manager, session = self.get_returning_manager([(1, 2), (2, 2)])
+        self.assertRaises(MultipleResultsFound, manager.update, dict(value=1), dict(value=2))
+        self.assertEqual(session.commit.call_count, 0)
+
+    def test_freeze_value(self):
+        frozen = _freeze_value(dict(b=[1, 2], a=dict(c=3)))
+        self.assertEqual(frozen, (('a', (('c', 3),)), ('b', (1, 2))))
+        self.assertEqual(hash(frozen), hash(_freeze_value(dict(a=dict(c=3), b=(1, 2)))))
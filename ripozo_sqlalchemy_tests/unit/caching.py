@@ -0,0 +1,80 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy.caching import BaseCache, LRUCache, _TableVersions
+
+import unittest2
+
+
+class TestLRUCache(unittest2.TestCase):
+    def test_get_set(self):
+        cache = LRUCache()
+        cache.set(('a',), 1)
+        self.assertEqual(cache.get(('a',)), 1)
+        self.assertIsNone(cache.get(('b',)))
+        self.assertEqual(cache.get(('b',), 2), 2)
+        self.assertDictEqual(cache.stats, dict(hits=1, misses=2))
+
+    def test_max_size(self):
+        cache = LRUCache(max_size=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+
+    def test_ttl(self):
+        now = [100]
+        cache = LRUCache(ttl=10, timer=lambda: now[0])
+        cache.set('a', 1)
+        now[0] = 109
+        self.assertEqual(cache.get('a'), 1)
+        now[0] = 110
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(len(cache), 0)
+
+    def test_delete_clear(self):
+        cache = LRUCache()
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.delete('a')
+        cache.delete('missing')
+        self.assertIsNone(cache.get('a'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+
+    def test_base_cache_abstract(self):
+        self.assertRaises(TypeError, BaseCache)
+
+
+class TestTableVersions(unittest2.TestCase):
+    def test_stamp(self):
+        versions = _TableVersions()
+        self.assertEqual(versions.stamp(('a', 'b'), generations=('c',)), (0, 0, 0))
+        versions.invalidate(tables=set(['a']), generations=set(['c']))
+        self.assertEqual(versions.stamp(('a', 'b'), generations=('c',)), (1, 1, 0))
+        self.assertEqual(versions.epoch, 1)
+
+    def test_invalidate_rows(self):
+        versions = _TableVersions()
+        cache = LRUCache()
+        versions.register_row_key('a', ('field',), ('b',))
+        key = versions.row_cache_key('a', (1,), ('field',), ('b',))
+        other = versions.row_cache_key('a', (2,), ('field',), ('b',))
+        cache.set(key, 1)
+        cache.set(other, 2)
+        versions.invalidate(rows=dict(a=set([(1,)])))
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.get(other), 2)
+        self.assertEqual(versions.row_cache_key('a', (2,), ('field',), ('b',)), other)
+
+    def test_invalidate_related(self):
+        versions = _TableVersions()
+        key = versions.row_cache_key('a', (1,), ('field',), ('b',))
+        versions.invalidate(tables=set(['b']))
+        self.assertNotEqual(versions.row_cache_key('a', (1,), ('field',), ('b',)), key)
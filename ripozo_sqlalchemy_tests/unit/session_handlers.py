@@ -3,12 +3,16 @@ from __future__ import division
 from __future__ import print_function
 from __future__ import unicode_literals
 
-from ripozo_sqlalchemy.session_handlers import ScopedSessionHandler, SessionHandler
+from ripozo_sqlalchemy.session_handlers import ScopedSessionHandler, SessionHandler, \
+    RoutingSessionHandler, ShardedSessionHandler
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, or_, select, Column, Integer, String
+from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.inspection import inspect
 from sqlalchemy.orm import Session
 
 import mock
+import threading
 import unittest2
 
 
@@ -53,3 +57,142 @@ class TestSessionHandler(unittest2.TestCase):
         handler.handle_session(session, exc=e)
         self.assertTrue(session.rollback.called)
 
+
+class TestRoutingSessionHandler(unittest2.TestCase):
+    def setUp(self):
+        self.primary = create_engine('sqlite:///:memory:')
+        self.replicas = [create_engine('sqlite:///:memory:') for _ in range(3)]
+
+    def test_get_session(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas)
+        self.assertIs(handler.get_session().bind, self.primary)
+
+    def test_round_robin(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas)
+        binds = [handler.get_read_session().bind for _ in range(6)]
+        self.assertEqual(binds, self.replicas * 2)
+
+    def test_least_connections(self):
+        replicas = [mock.MagicMock() for _ in range(3)]
+        for replica, checked_out in zip(replicas, (4, 1, 2)):
+            replica.pool.checkedout.return_value = checked_out
+        handler = RoutingSessionHandler(self.primary, replicas,
+                                        strategy=RoutingSessionHandler.LEAST_CONNECTIONS)
+        self.assertEqual(handler._choose_replica(), 1)
+
+    def test_unknown_strategy(self):
+        self.assertRaises(ValueError, RoutingSessionHandler, self.primary,
+                          self.replicas, strategy='random')
+
+    def test_no_replicas(self):
+        handler = RoutingSessionHandler(self.primary, [])
+        self.assertIs(handler.get_read_session().bind, self.primary)
+
+    def test_write_pins_until_end_request(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas, pin_seconds=None)
+        handler.handle_session(handler.get_session())
+        self.assertTrue(handler.pinned)
+        self.assertIs(handler.get_read_session().bind, self.primary)
+        handler.end_request()
+        self.assertFalse(handler.pinned)
+        self.assertIn(handler.get_read_session().bind, self.replicas)
+
+    def test_pin_seconds(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas, pin_seconds=10)
+        with mock.patch('ripozo_sqlalchemy.session_handlers.time') as time_mock:
+            time_mock.time.return_value = 100
+            handler.pin()
+            time_mock.time.return_value = 109
+            self.assertTrue(handler.pinned)
+            time_mock.time.return_value = 111
+            self.assertFalse(handler.pinned)
+
+    def test_default_pin_seconds(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas)
+        with mock.patch('ripozo_sqlalchemy.session_handlers.time') as time_mock:
+            time_mock.time.return_value = 100
+            handler.handle_session(handler.get_session())
+            time_mock.time.return_value = 106
+            self.assertFalse(handler.pinned)
+
+    def test_pinned_reads_do_not_renew(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas, pin_seconds=10)
+        with mock.patch('ripozo_sqlalchemy.session_handlers.time') as time_mock:
+            time_mock.time.return_value = 100
+            handler.handle_session(handler.get_session())
+            time_mock.time.return_value = 105
+            session = handler.get_read_session()
+            self.assertIs(session.bind, self.primary)
+            handler.handle_session(session)
+            time_mock.time.return_value = 111
+            self.assertFalse(handler.pinned)
+
+    def test_failed_write_does_not_pin(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas)
+        session = mock.MagicMock(bind=self.primary)
+        with mock.patch.object(handler, 'session_maker', return_value=session):
+            handler.handle_session(handler.get_session(), exc=Exception())
+        self.assertTrue(session.rollback.called)
+        self.assertTrue(session.close.called)
+        self.assertFalse(handler.pinned)
+
+    def test_read_does_not_pin(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas)
+        session = handler.get_read_session()
+        handler.handle_session(session)
+        self.assertFalse(handler.pinned)
+
+    def test_pin_is_thread_local(self):
+        handler = RoutingSessionHandler(self.primary, self.replicas)
+        handler.pin()
+        pinned = []
+        thread = threading.Thread(target=lambda: pinned.append(handler.pinned))
+        thread.start()
+        thread.join()
+        self.assertEqual(pinned, [False])
+
+
+class TestShardedSessionHandler(unittest2.TestCase):
+    def setUp(self):
+        Base = declarative_base()
+
+        class Person(Base):
+            __tablename__ = 'person'
+            id = Column(Integer, primary_key=True)
+            name = Column(String)
+
+        self.model = Person
+        shards = dict(even=create_engine('sqlite://'), odd=create_engine('sqlite://'))
+        self.handler = ShardedSessionHandler(
+            shards, lambda model, values: None if values.get('id') is None
+            else ('even', 'odd')[values['id'] % 2])
+
+    def choose(self, statement, parameters=None):
+        orm_context = mock.MagicMock(statement=statement, parameters=parameters,
+                                     bind_mapper=inspect(self.model))
+        return self.handler._choose_execute_shards(orm_context)
+
+    def test_equality_routed(self):
+        statement = select(self.model).where(self.model.id == 3, self.model.name == 'a')
+        self.assertEqual(self.choose(statement), ['odd'])
+
+    def test_parameters_routed(self):
+        statement = select(self.model).where(self.model.id == 3)
+        key = statement.whereclause.right.key
+        self.assertEqual(self.choose(statement, {key: 4}), ['even'])
+
+    def test_or_not_routed(self):
+        statement = select(self.model).where(or_(self.model.id == 3, self.model.id == 4))
+        self.assertEqual(self.choose(statement), ['even', 'odd'])
+
+    def test_no_criteria(self):
+        self.assertEqual(self.choose(select(self.model)), ['even', 'odd'])
+
+    def test_identity_routed(self):
+        query = mock.MagicMock(column_descriptions=[dict(entity=self.model)])
+        self.assertEqual(self.handler._choose_identity_shards(query, (2,)), ['even'])
+
+    def test_new_model_without_shard_key(self):
+        self.assertRaises(ValueError, self.handler._choose_shard,
+                          inspect(self.model), self.model(name='a'))
+        self.assertEqual(self.handler._choose_shard(inspect(self.model), self.model(id=1)), 'odd')
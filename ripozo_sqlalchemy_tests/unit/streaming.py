@@ -0,0 +1,39 @@
+from __future__ import absolute_import
+from __future__ import division
+from __future__ import print_function
+from __future__ import unicode_literals
+
+from ripozo_sqlalchemy.streaming import ndjson_chunks, csv_chunks
+
+import json
+import unittest2
+
+
+class TestNDJSONChunks(unittest2.TestCase):
+    def test_chunks(self):
+        rows = [dict(id=i, name='name{0}'.format(i)) for i in range(5)]
+        chunks = list(ndjson_chunks(iter(rows), rows_per_chunk=2))
+        self.assertEqual(len(chunks), 3)
+        lines = ''.join(chunks).splitlines()
+        self.assertEqual([json.loads(line) for line in lines], rows)
+
+    def test_empty(self):
+        self.assertEqual(list(ndjson_chunks(iter([]))), [])
+
+
+class TestCSVChunks(unittest2.TestCase):
+    def test_chunks(self):
+        rows = [dict(id=i, name='n\xe4me', children=[dict(id=i)]) for i in range(3)]
+        chunks = list(csv_chunks(iter(rows), rows_per_chunk=2))
+        self.assertEqual(chunks, [
+            'children,id,name\r\n"[{""id"": 0}]",0,n\xe4me\r\n"[{""id"": 1}]",1,n\xe4me\r\n',
+            '"[{""id"": 2}]",2,n\xe4me\r\n',
+        ])
+
+    def test_fieldnames(self):
+        rows = [dict(id=1, name=None, other='x')]
+        self.assertEqual(list(csv_chunks(rows, fieldnames=['name', 'id'])), ['name,id\r\n,1\r\n'])
+
+    def test_empty(self):
+        self.assertEqual(list(csv_chunks([])), [])
+        self.assertEqual(list(csv_chunks([], fieldnames=['id'])), ['id\r\n'])